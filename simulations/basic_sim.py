@@ -7,6 +7,7 @@ from myrepr import ReprObject
 
 from stopwatch import Stopwatch
 from datetime import datetime, timedelta
+import clock
 from cert import CertificationAuthority, create_certification_authority
 import crypto
 from payments import PaymentChannel
@@ -37,8 +38,8 @@ class TaxiTopic(AbstractTopic):
 class Gossiper(SweetGossipNode):
     def __init__(self, name, ca: CertificationAuthority, price_amount_for_routing, settler: Settler):
         private_key, public_key = crypto.generate_asymetric_keys()
-        certificate = ca.issue_certificate(public_key, "is_ok", True, not_valid_after=datetime.now(
-        )+timedelta(days=7), not_valid_before=datetime.now()-timedelta(days=7))
+        certificate = ca.issue_certificate(public_key, "is_ok", True, not_valid_after=clock.now()+timedelta(days=7),
+                                         not_valid_before=clock.now()-timedelta(days=7))
         payment_channel = PaymentChannel()
         super().__init__(name, certificate, private_key, payment_channel, price_amount_for_routing,
                          broadcast_conditions_timeout=timedelta(days=7), broadcast_conditions_pow_scheme="sha256", broadcast_conditions_pow_complexity=1, invoice_payment_timeout=timedelta(days=1),
@@ -47,7 +48,7 @@ class Gossiper(SweetGossipNode):
 
     def accept_topic(self, topic: AbstractTopic) -> bool:
         if isinstance(topic, TaxiTopic):
-            return len(topic.from_geohash) >= 7 and len(topic.to_geohash) >= 7 and datetime.now() <= topic.dropoff_before
+            return len(topic.from_geohash) >= 7 and len(topic.to_geohash) >= 7 and clock.now() <= topic.dropoff_before
         return False
 
 
@@ -81,8 +82,8 @@ class Customer(Gossiper):
             topic = RequestPayload(self.topic_id,
                                    TaxiTopic(from_geohash=from_gh,
                                              to_geohash=to_gh,
-                                             pickup_after=datetime.now(),
-                                             dropoff_before=datetime.now() + timedelta(minutes=20)),
+                                             pickup_after=clock.now(),
+                                             dropoff_before=clock.now() + timedelta(minutes=20)),
                                    self.certificate)
             topic.sign(self._private_key)
             self.broadcast(e, topic)
@@ -96,9 +97,9 @@ class Customer(Gossiper):
             if False:
                 yield e.timeout(0)
 
-            responses = self.get_responses(e, self.topic_id)
+            responses = self.get_best_responses(e, self.topic_id)
             print(responses)
-            reply_payload, network_invoice = responses[0][0]
+            reply_payload, network_invoice = responses[0]
             self.pay_and_read_response(e, reply_payload, network_invoice)
             return None,
 
@@ -119,8 +120,8 @@ def main(sim_id):
         ca = create_certification_authority("CA")
         ca_certificate = ca.issue_certificate(
             ca.ca_public_key, "is_ok", True,
-            not_valid_after=datetime.now()+timedelta(days=7),
-            not_valid_before=datetime.now()-timedelta(days=7))
+            not_valid_after=clock.now()+timedelta(days=7),
+            not_valid_before=clock.now()-timedelta(days=7))
         settler = Settler(
             ca_certificate,
             ca._ca_private_key,
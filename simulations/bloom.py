@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import math
+from hashlib import blake2b
+
+
+def _bit_positions(key: bytes, num_bits: int, num_hashes: int):
+    digest = blake2b(key, digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i*h2) % num_bits for i in range(num_hashes)]
+
+
+class RollingBloomFilter:
+    """Remembers roughly the last `capacity`..`2*capacity` keys added to it.
+
+    Keys go into the current generation; once it holds `capacity` keys it becomes the
+    previous generation and the one before is forgotten. The filter is sized so that
+    both generations together stay at `false_positive_rate`.
+
+    `summary()` is the compact form sent to peers: one byte with the number of hash
+    functions followed by the OR of both generations' bits. Peers test it with
+    `summary_contains`.
+    """
+
+    def __init__(self, capacity: int = 256, false_positive_rate: float = 0.01) -> None:
+        self.capacity = capacity
+        entries = 2*capacity
+        self.num_bits = 8*math.ceil(-entries*math.log(false_positive_rate)/math.log(2)**2/8)
+        self.num_hashes = max(1, round(self.num_bits/entries*math.log(2)))
+        self._current = 0
+        self._previous = 0
+        self._count = 0
+        self._summary = None
+
+    def add(self, key: bytes) -> None:
+        if key in self:
+            return
+        if self._count >= self.capacity:
+            self._previous = self._current
+            self._current = 0
+            self._count = 0
+        for bit in _bit_positions(key, self.num_bits, self.num_hashes):
+            self._current |= 1 << bit
+        self._count += 1
+        self._summary = None
+
+    def __contains__(self, key: bytes) -> bool:
+        bits = self._current | self._previous
+        return all(bits >> bit & 1 for bit in _bit_positions(key, self.num_bits, self.num_hashes))
+
+    def summary(self) -> bytes:
+        if self._summary is None:
+            self._summary = bytes([self.num_hashes]) + \
+                (self._current | self._previous).to_bytes(self.num_bits//8, "little")
+        return self._summary
+
+
+def summary_contains(summary: bytes, key: bytes) -> bool:
+    """Tests a `RollingBloomFilter.summary()`; an empty summary contains nothing."""
+    if len(summary) < 2:
+        return False
+    bits = summary[1:]
+    return all(bits[bit >> 3] >> (bit & 7) & 1
+               for bit in _bit_positions(key, 8*len(bits), summary[0]))
@@ -0,0 +1,52 @@
+# The rolling Bloom filter behind the "have" summaries: no false negatives, and
+# generations roll over so that old keys are forgotten.
+#
+#   python -m pytest -q bloom_test.py
+from uuid import UUID
+
+from bloom import RollingBloomFilter, summary_contains
+
+CAPACITY = 64
+
+
+def keys(start: int, count: int):
+    return [UUID(int=i).bytes for i in range(start, start+count)]
+
+
+def test_no_false_negatives():
+    seen = RollingBloomFilter(CAPACITY)
+    added = keys(0, CAPACITY)
+    for key in added:
+        seen.add(key)
+    summary = seen.summary()
+    assert all(key in seen for key in added)
+    assert all(summary_contains(summary, key) for key in added)
+    false_positives = sum(summary_contains(summary, key) for key in keys(10_000, 1000))
+    assert false_positives < 50  # sized for 1% at twice the capacity
+
+
+def test_roll_over():
+    seen = RollingBloomFilter(CAPACITY)
+    oldest, previous, current = keys(0, CAPACITY), keys(1000, CAPACITY), keys(2000, CAPACITY)
+    for key in oldest+previous:
+        seen.add(key)
+    # both generations are remembered ...
+    assert all(key in seen for key in oldest+previous)
+    for key in current:
+        seen.add(key)
+    # ... until a third one starts and the oldest is forgotten
+    assert all(key in seen for key in previous+current)
+    assert sum(key in seen for key in oldest) < CAPACITY//10
+    assert all(summary_contains(seen.summary(), key) for key in previous+current)
+
+
+def test_summary_is_reused_until_the_next_add():
+    seen = RollingBloomFilter(CAPACITY)
+    assert not summary_contains(b"", keys(0, 1)[0])
+    first = seen.summary()
+    assert seen.summary() is first
+    seen.add(keys(0, 1)[0])
+    assert seen.summary() is not first
+    second = seen.summary()
+    seen.add(keys(0, 1)[0])  # already there
+    assert seen.summary() is second
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from typing import Tuple, Dict
 
+import clock
 import crypto
 from myrepr import ReprObject
 from datetime import datetime
@@ -10,6 +11,9 @@ CA_BY_NAME: Dict[str, CertificationAuthority] = dict()
 
 
 class Certificate(ReprObject):
+    __slots__ = ("ca_name", "public_key", "name", "value",
+                 "not_valid_after", "not_valid_before", "signature")
+
     def __init__(self, ca_name: str, public_key: bytes,
                  name: str,
                  value,
@@ -24,7 +28,8 @@ class Certificate(ReprObject):
         self.signature = signature
 
     def verify(self):
-        if self.not_valid_after >= datetime.now() and self.not_valid_before <= datetime.now():
+        now = clock.now()
+        if self.not_valid_after >= now and self.not_valid_before <= now:
             ca = get_certification_authority_by_name(self.ca_name)
             if not ca is None:
                 if not ca.is_revoked(self):
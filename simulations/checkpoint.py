@@ -0,0 +1,168 @@
+"""Checkpoints of running simulations.
+
+`save_checkpoint(env, path)` saves a simulation that `mass.simulate(..., until=...)`
+stopped: its things with all their state (protocol tables, reply collectors, and the
+payment channels and settlers they reference), the messages in their mailboxes, the
+messages still travelling over links, the simulated time and the state of `random` and
+`numpy.random`, the registry of certification authorities the certificates are
+verified against and the settlers' store of reply invoice preimages
+(`sweetgossip.InvoiceById`), so that replies can still be paid after a restore.
+`load_checkpoint(path)` rebuilds it, in this or in a fresh process, and
+
+    checkpoint = load_checkpoint(path)
+    simulate(checkpoint.sim_id, checkpoint.things, resume=checkpoint)
+
+goes on from there. Every load is an independent copy, so many variants can be forked
+off one warmed-up checkpoint by changing the loaded things before resuming them.
+
+The file is a gzip-compressed pickle made with cloudpickle, so the closures the agents
+keep (invoice callbacks, reply subscribers) are saved too. References to the
+environment are saved as such and bound to the restored environment on load.
+
+Running generators cannot be saved. A restored thing runs `Thing.resume` instead of
+going on with its `homeostasis`, handlers suspended in a `yield` (`reply_and_wait`,
+generator `on_message`s) are lost and a message in its service time is served again
+from the start. Take checkpoints where the agents only wait for messages.
+"""
+from __future__ import annotations
+
+import gzip
+import pickle
+import random
+from typing import Dict, List, Tuple
+
+import cloudpickle
+import numpy as np
+import simpy
+
+import cert
+import sweetgossip
+from heapkernel import Event, HeapEnvironment
+from mass import Agent, Delivery, DirectMessage
+
+CHECKPOINT_VERSION = 1
+
+_ENV = "env"
+
+
+class _Pickler(cloudpickle.CloudPickler):
+    def __init__(self, file, env) -> None:
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._env = env
+
+    def persistent_id(self, obj):
+        return _ENV if obj is self._env else None
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, env) -> None:
+        super().__init__(file)
+        self._env = env
+
+    def persistent_load(self, pid):
+        if pid == _ENV:
+            return self._env
+        raise pickle.UnpicklingError(f"unknown persistent id {pid!r}")
+
+
+def _scheduled_events(env):
+    """(time, order, event) of the events waiting in the kernel queue of `env`."""
+    if isinstance(env, HeapEnvironment):
+        for time, seq, callback in env._heap:
+            event = getattr(callback, "__self__", None)
+            if isinstance(event, Event):
+                yield time, seq, event
+    else:
+        for time, priority, eid, event in env._queue:
+            yield time, (priority, eid), event
+
+
+def pending_deliveries(env) -> List[Tuple[float, DirectMessage]]:
+    """The messages still on a link, with their arrival times, in arrival order."""
+    deliveries = sorted(((time, order, callback) for time, order, event in _scheduled_events(env)
+                         for callback in event.callbacks or () if isinstance(callback, Delivery)),
+                        key=lambda d: d[:2])
+    return [(time, delivery.message) for time, _, delivery in deliveries]
+
+
+def _mailbox_messages(thing) -> List[DirectMessage]:
+    queue = getattr(thing, "queue", None)
+    if queue is None:
+        return list()
+    return ([queue.serving] if queue.serving is not None else []) + queue.items
+
+
+def save_checkpoint(env, path: str) -> None:
+    """Saves the simulation run on `env`; call it once `simulate` has returned."""
+    header = {
+        "version": CHECKPOINT_VERSION,
+        "kernel": "heap" if isinstance(env, HeapEnvironment) else "simpy",
+        "sim_id": env.sim_id,
+        "now": env.now,
+        "start": env.start,
+    }
+    state = {
+        "things": env.things,
+        "mailboxes": {name: _mailbox_messages(thing) for name, thing in env.things.items()},
+        "deliveries": pending_deliveries(env),
+        "random_state": random.getstate(),
+        "numpy_random_state": np.random.get_state(),
+        "session_id": Agent._sessionIDCnt,
+        "message_id": DirectMessage._next_id,
+        "certification_authorities": dict(cert.CA_BY_NAME),
+        "invoices": dict(sweetgossip.InvoiceById),
+    }
+    with gzip.open(path, "wb") as f:
+        pickle.dump(header, f)
+        _Pickler(f, env).dump(state)
+
+
+class Checkpoint:
+    """A loaded checkpoint: a fresh environment at the saved time and the things to resume on it."""
+
+    def __init__(self, env, sim_id: str, things: Dict, mailboxes: Dict[str, List[DirectMessage]],
+                 deliveries: List[Tuple[float, DirectMessage]], random_state, numpy_random_state,
+                 session_id: int, message_id: int) -> None:
+        self.env = env
+        self.sim_id = sim_id
+        self.things = things
+        self.mailboxes = mailboxes
+        self.deliveries = deliveries
+        self.random_state = random_state
+        self.numpy_random_state = numpy_random_state
+        self.session_id = session_id
+        self.message_id = message_id
+
+    @property
+    def now(self) -> float:
+        return self.env.now
+
+    def restore(self) -> None:
+        """Refills the mailboxes, sends off the messages on links again and restores the
+        random state; `simulate` calls it once it has created the mailboxes."""
+        for name, messages in self.mailboxes.items():
+            if messages:
+                self.things[name].queue.refill(messages)
+        for time, message in self.deliveries:
+            self.env.timeout(time - self.env.now).callbacks.append(Delivery(message.target, message))
+        random.setstate(self.random_state)
+        np.random.set_state(self.numpy_random_state)
+        Agent._sessionIDCnt = max(Agent._sessionIDCnt, self.session_id)
+        DirectMessage._next_id = max(DirectMessage._next_id, self.message_id)
+
+
+def load_checkpoint(path: str) -> Checkpoint:
+    with gzip.open(path, "rb") as f:
+        header = pickle.load(f)
+        if header["version"] != CHECKPOINT_VERSION:
+            raise ValueError(f"checkpoint version {header['version']} is not {CHECKPOINT_VERSION}")
+        if header["kernel"] == "heap":
+            env = HeapEnvironment(header["now"])
+        else:
+            env = simpy.Environment(header["now"])
+        env.start = header["start"]
+        env.sim_id = header["sim_id"]
+        state = _Unpickler(f, env).load()
+    cert.CA_BY_NAME.update(state.pop("certification_authorities"))
+    sweetgossip.InvoiceById.update(state.pop("invoices"))
+    return Checkpoint(env, header["sim_id"], **state)
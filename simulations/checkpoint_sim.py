@@ -0,0 +1,123 @@
+# %%
+# Checkpoint and restore on the latency_sim torus over 256 kbit/s links. The warm-up
+# (keys, certificates, topology and the first moments of the broadcasts) runs once and
+# is checkpointed while frames are still on the links and in the mailboxes. The
+# checkpoint is then resumed in a fresh process, which must end exactly like the run
+# that was never interrupted, and forked into broadcast fan-out variants. Finally a
+# checkpoint taken once replies have come in is resumed in a fresh process, which pays
+# them, reply invoices issued before the checkpoint included.
+#
+#   python checkpoint_sim.py [grid_side] [checkpoint_path]
+import multiprocessing
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from checkpoint import load_checkpoint, pending_deliveries, save_checkpoint
+from latency_sim import MS, build as build_linked_torus
+from links import Link, lognormal_latency
+from mass import OFF, simulate
+from metrics import merge_snapshots
+from stopwatch import Stopwatch
+from sweetgossip import InvoiceById
+from torus import create_settler, node_keys
+
+RANDOM_SEED = 1234
+LINK = Link(lognormal_latency(40*MS, 0.5), 256e3/8*60)
+WARM_UP = 1+150*MS  # the customers broadcast at 1
+PAY_AFTER = 1+600*MS
+FANOUTS = [None, 2, 1]
+
+
+def build(grid_side):
+    InvoiceById.clear()
+    ca, settler = create_settler()
+    return build_linked_torus(grid_side, settler, node_keys(ca, grid_side*grid_side), LINK)
+
+
+def outcome(things):
+    customers = [t for t in things.values() if t.is_customer]
+    return {
+        "frames": {k: m["count"] for k, m in merge_snapshots(t.metrics.snapshot() for t in things.values()).items()},
+        "replies": sum(len(collector) for t in customers for collector in t.reply_collectors.values()),
+        "first_reply_ms": sorted(round(t.time_to_first_reply/MS, 3) for t in customers
+                                 if t.time_to_first_reply is not None),
+    }
+
+
+def pay_replies(things, restored_invoices):
+    """Pays the reply invoice of every collected reply: (paid, settled, paid of those restored)."""
+    paid = settled = restored = 0
+    for customer in (t for t in things.values() if t.is_customer):
+        for collector in customer.reply_collectors.values():
+            for reply in collector.best_valid(len(collector)):
+                invoice = reply.reply_payload.reply_invoice
+                customer.payment_channel.pay_hodl_invoice(invoice, lambda invoice, preimage: None)
+                paid += 1
+                settled += invoice.is_settled
+                restored += invoice.id in restored_invoices
+    return paid, settled, restored
+
+
+def resume(path, broadcast_fanout=None):
+    with Stopwatch() as sw:
+        checkpoint = load_checkpoint(path)
+    restored_invoices = set(InvoiceById)
+    for thing in checkpoint.things.values():
+        thing.broadcast_fanout = broadcast_fanout
+    simulate(checkpoint.sim_id, checkpoint.things, trace_level=OFF, resume=checkpoint)
+    return sw.total, checkpoint.things, restored_invoices
+
+
+def resume_and_pay(path):
+    """`resume`, in a fresh process where only the checkpoint has issued reply invoices."""
+    load_wall, things, restored_invoices = resume(path)
+    return load_wall, outcome(things), pay_replies(things, restored_invoices)
+
+
+def main(grid_side: int = 6, path: str = "checkpoint.pkl.gz"):
+    grid_side = int(grid_side)
+
+    random.seed(RANDOM_SEED)
+    with Stopwatch() as sw:
+        things = build(grid_side)
+        simulate("", things, trace_level=OFF)
+    uninterrupted = outcome(things)
+    print(f"uninterrupted run: wall={sw.total:.2f}s {uninterrupted}")
+
+    random.seed(RANDOM_SEED)
+    with Stopwatch() as warm_up:
+        things = build(grid_side)
+        env = simulate("", things, until=WARM_UP, trace_level=OFF)
+    with Stopwatch() as save:
+        save_checkpoint(env, path)
+    print(f"warm-up to t={WARM_UP:.4f}: wall={warm_up.total:.2f}s, "
+          f"{len(pending_deliveries(env))} frames on links, "
+          f"{sum(len(t.queue) for t in things.values())} in mailboxes; "
+          f"checkpoint {os.path.getsize(path)/1024:.0f} KiB saved in {save.total:.2f}s")
+
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        load_wall, restored, _ = pool.submit(resume_and_pay, path).result()
+    print(f"resumed in a fresh process: load={load_wall:.2f}s {restored}")
+    print("same as uninterrupted:", restored == uninterrupted)
+
+    for broadcast_fanout in FANOUTS:
+        load_wall, things, _ = resume(path, broadcast_fanout)
+        forked = outcome(things)
+        print(f"fork broadcast_fanout={broadcast_fanout}: load={load_wall:.2f}s "
+              f"frames={sum(forked['frames'].values())} replies={forked['replies']} "
+              f"first_reply_ms={forked['first_reply_ms']}")
+
+    random.seed(RANDOM_SEED)
+    things = build(grid_side)
+    save_checkpoint(simulate("", things, until=PAY_AFTER, trace_level=OFF), path)
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        _, _, (paid, settled, from_checkpoint) = pool.submit(resume_and_pay, path).result()
+    print(f"checkpoint at t={PAY_AFTER:.4f} with {outcome(things)['replies']} replies collected, "
+          f"resumed in a fresh process: paid {paid} replies, {settled} settled, "
+          f"{from_checkpoint} of them with reply invoices from the checkpoint")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,46 @@
+"""Protocol time.
+
+Certificates, invoices and gossip frames read the time through `clock.now()` instead
+of `datetime.now()`. In production that is the wall clock. `mass.simulate` installs a
+`SimulationClock` for the duration of a run, so protocol time follows simulated time:
+expiries and tolerances behave the same however fast the host runs the simulation.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+
+class Clock:
+    def now(self) -> datetime:
+        raise NotImplementedError()
+
+
+class WallClock(Clock):
+    def now(self) -> datetime:
+        return datetime.now()
+
+
+class SimulationClock(Clock):
+    """`start` plus the simulated time of `env`, whose unit is the minute."""
+
+    def __init__(self, env, start: datetime) -> None:
+        self.env = env
+        self.start = start
+
+    def now(self) -> datetime:
+        return self.start + timedelta(minutes=float(self.env.now))
+
+
+_clock: Clock = WallClock()
+
+
+def now() -> datetime:
+    return _clock.now()
+
+
+def set_clock(clock: Clock) -> Clock:
+    """Makes `clock` the source of protocol time and returns the previous one."""
+    global _clock
+    previous = _clock
+    _clock = clock
+    return previous
@@ -1,12 +1,14 @@
 # %%
 from typing import Dict, Tuple
 from mass import simulate
+from metrics import merge_snapshots
 from mass_tools import time_to_int
 from experiment_tools import FOLDNAME, RUN_START
 from myrepr import ReprObject
 
 from stopwatch import Stopwatch
 from datetime import datetime, timedelta
+import clock
 from cert import CertificationAuthority, create_certification_authority
 import crypto
 from payments import PaymentChannel
@@ -24,6 +26,7 @@ import pygeohash as pgh
 # %%
 
 PAYANDREAD_TIME = time_to_int(2, 8, 0)
+GIG_WORKER_AREA = pgh.encode(latitude=42.6, longitude=-5.6, precision=5)
 
 
 class GridNodeType(Enum):
@@ -44,8 +47,8 @@ class GridNode(SweetGossipNode):
     def __init__(self, name,  ca: CertificationAuthority, price_amount_for_routing, settler: Settler):
         self.grid_node_type = GridNodeType.Gossiper
         private_key, public_key = crypto.generate_asymetric_keys()
-        certificate = ca.issue_certificate(public_key, "is_ok", True, not_valid_after=datetime.now(
-        )+timedelta(days=7), not_valid_before=datetime.now()-timedelta(days=7))
+        certificate = ca.issue_certificate(public_key, "is_ok", True, not_valid_after=clock.now()+timedelta(days=7),
+                                         not_valid_before=clock.now()-timedelta(days=7))
         payment_channel = PaymentChannel()
         super().__init__(name, certificate, private_key, payment_channel, price_amount_for_routing,
                          broadcast_conditions_timeout=timedelta(days=7), broadcast_conditions_pow_scheme="sha256", broadcast_conditions_pow_complexity=0, invoice_payment_timeout=timedelta(days=1),
@@ -57,9 +60,14 @@ class GridNode(SweetGossipNode):
 
     def accept_topic(self, topic: AbstractTopic) -> bool:
         if isinstance(topic, TaxiTopic):
-            return len(topic.from_geohash) >= 7 and len(topic.to_geohash) >= 7 and datetime.now() <= topic.dropoff_before
+            return len(topic.from_geohash) >= 7 and len(topic.to_geohash) >= 7 and clock.now() <= topic.dropoff_before
         return False
 
+    def topic_geohash(self, topic: AbstractTopic) -> str:
+        if isinstance(topic, TaxiTopic):
+            return topic.from_geohash
+        return None
+
     def accept_broadcast(self, signed_topic: RequestPayload) -> Tuple[bytes, int]:
         if self.grid_node_type == GridNodeType.GigWorker:
             return bytes(f"mynameis={self.name}", encoding="utf8"), 4321
@@ -67,6 +75,10 @@ class GridNode(SweetGossipNode):
             return None, 0
 
     def homeostasis(self, e):
+        if self.grid_node_type == GridNodeType.GigWorker:
+            self.add_interest(e, GIG_WORKER_AREA)
+        self.advertise_interests(e)
+
         if self.grid_node_type == GridNodeType.Customer:
             self.info(e, "is starting...")
 
@@ -91,8 +103,8 @@ class GridNode(SweetGossipNode):
             topic = RequestPayload(self.topic_id,
                                    TaxiTopic(from_geohash=from_gh,
                                              to_geohash=to_gh,
-                                             pickup_after=datetime.now(),
-                                             dropoff_before=datetime.now() + timedelta(minutes=20)),
+                                             pickup_after=clock.now(),
+                                             dropoff_before=clock.now() + timedelta(minutes=20)),
                                    self.certificate)
             topic.sign(self._private_key)
             self.broadcast(e, topic)
@@ -106,9 +118,9 @@ class GridNode(SweetGossipNode):
             if False:
                 yield e.timeout(0)
 
-            responses = self.get_responses(e, self.topic_id)
+            responses = self.get_best_responses(e, self.topic_id)
             print(responses)
-            reply_payload, network_invoice = responses[0][0]
+            reply_payload, network_invoice = responses[0]
             self.pay_and_read_response(e, reply_payload, network_invoice)
 
             return None,
@@ -130,8 +142,8 @@ def main(sim_id):
         ca = create_certification_authority("CA")
         ca_certificate = ca.issue_certificate(
             ca.ca_public_key, "is_ok", True,
-            not_valid_after=datetime.now()+timedelta(days=7),
-            not_valid_before=datetime.now()-timedelta(days=7))
+            not_valid_after=clock.now()+timedelta(days=7),
+            not_valid_before=clock.now()-timedelta(days=7))
         settler = Settler(
             ca_certificate,
             ca._ca_private_key,
@@ -188,6 +200,9 @@ def main(sim_id):
                 print(a)
                 printMessages(things[a].queue.items)
 
+        for frame_type, m in merge_snapshots(t.metrics.snapshot() for t in things.values()).items():
+            print(frame_type, m)
+
     print(sw.total)
     return history
 
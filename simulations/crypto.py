@@ -28,6 +28,19 @@ def encrypt_object(obj, public_key: bytes) -> bytes:
     pub_key = serialization.load_pem_public_key(
         public_key
     )
+    return _encrypt_object(obj, pub_key)
+
+
+def encrypt_objects(objs: list, public_keys: List[bytes]) -> List[bytes]:
+    """`encrypt_object` for a batch, parsing every distinct public key once."""
+    pub_keys = dict()
+    for public_key in public_keys:
+        if public_key not in pub_keys:
+            pub_keys[public_key] = serialization.load_pem_public_key(public_key)
+    return [_encrypt_object(obj, pub_keys[public_key]) for obj, public_key in zip(objs, public_keys)]
+
+
+def _encrypt_object(obj, pub_key) -> bytes:
     bobj = pickle.dumps(obj)
     key = Fernet.generate_key()
     ebobj = Fernet(key).encrypt(bobj)
@@ -61,6 +74,19 @@ def sign_object(obj, private_key: bytes) -> bytes:
         private_key,
         password=None,
     )
+    return _sign_object(obj, priv_key)
+
+
+def sign_objects(objs: list, private_key: bytes) -> List[bytes]:
+    """`sign_object` for a batch: the private key is parsed and checked only once."""
+    priv_key = serialization.load_pem_private_key(
+        private_key,
+        password=None,
+    )
+    return [_sign_object(obj, priv_key) for obj in objs]
+
+
+def _sign_object(obj, priv_key) -> bytes:
     bobj = pickle.dumps(obj)
     chosen_hash = hashes.SHA256()
     hasher = hashes.Hash(chosen_hash)
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from typing import Dict, Iterator, Optional, Tuple
+
+
+class _TrieNode:
+    __slots__ = ("children", "value")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, _TrieNode] = dict()
+        self.value: Optional[int] = None
+
+
+class GeohashPrefixTrie:
+    """A set of geohash prefixes, each carrying a small integer value (e.g. a hop distance).
+
+    Prefixes sharing leading characters share trie nodes, so a neighbourhood of
+    interests is stored (and looked up) in O(len(geohash)).
+    """
+
+    def __init__(self) -> None:
+        self._root = _TrieNode()
+        self._size = 0
+
+    def _find(self, prefix: str) -> Optional[_TrieNode]:
+        node = self._root
+        for ch in prefix:
+            node = node.children.get(ch)
+            if node is None:
+                return None
+        return node
+
+    def get(self, prefix: str) -> Optional[int]:
+        node = self._find(prefix)
+        return None if node is None else node.value
+
+    def set(self, prefix: str, value: int) -> None:
+        node = self._root
+        for ch in prefix:
+            child = node.children.get(ch)
+            if child is None:
+                child = _TrieNode()
+                node.children[ch] = child
+            node = child
+        if node.value is None:
+            self._size += 1
+        node.value = value
+
+    def discard(self, prefix: str) -> bool:
+        path = [self._root]
+        for ch in prefix:
+            node = path[-1].children.get(ch)
+            if node is None:
+                return False
+            path.append(node)
+        if path[-1].value is None:
+            return False
+        path[-1].value = None
+        self._size -= 1
+        for i in range(len(prefix), 0, -1):
+            node = path[i]
+            if node.value is not None or node.children:
+                break
+            del path[i-1].children[prefix[i-1]]
+        return True
+
+    def overlaps(self, geohash: str) -> bool:
+        """True if some stored prefix covers `geohash` or lies inside the `geohash` cell."""
+        node = self._root
+        if node.value is not None:
+            return True
+        for ch in geohash:
+            node = node.children.get(ch)
+            if node is None:
+                return False
+            if node.value is not None:
+                return True
+        return bool(node.children)
+
+    def items(self) -> Iterator[Tuple[str, int]]:
+        stack = [("", self._root)]
+        while stack:
+            prefix, node = stack.pop()
+            if node.value is not None:
+                yield prefix, node.value
+            for ch, child in node.children.items():
+                stack.append((prefix+ch, child))
+
+    def __contains__(self, prefix: str) -> bool:
+        return self.get(prefix) is not None
+
+    def __len__(self) -> int:
+        return self._size
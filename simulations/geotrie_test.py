@@ -0,0 +1,63 @@
+# Geohash interest routing: prefix coverage of the trie and split horizon of the summaries.
+#
+#   python -m pytest -q geotrie_test.py
+from geotrie import GeohashPrefixTrie
+from torus import TaxiNode
+
+
+def test_prefix_coverage():
+    trie = GeohashPrefixTrie()
+    assert not trie.overlaps("u4pruyd")
+    trie.set("u4pru", 1)
+    trie.set("ezs4", 2)
+    assert len(trie) == 2
+    assert trie.get("u4pru") == 1 and "ezs4" in trie and not "u4pr" in trie
+    # a stored prefix covers the cells inside it ...
+    assert trie.overlaps("u4pruyd") and trie.overlaps("u4pru") and trie.overlaps("ezs42e4")
+    # ... and a cell covers the stored prefixes inside it
+    assert trie.overlaps("u4p") and trie.overlaps("e")
+    # siblings and unrelated cells are not covered
+    assert not trie.overlaps("u4prv") and not trie.overlaps("ezs5") and not trie.overlaps("s")
+
+    assert trie.discard("u4pru")
+    assert not trie.discard("u4pru") and not trie.discard("ezs")
+    assert len(trie) == 1
+    assert not trie.overlaps("u4pruyd") and not trie.overlaps("u4p")
+    assert sorted(trie.items()) == [("ezs4", 2)]
+
+    trie.set("", 0)  # the root covers everything
+    assert trie.overlaps("s") and sorted(trie.items()) == [("", 0), ("ezs4", 2)]
+
+
+def make_star(interest_radius: int = 16):
+    """A hub connected to peers B, C and D."""
+    hub = TaxiNode("Hub", None, None, None, interest_radius=interest_radius)
+    peers = {name: TaxiNode(name, None, None, None) for name in "BCD"}
+    for peer in peers.values():
+        hub.connect_to(peer)
+    return hub, peers
+
+
+def learn(node: TaxiNode, peer_name: str, interests: dict) -> None:
+    trie = GeohashPrefixTrie()
+    for prefix, hops in interests.items():
+        trie.set(prefix, hops)
+    node._peer_interests[peer_name] = trie
+
+
+def test_split_horizon():
+    hub, _ = make_star()
+    hub._own_interests.add("ezs4")
+    learn(hub, "B", {"u4pru": 1, "gcpv": 3})
+    learn(hub, "C", {"gcpv": 1})
+
+    # B is not told back what it advertised, but hears of C's nearer "gcpv"
+    assert hub._interest_summary_for("B") == {"ezs4": 0, "gcpv": 2}
+    assert hub._interest_summary_for("C") == {"ezs4": 0, "u4pru": 2, "gcpv": 4}
+    assert hub._interest_summary_for("D") == {"ezs4": 0, "u4pru": 2, "gcpv": 2}
+
+
+def test_interest_radius_limits_the_summary():
+    hub, _ = make_star(interest_radius=2)
+    learn(hub, "B", {"u4pru": 1, "gcpv": 2})
+    assert hub._interest_summary_for("C") == {"u4pru": 2}
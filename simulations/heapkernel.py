@@ -0,0 +1,118 @@
+"""A minimal discrete-event kernel, the alternative to simpy for `mass.simulate(kernel="heap")`.
+
+The whole kernel is a binary heap of `(time, seq, callback)`. Mailboxes (see
+`mass.HeapMailbox`) are deques served by callbacks, so unlike with simpy a message
+costs no events, no generator resumptions and no put/get pair.
+
+Generators still work where the `Agent` API uses them, `homeostasis` and generator
+`on_message` handlers: they may yield `timeout`s, `event`s and `process`es. Code that
+builds simpy objects itself, like `simpy.events.AllOf` in `Agent.run_scheduler` and
+`reply_and_wait`, needs the simpy kernel.
+"""
+from __future__ import annotations
+
+import heapq
+
+
+class Event:
+    __slots__ = ("env", "callbacks", "triggered", "value")
+
+    def __init__(self, env: HeapEnvironment) -> None:
+        self.env = env
+        self.callbacks = list()
+        self.triggered = False
+        self.value = None
+
+    @property
+    def processed(self) -> bool:
+        return self.callbacks is None
+
+    def succeed(self, value=None) -> Event:
+        if self.triggered:
+            raise RuntimeError(f"{self} has already been triggered")
+        self.triggered = True
+        self.value = value
+        self.env.schedule(0, self._fire)
+        return self
+
+    def _fire(self) -> None:
+        callbacks, self.callbacks = self.callbacks, None
+        for callback in callbacks:
+            callback(self)
+
+
+class Timeout(Event):
+    __slots__ = ()
+
+    def __init__(self, env: HeapEnvironment, delay: float, value=None) -> None:
+        super().__init__(env)
+        self.triggered = True
+        self.value = value
+        env.schedule(delay, self._fire)
+
+
+class Process(Event):
+    """Runs a generator, resuming it when the event it yielded fires."""
+
+    __slots__ = ("_generator",)
+
+    def __init__(self, env: HeapEnvironment, generator) -> None:
+        super().__init__(env)
+        self._generator = generator
+        env.schedule(0, self._resume)
+
+    @property
+    def is_alive(self) -> bool:
+        return not self.triggered
+
+    def _resume(self, event: Event = None) -> None:
+        try:
+            target = self._generator.send(None if event is None else event.value)
+        except StopIteration as stop:
+            self.succeed(stop.value)
+            return
+        if target.callbacks is None:
+            self.env.schedule(0, lambda: self._resume(target))
+        else:
+            target.callbacks.append(self._resume)
+
+
+class HeapEnvironment:
+    """The subset of `simpy.Environment` that `mass` and the agents use."""
+
+    def __init__(self, initial_time: float = 0.0) -> None:
+        self._now = initial_time
+        self._heap = list()
+        self._seq = 0
+
+    @property
+    def now(self) -> float:
+        return self._now
+
+    def schedule(self, delay: float, callback) -> None:
+        """Calls `callback()` `delay` after now; callbacks due at the same time run in scheduling order."""
+        if delay == float('inf'):
+            return
+        heapq.heappush(self._heap, (self._now+delay, self._seq, callback))
+        self._seq += 1
+
+    def timeout(self, delay: float, value=None) -> Timeout:
+        return Timeout(self, delay, value)
+
+    def event(self) -> Event:
+        return Event(self)
+
+    def process(self, generator) -> Process:
+        return Process(self, generator)
+
+    def peek(self) -> float:
+        return self._heap[0][0] if self._heap else float('inf')
+
+    def step(self) -> None:
+        self._now, _, callback = heapq.heappop(self._heap)
+        callback()
+
+    def run(self, until: float = None) -> None:
+        until = float('inf') if until is None else until
+        while self.peek() < until:
+            self.step()
@@ -0,0 +1,76 @@
+"""Streaming simulation history.
+
+A `JsonlHistorySink` can be passed as the `history` of `mass.simulate` instead of a list.
+Each row it gets becomes a `HistoryEvent`, a record with a fixed schema, and the sink
+buffers them and writes the buffer out every `buffer_rows` rows. So a long run keeps
+a constant amount of history in memory and produces a file pandas can load directly
+(`pandas.read_json(path, lines=True)`).
+
+Trace rows keep only their level and first string argument as the event; the traced
+objects are dropped. The events recorded by the agents themselves (see
+`mass.record_event`) carry the frame type, encoded size and payload id.
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+
+from mass import HistoryEvent, TraceRow
+
+HISTORY_SCHEMA = HistoryEvent._fields
+
+
+def as_history_event(row) -> HistoryEvent:
+    if isinstance(row, HistoryEvent):
+        return row
+    if isinstance(row, TraceRow):
+        event = logging.getLevelName(row.level).lower()
+        if row.args and isinstance(row.args[0], str):
+            event += ":" + row.args[0].strip()
+        return HistoryEvent(float(row.time), str(row.name), event, "", 0, "")
+    raise TypeError(f"not a history row: {row!r}")
+
+
+class JsonlHistorySink:
+    """Append-only, buffered history writer: one JSON object per event, gzip-compressed
+    if the path ends with .gz."""
+
+    def __init__(self, path: str, buffer_rows: int = 65536) -> None:
+        self.path = path
+        self.buffer_rows = buffer_rows
+        self.rows = 0
+        self._buffer = list()
+        self._file = gzip.open(path, "wt", encoding="utf8") if path.endswith(".gz") \
+            else open(path, "w", encoding="utf8")
+
+    def append(self, row) -> None:
+        self._buffer.append(as_history_event(row))
+        if len(self._buffer) >= self.buffer_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._file.write("".join(json.dumps(event._asdict())+"\n" for event in self._buffer))
+            self.rows += len(self._buffer)
+            self._buffer = list()
+
+    def close(self) -> None:
+        self.flush()
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self.rows + len(self._buffer)
+
+    def __enter__(self) -> JsonlHistorySink:
+        return self
+
+    def __exit__(self, type, value, traceback) -> None:
+        self.close()
+
+
+def open_history_sink(path: str, buffer_rows: int = 65536) -> JsonlHistorySink:
+    """The sink for the format of the path suffix: .jsonl or .jsonl.gz."""
+    if path.endswith((".jsonl", ".jsonl.gz")):
+        return JsonlHistorySink(path, buffer_rows)
+    raise ValueError(f"unknown history format: {path}")
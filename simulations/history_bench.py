@@ -0,0 +1,52 @@
+# %%
+# Memory held by the history of the sharded_sim torus run in one process: an in-memory
+# list of trace rows against a buffered, gzip-compressed JSON lines sink.
+#
+#   python history_bench.py [grid_side] [buffer_rows]
+import contextlib
+import gzip
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+from collections import Counter
+
+from history import JsonlHistorySink
+from mass import simulate
+from sharded_sim import build
+from stopwatch import Stopwatch
+
+
+def run(grid_side, history):
+    things = build(grid_side)
+    tracemalloc.start()
+    with open(os.devnull, "w") as devnull, Stopwatch() as sw, contextlib.redirect_stdout(devnull):
+        simulate("", things, history=history)
+    _, peak = tracemalloc.get_traced_memory()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return sw.total, peak, retained
+
+
+def main(grid_side: int = 5, buffer_rows: int = 1024):
+    history = list()
+    wall, peak, retained = run(grid_side, history)
+    print(f"list: rows={len(history)} wall={wall:.2f}s peak={peak/2**20:.1f}MiB "
+          f"retained after the run={retained/2**20:.1f}MiB")
+
+    path = os.path.join(tempfile.mkdtemp(), "history.jsonl.gz")
+    with JsonlHistorySink(path, buffer_rows) as sink:
+        wall, peak, retained = run(grid_side, sink)
+    print(f"sink: rows={len(sink)} wall={wall:.2f}s peak={peak/2**20:.1f}MiB "
+          f"retained after the run={retained/2**20:.1f}MiB file={os.path.getsize(path)/2**10:.0f}KiB")
+
+    with gzip.open(path, "rt") as f:
+        events = [json.loads(line) for line in f]
+    handled = Counter(e["frame_type"] for e in events if e["event"] == "handled")
+    print("handled frames by type:", dict(handled))
+    print("handled bytes:", sum(e["bytes"] for e in events if e["event"] == "handled"))
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
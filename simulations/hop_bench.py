@@ -0,0 +1,76 @@
+# %%
+# Cost of moving one ReplyFrame across one forwarding hop:
+# before - deepcopy in Agent.new_message plus deepcopy in on_response_frame,
+# after  - a single dataclasses.replace of the immutable frame.
+import timeit
+import tracemalloc
+from copy import deepcopy
+from dataclasses import replace
+from datetime import timedelta
+from uuid import uuid4
+
+import clock
+import crypto
+from cert import create_certification_authority
+from payments import PaymentChannel
+from sweetgossip import AbstractTopic, OnionLayer, OnionRoute, ReplyFrame, RequestPayload, Settler
+
+NUM_HOPS = 6
+REPEATS = 2000
+
+ca = create_certification_authority("CA")
+not_valid_after = clock.now()+timedelta(days=7)
+not_valid_before = clock.now()-timedelta(days=7)
+ca_certificate = ca.issue_certificate(
+    ca.ca_public_key, "is_ok", True, not_valid_after, not_valid_before)
+settler = Settler(ca_certificate, ca._ca_private_key, PaymentChannel(), 12)
+
+private_key, public_key = crypto.generate_asymetric_keys()
+certificate = ca.issue_certificate(
+    public_key, "is_ok", True, not_valid_after, not_valid_before)
+request_payload = RequestPayload(uuid4(), AbstractTopic(), certificate)
+request_payload.sign(private_key)
+
+onion = OnionRoute()
+for i in range(NUM_HOPS):
+    onion = onion.grow(OnionLayer(f"Node{i}"), public_key)
+
+channel = PaymentChannel()
+invoice_id, reply_payment_hash, on_accepted = settler.generate_reply_payment_trust()
+reply_invoice = channel.create_hodl_invoice(
+    4321, reply_payment_hash, on_accepted, invoice_id=invoice_id)
+promise, network_invoice, encrypted_reply_payload = settler.generate_settlement_trust(
+    b"message", reply_invoice, request_payload, certificate)
+reply_frame = ReplyFrame(encrypted_reply_payload, promise, onion, network_invoice)
+next_invoice = channel.create_hodl_invoice(
+    network_invoice.amount+1, network_invoice.payment_hash, on_accepted)
+
+
+def hop_with_deepcopy():
+    received = deepcopy(reply_frame)
+    return deepcopy(received)
+
+
+def hop_with_replace():
+    return replace(reply_frame, network_invoice=next_invoice)
+
+
+def measure(hop):
+    seconds = timeit.timeit(hop, number=REPEATS)/REPEATS
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    snapshot_before = tracemalloc.take_snapshot()
+    kept = [hop() for _ in range(100)]
+    snapshot_after = tracemalloc.take_snapshot()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(s.count_diff for s in snapshot_after.compare_to(snapshot_before, "filename"))
+    return seconds, (after-before)/len(kept), blocks/len(kept)
+
+
+# %%
+for name, hop in [("deepcopy", hop_with_deepcopy), ("replace", hop_with_replace)]:
+    seconds, bytes_per_hop, blocks_per_hop = measure(hop)
+    print(f"{name:>8}: {seconds*1e6:8.2f} us/hop {bytes_per_hop:10.0f} B/hop {blocks_per_hop:8.1f} allocs/hop")
+
+# %%
@@ -0,0 +1,40 @@
+# %%
+# Which nodes are the hotspots of the loaded priority_sim torus: every node's mailbox
+# depth, messages processed and utilisation sampled at a fixed simulated interval,
+# the nodes with the deepest mailboxes and the peak depth and mean utilisation laid
+# out on the grid. The series go to hotspots.npz for plotting, e.g.
+# `matplotlib.pyplot.imshow(numpy.load("hotspots.npz")["depth"].T)`.
+#
+#   python hotspot_sim.py [grid_side] [requests_per_customer] [interval]
+import sys
+
+import numpy as np
+
+from mass import OFF, simulate
+from priority_sim import build
+from utilisation import MailboxSampler
+
+
+def main(grid_side: int = 5, requests: int = 3, interval: float = 0.05, path: str = "hotspots.npz"):
+    grid_side, requests, interval = int(grid_side), int(requests), float(interval)
+    things = build(grid_side, requests, None)
+    sampler = MailboxSampler(interval)
+    simulate("", things, message_flow_in_trace=False, trace_level=OFF, sampler=sampler)
+
+    print(f"{len(sampler)} samples every {interval} over {sampler.times[-1]:.2f} of simulated time")
+    for name, depth in sampler.hotspots("depth"):
+        role = "customer" if things[name].is_customer else "worker" if things[name].is_worker else ""
+        i = sampler.names.index(name)
+        print(f"{name:>16} {role:>8}: peak depth {depth:4.0f}, processed {sampler.processed[:, i].sum():5d}, "
+              f"mean utilisation {sampler.utilisation[:, i].mean():.2f}")
+    with np.printoptions(precision=2, suppress=True, linewidth=120):
+        print("peak mailbox depth by grid position:")
+        print(sampler.grid("depth"))
+        print("mean utilisation by grid position:")
+        print(sampler.grid("utilisation", reduce=np.mean))
+    sampler.save(path)
+    print("heatmap matrix (nodes x samples):", sampler.matrix("depth").shape, "saved to", path)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
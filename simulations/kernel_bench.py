@@ -0,0 +1,51 @@
+# %%
+# Message throughput of the simpy kernel against the heap kernel: a million hops of a
+# message round a ring of agents doing nothing else, then the sharded_sim torus on
+# both kernels to check they agree on a real protocol run.
+#
+#   python kernel_bench.py [hops] [grid_side]
+import sys
+
+from mass import OFF, Agent, simulate
+from metrics import merge_snapshots
+from sharded_sim import build
+from stopwatch import Stopwatch
+
+NUM_AGENTS = 100
+
+
+class Passer(Agent):
+    def __init__(self, name, next_name, hops=0):
+        super().__init__(name)
+        self.next_name = next_name
+        self.hops = hops
+
+    def homeostasis(self, e):
+        if self.hops:
+            self.new_message(e, e.things[self.next_name], self.hops)
+        yield e.timeout(float('inf'))
+
+    def on_message(self, e, m):
+        if m.data:
+            self.new_message(e, e.things[self.next_name], m.data-1)
+
+
+def main(hops: int = 1000000, grid_side: int = 5):
+    for kernel in ("simpy", "heap"):
+        things = {f"Passer{i}": Passer(f"Passer{i}", f"Passer{(i+1) % NUM_AGENTS}", hops if i == 0 else 0)
+                  for i in range(NUM_AGENTS)}
+        with Stopwatch() as sw:
+            simulate("", things, message_flow_in_trace=False, trace_level=OFF, kernel=kernel)
+        print(f"{kernel:>6} ring: {hops} messages in {sw.total:.2f}s, {hops/sw.total:,.0f} messages/s")
+
+    for kernel in ("simpy", "heap"):
+        things = build(grid_side)
+        with Stopwatch() as sw:
+            simulate("", things, message_flow_in_trace=False, trace_level=OFF, kernel=kernel)
+        counts = {k: m["count"] for k, m in merge_snapshots(t.metrics.snapshot() for t in things.values()).items()}
+        replies = sum(len(t.reply_collector(t.topic_id)) for t in things.values() if t.is_customer)
+        print(f"{kernel:>6} torus {grid_side}x{grid_side}: wall={sw.total:.2f}s replies={replies} frames={counts}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
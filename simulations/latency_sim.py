@@ -0,0 +1,84 @@
+# %%
+# Broadcast-to-reply latency on a torus whose links have a lognormal propagation
+# latency and, in turn, less and less bandwidth. With a bandwidth every frame also
+# waits for its encoded size to be serialized, so the growing onions and the
+# certificates the frames carry show up in the end-to-end latency.
+#
+#   python latency_sim.py [grid_side]
+import random
+import sys
+from uuid import uuid4
+
+import numpy as np
+
+from links import Link, lognormal_latency
+from mass import OFF, simulate
+from metrics import merge_snapshots
+from sweetgossip import Settler
+from torus import TaxiNode, build_torus, create_settler, node_keys, pick_roles
+
+RANDOM_SEED = 1234
+NUM_CUSTOMERS = 4
+NUM_WORKERS = 4
+MS = 1/60000  # simulation time is in minutes
+MEDIAN_LATENCY = 40*MS
+LATENCY_SIGMA = 0.5
+LINKS = {
+    "instant": None,
+    "latency only": Link(lognormal_latency(MEDIAN_LATENCY, LATENCY_SIGMA)),
+    "10 Mbit/s": Link(lognormal_latency(MEDIAN_LATENCY, LATENCY_SIGMA), 10e6/8*60),
+    "1 Mbit/s": Link(lognormal_latency(MEDIAN_LATENCY, LATENCY_SIGMA), 1e6/8*60),
+    "256 kbit/s": Link(lognormal_latency(MEDIAN_LATENCY, LATENCY_SIGMA), 256e3/8*60),
+    "64 kbit/s": Link(lognormal_latency(MEDIAN_LATENCY, LATENCY_SIGMA), 64e3/8*60),
+}
+
+
+class LinkedNode(TaxiNode):
+    def __init__(self, name, certificate, private_key, settler: Settler):
+        super().__init__(name, certificate, private_key, settler)
+        self.time_to_first_reply = None
+
+    def homeostasis(self, e):
+        if self.is_customer:
+            yield e.timeout(1)
+            sent = e.now
+            payload_id = uuid4()
+            self.reply_collector(payload_id).subscribe(
+                lambda reply: self.time_to_first_reply is None and
+                setattr(self, "time_to_first_reply", e.now - sent))
+            self.broadcast(e, self.taxi_request(payload_id))
+        yield e.timeout(float('inf'))
+
+
+def build(grid_side, settler, keys, link):
+    things = build_torus(grid_side, keys,
+                         lambda name, certificate, private_key: LinkedNode(name, certificate, private_key, settler),
+                         link)
+    pick_roles(things, random.Random(RANDOM_SEED), NUM_CUSTOMERS, NUM_WORKERS)
+    return things
+
+
+def run(grid_side, settler, keys, link):
+    random.seed(RANDOM_SEED)
+    things = build(grid_side, settler, keys, link)
+
+    simulate("", things, message_flow_in_trace=False, trace_level=OFF)
+    times = [t.time_to_first_reply for t in things.values() if t.is_customer]
+    return times, merge_snapshots(t.metrics.snapshot() for t in things.values())
+
+
+def main(grid_side: int = 6):
+    ca, settler = create_settler()
+    keys = node_keys(ca, grid_side*grid_side)
+
+    for label, link in LINKS.items():
+        times, metrics = run(grid_side, settler, keys, link)
+        answered = np.array([t for t in times if t is not None])/MS
+        print(f"{label:>12}: first reply ms p50={np.percentile(answered, 50):7.1f} "
+              f"max={answered.max():7.1f} unanswered={len(times)-len(answered)}")
+    print("mean encoded frame bytes:", {frame_type: m["bytes"]//max(m["count"], 1)
+                                        for frame_type, m in metrics.items()})
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
@@ -0,0 +1,46 @@
+"""Simulated network links.
+
+A `Link` is the one-way connection from one thing to another. It delays every message
+by the time it takes to serialize the message onto the link, its size over the
+bandwidth, after the messages sent before it, plus a propagation latency that is a
+constant or drawn from a distribution. Things send over the link configured for the
+target with `Thing.set_link`; without one, messages arrive at once.
+"""
+from __future__ import annotations
+
+import math
+import random
+from typing import Callable, Union
+
+
+def uniform_latency(low: float, high: float) -> Callable[[], float]:
+    return lambda: random.uniform(low, high)
+
+
+def lognormal_latency(median: float, sigma: float) -> Callable[[], float]:
+    """Latencies with the given median and a long right tail, typical of wide area links."""
+    mu = math.log(median)
+    return lambda: random.lognormvariate(mu, sigma)
+
+
+class Link:
+    """`latency` in minutes, or a callable drawing one; `bandwidth` in bytes per minute (None - unlimited)."""
+
+    __slots__ = ("latency", "bandwidth", "_free_at")
+
+    def __init__(self, latency: Union[float, Callable[[], float]] = 0.0, bandwidth: float = None) -> None:
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self._free_at = 0.0
+
+    def copy(self) -> Link:
+        """A link with the same configuration and its own serialization queue."""
+        return Link(self.latency, self.bandwidth)
+
+    def delivery_delay(self, now: float, size: int) -> float:
+        """Time from `now` until a message of `size` bytes sent now arrives."""
+        sent = now
+        if self.bandwidth:
+            sent = max(now, self._free_at) + size/self.bandwidth
+            self._free_at = sent
+        return sent - now + (self.latency() if callable(self.latency) else self.latency)
@@ -0,0 +1,63 @@
+# Priority mailboxes: class order, FIFO within a class and the starvation bound.
+#
+#   python -m pytest -q mailbox_test.py
+import simpy
+
+from mass import Mailbox
+
+PRIORITIES = {"Reply": 0, "Ask": 1}
+
+
+class Reply:
+    def __init__(self, n: int) -> None:
+        self.n = n
+
+
+class Ask(Reply):
+    pass
+
+
+class Other(Reply):
+    pass
+
+
+def drain(items, priorities=PRIORITIES, max_bypass=8):
+    """Queues all `items`, then takes them out; returns the labels in the order served."""
+    env = simpy.Environment()
+    mailbox = Mailbox(env, priorities, max_bypass)
+    for item in items:
+        mailbox.put(item)
+    served = []
+
+    def consumer():
+        while len(mailbox):
+            item = yield mailbox.get()
+            served.append(f"{type(item).__name__[0]}{item.n}")
+
+    env.process(consumer())
+    env.run()
+    return served
+
+
+def test_priority_order():
+    items = [Other(0), Ask(0), Reply(0), Ask(1), Reply(1), Other(1)]
+    assert drain(items) == ["R0", "R1", "A0", "A1", "O0", "O1"]
+
+
+def test_fifo_without_priorities():
+    items = [Other(0), Ask(0), Reply(0), Ask(1)]
+    assert drain(items, priorities=None) == ["O0", "A0", "R0", "A1"]
+
+
+def test_starvation_bound():
+    items = [Ask(n) for n in range(3)]+[Reply(n) for n in range(7)]
+    served = drain(items, max_bypass=2)
+    # an ask passed over twice in a row goes next
+    assert served == ["R0", "R1", "A0", "R2", "R3", "A1", "R4", "R5", "A2", "R6"]
+
+
+def test_starvation_bound_of_every_class():
+    items = [Other(n) for n in range(2)]+[Ask(n) for n in range(3)]+[Reply(n) for n in range(8)]
+    served = drain(items, max_bypass=3)
+    # classes due at the same time go best first, so "Other" waits one extra turn for "Ask"
+    assert served == ["R0", "R1", "R2", "A0", "O0", "R3", "R4", "A1", "O1", "R5", "R6", "A2", "R7"]
@@ -3,15 +3,18 @@ import logging
 import operator
 import random
 import sys
-import uuid
-from collections import namedtuple
-from copy import deepcopy
+from collections import deque, namedtuple
 from functools import reduce
 from itertools import groupby
 
 import numpy as np
 import simpy
 import simpy.core
+import simpy.resources.base
+from simpy.core import BoundClass
+from simpy.resources.store import StoreGet, StorePut
+import clock
+from heapkernel import HeapEnvironment
 from scheduler import Scheduler
 from units import minute
 
@@ -30,54 +33,294 @@ class bcolors:
     UNDERLINE = '\x1b[4m'
 
 
-def simulation_trace(env, color: bcolors, name, *argv):
+# Trace levels, those of `logging`; a simulation prints and records the traces at or
+# above its `trace_level`, OFF disables them all.
+TRACE = logging.DEBUG
+INFO = logging.INFO
+ERROR = logging.ERROR
+OFF = logging.CRITICAL + 1
+
+_LEVEL_COLORS = {TRACE: bcolors.GRAY, INFO: bcolors.YELLOW, ERROR: bcolors.RED}
+
+TraceRow = namedtuple('TraceRow', 'sim_id time level name args')
+TraceRow.__doc__ = """A history row: the trace arguments are kept as they were passed, unformatted."""
+
+
+HistoryEvent = namedtuple('HistoryEvent', 'time agent event frame_type bytes payload_id')
+HistoryEvent.__doc__ = """A history row recorded by an agent, see `history.JsonlHistorySink` for the schema."""
+
+
+def record_event(env, agent: str, event: str, frame_type: str = "", size: int = 0, payload_id: str = ""):
+    """Appends a `HistoryEvent` to the history of `env`, if it has one."""
+    if env.history is not None:
+        env.history.append(HistoryEvent(float(env.now), agent, event, frame_type, size, payload_id))
+
+
+def tracing(env, level=TRACE) -> bool:
+    """Whether traces of `level` are enabled; guard traces with costly arguments with it."""
+    return level >= env.trace_level
+
+
+def simulation_trace(env, color: bcolors, name, *argv, level=TRACE):
     """Main debugging tool. It generates a trace 
 
     Args:
         env: the simpy environment
-        *argv: print arguments
+        color: the color of the printed arguments
+        *argv: print arguments, formatted only if `level` is enabled
+        level: the trace level
 
     Returns:
-        nothing, it just prints the trace
+        nothing, it just prints the trace and appends a `TraceRow` to the history
     """
-    if not isinstance(env,simpy.core.Environment):
+    if level < env.trace_level:
+        return
+    if not isinstance(env,(simpy.core.Environment, HeapEnvironment)):
         raise Exception("env arg should be simpy.core.Environment type")
-    n = env.now
-    sid = env.sim_id
+    print(*_trace_prefix(env.sim_id, env.now, name, color), *argv, bcolors.DEFAULT)
+    if env.history is not None:
+        env.history.append(TraceRow(env.sim_id, env.now, level, name, argv))
+
+
+def _trace_prefix(sid, n, name, color):
     d = int(n/(24*60))
     h = int((n - d*24*60)/60)
     m = int(n - d*24*60 - h*60)
     dow = [bcolors.RED+'Sun', bcolors.BLUE+'Mon', bcolors.CYAN+'Tue', bcolors.BLUE +
            'Wed', bcolors.CYAN+'Thu', bcolors.BLUE+'Fri', bcolors.RED+'Sat'][d % 7]
-    row = [sid + (" : " if sid != "" else "") + dow, str(d)+" " +
-           str(h).zfill(2)+":"+str(m).zfill(2)+bcolors.WHITE+"|"+str(name)+">" + color, *argv, bcolors.DEFAULT]
-    print(*row)
-    if env.history is not None:
-        env.history.append(row)
+    return [sid + (" : " if sid != "" else "") + dow, str(d)+" " +
+            str(h).zfill(2)+":"+str(m).zfill(2)+bcolors.WHITE+"|"+str(name)+">" + color]
+
+
+def format_trace_row(row: TraceRow) -> str:
+    """The printed form of a history row."""
+    return " ".join(map(str, [*_trace_prefix(row.sim_id, row.time, row.name, _LEVEL_COLORS.get(row.level, bcolors.GREEN)),
+                              *row.args, bcolors.DEFAULT]))
+
+
+class _MailboxClasses:
+    """The priority classes of a mailbox, see `Mailbox`."""
+
+    def _init_classes(self, priorities, max_bypass, admit):
+        self.priorities = priorities
+        self.max_bypass = max_bypass
+        self.admit = admit
+        self._default_class = max(priorities.values())+1 if priorities else 0
+        self._classes = {}
+        self._bypassed = {}
+        self._size = 0
+        # the message taken out and waiting for its service time to pass, if any
+        self.serving = None
+        self.serving_since = 0.0
+        # handled messages and the simulated time spent serving them, see `utilisation`
+        self.processed = 0
+        self.busy_time = 0.0
+
+    def class_of(self, item):
+        if self.priorities is None:
+            return 0
+        return self.priorities.get(type(getattr(item, "data", item)).__name__, self._default_class)
+
+    def _push(self, item):
+        cls = self.class_of(item)
+        if not cls in self._classes:
+            self._classes[cls] = deque()
+            self._bypassed[cls] = 0
+        self._classes[cls].append(item)
+        self._size += 1
+
+    def _pop(self):
+        if len(self._classes) == 1:
+            queue = next(iter(self._classes.values()))
+        else:
+            waiting = sorted(cls for cls, q in self._classes.items() if q)
+            chosen = next((cls for cls in waiting[1:] if self._bypassed[cls] >= self.max_bypass),
+                          waiting[0])
+            for cls in waiting:
+                self._bypassed[cls] += 1
+            self._bypassed[chosen] = 0
+            queue = self._classes[chosen]
+        self._size -= 1
+        return queue.popleft()
+
+    @property
+    def items(self):
+        return [item for cls in sorted(self._classes) for item in self._classes[cls]]
+
+    def refill(self, items):
+        """Puts back `items`, already admitted once, e.g. those of a checkpoint."""
+        for item in items:
+            self._push(item)
+
+    def __len__(self):
+        return self._size
+
+
+class Mailbox(_MailboxClasses, simpy.resources.base.BaseResource):
+    """The message queue of a `Thing`.
+
+    Without `priorities` it is a FIFO like `simpy.Store`. With `priorities` (message data
+    type name -> class, lower classes first, unlisted types after all listed ones) every
+    class is a FIFO and `get` takes from the best non-empty class. A class passed over
+    `max_bypass` times in a row while waiting is served next, so under load the low
+    classes slow down but are not starved.
+
+    If `admit` is given, `admit(item)` decides whether a put item enters the mailbox at
+    all; refused items are dropped and `put` returns None.
+    """
+
+    get = BoundClass(StoreGet)
+
+    def __init__(self, env, priorities=None, max_bypass=8, admit=None):
+        super().__init__(env, float('inf'))
+        self._init_classes(priorities, max_bypass, admit)
+
+    def put(self, item):
+        if self.admit is not None and not self.admit(item):
+            return None
+        return StorePut(self, item)
+
+    def refill(self, items):
+        super().refill(items)
+        self._trigger_get(None)
+
+    def _do_put(self, event):
+        self._push(event.item)
+        event.succeed()
+
+    def _do_get(self, event):
+        if self._size:
+            event.succeed(self._pop())
+
+
+class HeapMailbox(_MailboxClasses):
+    """The `Mailbox` of the heap kernel, with the same classes and bypass rule.
+
+    Instead of a process waiting on `get`, the one consumer of a thing is a pair of
+    callbacks: `service_time(message)` and `handle(message)`, called after it.
+    """
+
+    def __init__(self, env, priorities=None, max_bypass=8, admit=None):
+        self.env = env
+        self.service_time = None
+        self.handle = None
+        self._busy = False
+        self._init_classes(priorities, max_bypass, admit)
+
+    def put(self, item):
+        if self.admit is not None and not self.admit(item):
+            return None
+        self._push(item)
+        self._wake()
+
+    def refill(self, items):
+        super().refill(items)
+        if self._size:
+            self._wake()
+
+    def _wake(self):
+        if not self._busy:
+            self._busy = True
+            self.env.schedule(0, self._serve)
+
+    def _serve(self):
+        while self._size:
+            message = self._pop()
+            delay = self.service_time(message)
+            if delay:
+                self.serving = message
+                self.serving_since = self.env.now
+                self.env.schedule(delay, lambda: self._served(message))
+                return
+            self.handle(message)
+            self.processed += 1
+        self._busy = False
+
+    def _served(self, message):
+        self.busy_time += self.env.now - self.serving_since
+        self.serving = None
+        self.handle(message)
+        self.processed += 1
+        self._serve()
+
+
+def create_mailbox(env, priorities=None, max_bypass=8, admit=None):
+    """The mailbox kind of the kernel running `env`."""
+    if isinstance(env, HeapEnvironment):
+        return HeapMailbox(env, priorities, max_bypass, admit)
+    return Mailbox(env, priorities, max_bypass, admit)
 
 
 class Thing:
     """The base class for an `Agent` class and for a `Broadcaster` class."""
 
+    # `Mailbox` priority classes by message data type name; None keeps the mailbox FIFO
+    message_priorities = None
+    mailbox_max_bypass = 8
+
+    # template of the `links.Link` to a target without one of its own; None - no delay
+    default_link = None
+
     def __init__(self, name):
-        self.name = name
+        # names are the keys of every per-peer table; interned, they are shared, not copied
+        self.name = sys.intern(name)
+        self.links = dict()
+
+    def set_link(self, target_name, link):
+        """Sends the messages to `target_name` over `link` (see links.py)."""
+        self.links[target_name] = link
+
+    def link_to(self, target):
+        link = self.links.get(target.name)
+        if link is None and self.default_link is not None:
+            link = self.links[target.name] = self.default_link.copy()
+        return link
+
+    def message_size(self, data):
+        """Encoded size of the message data in bytes; sets the serialization delay on links with a bandwidth."""
+        return 0
 
     def create_queue(self, env):
-        self.queue = simpy.Store(env)
+        self.queue = create_mailbox(env, self.message_priorities, self.mailbox_max_bypass)
+
+    def service_time(self, msg):
+        """Simulation time it takes to process `msg` before it is handled; the mailbox fills up meanwhile."""
+        return 0
+
+    def neighbours(self):
+        """Names of the things this one sends messages to; used to partition sharded simulations."""
+        return ()
 
     def trace(self, env, *args):
-        simulation_trace(env, bcolors.GRAY, self.name, *args)
+        if TRACE >= env.trace_level:
+            simulation_trace(env, bcolors.GRAY, self.name, *args, level=TRACE)
 
     def info(self, env, *args):
-        simulation_trace(env, bcolors.YELLOW, self.name, *args)
+        if INFO >= env.trace_level:
+            simulation_trace(env, bcolors.YELLOW, self.name, *args, level=INFO)
 
     def error(self, env, *args):
-        simulation_trace(env, bcolors.RED, self.name, *args)
+        if ERROR >= env.trace_level:
+            simulation_trace(env, bcolors.RED, self.name, *args, level=ERROR)
 
     def homeostasis(self, env):
         self.trace(env, "STARTS")
         yield env.timeout(float('inf'))
 
+    def resume(self, env):
+        """Runs instead of `homeostasis` when the thing is restored from a checkpoint.
+
+        Running generators cannot be saved, so a restored thing does not go on with its
+        `homeostasis` where it was; override this to re-arm its periodic work.
+        """
+        yield env.timeout(float('inf'))
+
+    def __getstate__(self):
+        # the mailbox belongs to the environment; checkpoints save its messages apart
+        state = self.__dict__.copy()
+        state.pop("queue", None)
+        return state
+
 
 CollectingItem = namedtuple(
     'CollectingItem', 'sid collecting_condition collection')
@@ -121,7 +364,7 @@ class Agent(Thing, Scheduler):
             A reply to reply messages (None means that timeout was reached before the reply to this reply was delivered)
         """
 
-        data = deepcopy(data)
+        data = dict(data)
 
         def generator():
             item = self._prepare_for_response(env)
@@ -149,25 +392,32 @@ class Agent(Thing, Scheduler):
         Returns:
             Nothing
         """
-        data = deepcopy(data)
-
         rpl = msg.reply(env, data)
         rpl.target.queue.put(rpl)
 
-    def new_message(self, env, target, data):
+    def new_message(self, env, target, data, size=None):
         """Send a new message to another Agent
 
+        The content is delivered by reference, not copied, so it must not be modified after sending.
+
         Args:
             env: The simpy environment.
             target(agent): The target of the message
             data (dict): A message content
+            size (int): `message_size(data)` if the caller already has it
         Returns:
             Nothing
         """
-        data = deepcopy(data)
-
-        msg = DirectMessage(sender=self, target=target, data=data)
-        target.queue.put(msg)
+        msg = DirectMessage(sender=self, target=target, data=data, size=size)
+        link = self.link_to(target)
+        if link is not None and link.bandwidth and msg.size is None:
+            msg.size = self.message_size(data)
+        delay = 0 if link is None else link.delivery_delay(
+            env.now, msg.size if link.bandwidth else 0)
+        if delay > 0:
+            env.timeout(delay).callbacks.append(Delivery(target, msg))
+        else:
+            target.queue.put(msg)
 
     def new_message_and_wait(self, env, target, data, timeout=None):
         """Send a new message to another Agent
@@ -181,8 +431,6 @@ class Agent(Thing, Scheduler):
             A reply to message (None means that timeout was reached before the reply was delivered)
         """
 
-        data = deepcopy(data)
-
         def generator():
             msg = DirectMessage(sender=self, target=target, data=data)
             target.queue.put(msg)
@@ -199,7 +447,8 @@ class Agent(Thing, Scheduler):
         return env.process(generator())
 
     def start_state(self, env, m):
-        self.trace(env, "received a request ", m.data, "from", m.sender)
+        if TRACE >= env.trace_level:
+            self.trace(env, "received a request ", m.data, "from", m.sender)
         if (m.data is not None):
             if (inspect.isgeneratorfunction(self.on_message)):
                 env.process(self.on_message(env, m))
@@ -228,13 +477,25 @@ class Agent(Thing, Scheduler):
 
 class DirectMessage:
     """The message class.
+
+    Ids are sequence numbers, unique within a simulation process. `size` is the encoded
+    size of the data (see `Thing.message_size`) once the sender has computed it, so the
+    receiver does not compute it again; None if not known.
     """
 
-    def __init__(self, sender, target, data, id=None):
+    __slots__ = ("sender", "target", "data", "id", "size")
+
+    _next_id = 0
+
+    def __init__(self, sender, target, data, id=None, size=None):
         self.sender = sender
         self.target = target
         self.data = data
-        self.id = uuid.uuid4() if id is None else id
+        self.size = size
+        if id is None:
+            id = DirectMessage._next_id
+            DirectMessage._next_id += 1
+        self.id = id
 
     def reply(self, env, data):
         """The method that creates the reply message for `self`"""
@@ -252,51 +513,106 @@ class DirectMessage:
             ("DATA:" + str(self.data)) if not self.data is None else "") + " ]--> " + str(self.target)
 
 
+class Delivery:
+    """The callback putting a message delayed by a link into the target mailbox."""
+
+    __slots__ = ("target", "message")
+
+    def __init__(self, target, message):
+        self.target = target
+        self.message = message
+
+    def __call__(self, _):
+        self.target.queue.put(self.message)
+
+
+def _deliver(env, message, message_flow_in_trace):
+    if message_flow_in_trace and TRACE >= env.trace_level:
+        simulation_trace(env, bcolors.GREEN, "", message.sender, ">--[",
+                         *(("DATA:", message.data) if not message.data is None else ()),
+                         "]-->",
+                         message.target)
+
+    message.target.start_state(env, message)
+
+
 def _message_loop(target, env, message_flow_in_trace):
     while (True):
         message = yield target.queue.get()
 
-        if message_flow_in_trace:
-            simulation_trace(env, bcolors.GREEN, "", message.sender, ">--[",
-                             ("DATA:" + str(message.data)
-                              ) if not message.data is None else "",
-                             "]-->",
-                             message.target)
+        delay = target.service_time(message)
+        if delay:
+            target.queue.serving = message
+            target.queue.serving_since = env.now
+            yield env.timeout(delay)
+            target.queue.busy_time += delay
+            target.queue.serving = None
+
+        _deliver(env, message, message_flow_in_trace)
+        target.queue.processed += 1
 
-        message.target.start_state(env, message)
 
+def _consume_mailbox(target, env, message_flow_in_trace):
+    """The heap kernel counterpart of `_message_loop`."""
+    target.queue.service_time = target.service_time
+    target.queue.handle = lambda message: _deliver(env, message, message_flow_in_trace)
 
-def simulate(sim_id, things, until=None, history=None, message_flow_in_trace=True):
+
+def simulate(sim_id, things, until=None, history=None, message_flow_in_trace=True, start=None, trace_level=TRACE, kernel="simpy", resume=None, sampler=None):
     """The simulation entry message
 
     Args:
         msgs (list of messages): the initial list of messages
         things (list of things): the initial list of things (agents and broadcasters)
-        until (int): simulation time (None - forever)
+        until (int): simulation time (None - until no events are left); messages still
+            in the mailboxes at `until` stay there
+        start (datetime): protocol time (see `clock`) at simulation time 0 (None - the current time)
+        history (list or history.JsonlHistorySink): if given, the `TraceRow`s of the enabled
+            traces and the `HistoryEvent`s recorded by the agents are appended to it
+        trace_level: the lowest trace level printed and recorded (OFF - none)
+        kernel: "simpy", or "heap" for the lighter `heapkernel`, which runs agents that
+            do not create simpy objects themselves
+        resume (checkpoint.Checkpoint): continues the saved simulation, whose `things`
+            must be passed, on its own environment and kernel, from its saved time
+        sampler (utilisation.MailboxSampler): if given, records the mailbox depth and
+            utilisation of every thing at its fixed simulated interval
     """
 
-    env = simpy.Environment()
+    if resume is not None:
+        env = resume.env
+        kernel = "heap" if isinstance(env, HeapEnvironment) else "simpy"
+    elif kernel == "simpy":
+        env = simpy.Environment()
+    elif kernel == "heap":
+        env = HeapEnvironment()
+    else:
+        raise ValueError(f"unknown kernel {kernel!r}")
+    if resume is None:
+        env.start = clock.now() if start is None else start
     env.sim_id = sim_id
     env.things = things
     env.history = history
-
-    for k, t in things.items():
-        t.create_queue(env)
-        env.process(t.homeostasis(env))
-
-    until = float('inf') if until is None else until
-    lastnow = 0
-
-    while True:
+    env.trace_level = trace_level
+    previous_clock = clock.set_clock(clock.SimulationClock(env, env.start))
+    try:
         for k, t in things.items():
-            env.process(_message_loop(t, env, message_flow_in_trace))
-
+            t.create_queue(env)
+            env.process(t.homeostasis(env) if resume is None else t.resume(env))
+            if kernel == "heap":
+                _consume_mailbox(t, env, message_flow_in_trace)
+            else:
+                env.process(_message_loop(t, env, message_flow_in_trace))
+        if resume is not None:
+            resume.restore()
+        if sampler is not None:
+            sampler.start(env)
+
+        # Every thing has exactly one mailbox consumer, always either waiting on its mailbox
+        # or serving a message, so a message can never sit in a mailbox without an event
+        # that takes it out: the run is quiescent as soon as the event heap is empty.
+        until = float('inf') if until is None else until
         while env.peek() < until:
-            lastnow = env.now
             env.step()
-
-        if not any(t.queue.items for t in things.values()):
-            break
-
-        env._now = lastnow
+    finally:
+        clock.set_clock(previous_clock)
     return env
@@ -0,0 +1,273 @@
+"""Sharded variant of `mass.simulate` that spreads the agents over worker processes.
+
+The topology (`Thing.neighbours`) is cut into `num_shards` connected blocks and every
+block runs in its own forked process with its own simpy environment. All messages,
+local or not, take `link_latency` to arrive. That latency is the lookahead of a
+conservative, window-based synchronization. The shards advance together in windows of
+`link_latency` sim time. A message sent inside a window can only arrive after the
+window ends, so the shards swap their cross-shard messages at every window boundary
+and none of them ever receives a message from its past. Windows with no events are
+skipped.
+
+Every shard starts from the same `seed`. Messages are delivered in (arrival time,
+sender, send order) order whatever shard they come from, so a run is reproducible
+for a given seed and gives the same result for any number of shards.
+
+Limits:
+
+- The shards are forked processes. Only messages cross between them; everything else
+  is a per-process copy, including module globals such as `sweetgossip.InvoiceById`, the
+  payment channels and the settler. Settlement across shards therefore cannot work. A
+  customer paying a reply invoice that the settler issued in another shard's process
+  finds no preimage for it (KeyError in `OnSettementCommand`). The same goes for hodl
+  invoices of routing nodes in other shards. Scenarios that settle must keep the whole
+  reply path in one shard, or run on `mass.simulate`.
+- `link_latency` is one constant for every message, local or cross-shard, whatever the
+  peers. A `links.Link` set with `Thing.set_link` only adds its delay on top, so latency
+  variation has to come from the links, and the constant is always paid.
+- Speedup comes only from running the shards on separate CPUs. It pays off when handlers
+  do real work (signatures, proof of work), and is at best about
+  min(num_shards, CPUs) less the cost of forking, pickling the cross-shard messages and
+  a barrier every window. Small windows, chatty topologies or a single CPU make a
+  sharded run slower than the single-process `mass.simulate`.
+"""
+import multiprocessing
+import pickle
+import random
+import traceback
+from collections import deque, namedtuple
+
+import numpy as np
+import simpy
+
+import clock
+from mass import TRACE, DirectMessage, TraceRow, _message_loop
+
+ShardedResult = namedtuple(
+    'ShardedResult', 'shard_of windows cross_shard_messages collected')
+
+
+def partition(things, num_shards):
+    """Splits `things` into `num_shards` blocks of neighbouring things by breadth-first search.
+
+    Returns:
+        dict: thing name -> shard number
+    """
+    block_size = -(-len(things) // num_shards)
+    shard_of = {}
+    for root in sorted(things):
+        if root in shard_of:
+            continue
+        todo = deque([root])
+        while todo:
+            name = todo.popleft()
+            if name in shard_of:
+                continue
+            shard_of[name] = len(shard_of) // block_size
+            todo.extend(sorted(n for n in things[name].neighbours()
+                               if n in things and n not in shard_of))
+    return shard_of
+
+
+class _Links:
+    """Messages sent by the things of one shard during the current window.
+
+    Every message is stamped with (arrival time, sender, per-sender sequence number).
+    Local and cross-shard messages alike are delivered at the next window boundary in
+    stamp order, so the delivery order does not depend on how the things are sharded.
+    """
+
+    def __init__(self, env, latency, codec):
+        self.env = env
+        self.latency = latency
+        self.codec = codec
+        self.local = []
+        self.outgoing = []
+        self._sent = {}
+
+    def stamp(self, msg):
+        seq = self._sent.get(msg.sender.name, 0)
+        self._sent[msg.sender.name] = seq+1
+        return self.env.now+self.latency, msg.sender.name, seq
+
+    def next_arrival(self):
+        return min((m[0] for m in self.local), default=float('inf'))
+
+    def deliver(self, incoming, things):
+        arriving = self.local + [(time, sender, seq, DirectMessage(
+            sender=things[sender], target=things[target], data=self.codec.loads(data)))
+            for time, sender, seq, target, data in incoming]
+        self.local = []
+        for time, _, _, msg in sorted(arriving, key=lambda m: m[:3]):
+            self.env.timeout(time - self.env.now).callbacks.append(
+                lambda _, msg=msg: msg.target.queue.store.put(msg))
+
+
+def _store_attribute(name):
+    return property(lambda self: getattr(self.store, name),
+                    lambda self, value: setattr(self.store, name, value))
+
+
+class _LinkQueue:
+    """Mailbox of a local thing; what is put into it arrives one link latency later."""
+
+    # the consumer bookkeeping of `mass._message_loop` lives on the wrapped mailbox
+    serving = _store_attribute("serving")
+    serving_since = _store_attribute("serving_since")
+    processed = _store_attribute("processed")
+    busy_time = _store_attribute("busy_time")
+
+    def __init__(self, links, store):
+        self.links = links
+        self.store = store
+
+    def put(self, msg):
+        self.links.local.append((*self.links.stamp(msg), msg))
+
+    def get(self):
+        return self.store.get()
+
+    @property
+    def items(self):
+        return self.store.items
+
+    def __len__(self):
+        return len(self.store)
+
+
+class _Outbox:
+    """Stands in for the mailbox of a thing living in another shard."""
+
+    def __init__(self, links):
+        self.links = links
+        self.items = []
+
+    def put(self, msg):
+        self.links.outgoing.append(
+            (*self.links.stamp(msg), msg.target.name, self.links.codec.dumps(msg.data)))
+
+
+def _run_shard(sim_id, things, shard_of, shard, link_latency, seed, codec, collect, history, message_flow_in_trace, start, trace_level, conn):
+    try:
+        random.seed(seed)
+        np.random.seed(seed)
+
+        env = simpy.Environment()
+        env.sim_id = sim_id
+        env.things = things
+        env.history = history
+        env.trace_level = trace_level
+        clock.set_clock(clock.SimulationClock(env, start))
+
+        links = _Links(env, link_latency, codec)
+        local = {}
+        for k, t in things.items():
+            if shard_of[k] == shard:
+                local[k] = t
+                t.create_queue(env)
+                t.queue = _LinkQueue(links, t.queue)
+            else:
+                t.queue = _Outbox(links)
+        for t in local.values():
+            env.process(t.homeostasis(env))
+            env.process(_message_loop(t, env, message_flow_in_trace))
+
+        while True:
+            cmd, until, incoming = conn.recv()
+            if cmd == "stop":
+                break
+            links.deliver(incoming, things)
+            while env.peek() < until:
+                env.step()
+            conn.send(("ok", links.outgoing, min(env.peek(), links.next_arrival())))
+            links.outgoing = []
+        # trace arguments reference live things; only their printed form leaves the shard
+        conn.send(("ok", collect(env, local), None if history is None else
+                   [row._replace(args=tuple(map(str, row.args))) if isinstance(row, TraceRow) else row
+                    for row in history]))
+    except Exception:
+        conn.send(("error", traceback.format_exc(), None))
+
+
+def simulate_sharded(sim_id, things, num_shards, link_latency, until=None, seed=0, codec=pickle, collect=None, history=None, message_flow_in_trace=True, start=None, trace_level=TRACE):
+    """Runs `things` sharded over `num_shards` processes.
+
+    Args:
+        sim_id: the simulation id put in the traces
+        things (dict): name -> thing, fully built and connected; inherited by the forked shards
+        num_shards (int): number of worker processes
+        link_latency (float): delivery time of every message, also the synchronization window
+        until (float): simulation time (None - until no events are left)
+        seed (int): seed of `random` and `numpy.random` in every shard
+        codec: `dumps`/`loads` pair used for the data of cross-shard messages
+        collect: `collect(env, local_things)` is called in each shard at the end; its
+            picklable result is returned
+        history (list): if given, extended with the `TraceRow`s of all the shards, shard by
+            shard, their arguments formatted
+        start (datetime): protocol time at simulation time 0, shared by all the shards
+            (None - the current time)
+        trace_level: the lowest trace level printed and recorded (see `mass.simulate`)
+
+    Returns:
+        ShardedResult with the partition, the number of windows and cross-shard messages,
+        and the `collect` results by shard
+    """
+    if link_latency <= 0:
+        raise ValueError("link_latency is the lookahead and has to be positive")
+    ctx = multiprocessing.get_context("fork")
+
+    collect = (lambda env, local: None) if collect is None else collect
+    until = float('inf') if until is None else until
+    shard_of = partition(things, num_shards)
+    start = clock.now() if start is None else start
+
+    conns, processes = [], []
+    for shard in range(num_shards):
+        parent_conn, child_conn = ctx.Pipe()
+        p = ctx.Process(target=_run_shard,
+                        args=(sim_id, things, shard_of, shard, link_latency, seed, codec, collect,
+                              None if history is None else [], message_flow_in_trace, start, trace_level,
+                              child_conn))
+        p.start()
+        conns.append(parent_conn)
+        processes.append(p)
+
+    def receive(conn):
+        status, a, b = conn.recv()
+        if status == "error":
+            for p in processes:
+                p.terminate()
+            raise RuntimeError("shard failed:\n" + a)
+        return a, b
+
+    inboxes = [[] for _ in range(num_shards)]
+    windows = 0
+    cross_shard_messages = 0
+    now = 0.0
+    while now < until:
+        end = min(now+link_latency, until)
+        for shard, conn in enumerate(conns):
+            conn.send(("advance", end, inboxes[shard]))
+        inboxes = [[] for _ in range(num_shards)]
+        next_times = []
+        for conn in conns:
+            outgoing, peek = receive(conn)
+            next_times.append(peek)
+            for m in outgoing:
+                inboxes[shard_of[m[3]]].append(m)
+                next_times.append(m[0])
+            cross_shard_messages += len(outgoing)
+        windows += 1
+        now = max(min(next_times), end)
+
+    collected = []
+    for conn in conns:
+        conn.send(("stop", None, None))
+    for conn in conns:
+        result, shard_history = receive(conn)
+        collected.append(result)
+        if history is not None:
+            history.extend(shard_history)
+    for p in processes:
+        p.join()
+    return ShardedResult(shard_of, windows, cross_shard_messages, collected)
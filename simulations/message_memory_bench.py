@@ -0,0 +1,66 @@
+# %%
+# Bytes per in-flight message: a million messages queued in one mailbox, measured with
+# tracemalloc. The envelope alone (all messages share one frame) is compared with the
+# former representation, a `__dict__` object with a uuid4 id; then every message gets
+# a frame of its own, as in a real run.
+#
+#   python message_memory_bench.py [messages]
+import gc
+import sys
+import tracemalloc
+import uuid
+from datetime import timedelta
+
+import clock
+from heapkernel import HeapEnvironment
+from mass import Agent, DirectMessage, create_mailbox
+from pow import WorkRequest
+from stopwatch import Stopwatch
+from sweetgossip import POWBroadcastConditionsFrame
+
+
+class DictMessage:
+    """`DirectMessage` as it was: attributes in a `__dict__`, a uuid4 id."""
+
+    def __init__(self, sender, target, data, id=None):
+        self.sender = sender
+        self.target = target
+        self.data = data
+        self.id = uuid.uuid4() if id is None else id
+
+
+def measure(label, count, make):
+    sender, target = Agent("Sender"), Agent("Target")
+    queue = create_mailbox(HeapEnvironment())
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    with Stopwatch() as sw:
+        for i in range(count):
+            queue.put(make(sender, target, i))
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]-before
+    tracemalloc.stop()
+    print(f"{label:>34}: {used/count:6.1f} B/message, {count/sw.total:,.0f} messages/s queued")
+    return used/count
+
+
+def main(count: int = 1000000):
+    shared = POWBroadcastConditionsFrame(uuid.uuid4(), clock.now(), WorkRequest("sha256", 0), timedelta(days=1))
+    work_request = WorkRequest("sha256", 0)
+    valid_till = clock.now()
+    tolerance = timedelta(days=1)
+
+    legacy = measure("uuid4 id, __dict__ envelope", count,
+                     lambda s, t, i: DictMessage(s, t, shared))
+    compact = measure("sequence id, __slots__ envelope", count,
+                      lambda s, t, i: DirectMessage(s, t, shared))
+    measure("with its own conditions frame", count,
+            lambda s, t, i: DirectMessage(s, t, POWBroadcastConditionsFrame(
+                uuid.uuid4(), valid_till, work_request, tolerance)))
+    print(f"envelope: {legacy/compact:.1f}x smaller; DirectMessage {sys.getsizeof(DirectMessage(None, None, None))} B, "
+          f"frame {sys.getsizeof(shared)} B, uuid {sys.getsizeof(shared.ask_id)+sys.getsizeof(shared.ask_id.int)} B")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable
+
+
+class FrameTypeMetrics:
+    """Counters for one frame type: received count and bytes, handler latency, rejects
+    and the deepest mailbox a frame of this type arrived at.
+
+    Handler latencies go into a log2 histogram of microseconds: bucket `b` counts
+    handler calls that took less than 2**b us (and at least 2**(b-1) us).
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.bytes = 0
+        self.total_latency = 0.0
+        self.latency_histogram: Dict[int, int] = dict()
+        self.rejects: Dict[str, int] = dict()
+        self.max_queue_depth = 0
+
+    def record_arrival(self, queue_depth: int) -> None:
+        self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+
+    def record_handled(self, size: int, seconds: float) -> None:
+        self.count += 1
+        self.bytes += size
+        self.total_latency += seconds
+        bucket = int(seconds*1e6).bit_length()
+        self.latency_histogram[bucket] = self.latency_histogram.get(bucket, 0)+1
+
+    def record_reject(self, reason: str) -> None:
+        self.rejects[reason] = self.rejects.get(reason, 0)+1
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "bytes": self.bytes,
+            "total_latency": self.total_latency,
+            "latency_histogram_us": {2**b: n for b, n in sorted(self.latency_histogram.items())},
+            "rejects": dict(self.rejects),
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+
+class FrameMetrics:
+    """Per-frame-type metrics of one node."""
+
+    def __init__(self) -> None:
+        self._by_type: Dict[str, FrameTypeMetrics] = dict()
+
+    def for_type(self, frame_type: str) -> FrameTypeMetrics:
+        if not frame_type in self._by_type:
+            self._by_type[frame_type] = FrameTypeMetrics()
+        return self._by_type[frame_type]
+
+    def record_arrival(self, frame_type: str, queue_depth: int) -> None:
+        self.for_type(frame_type).record_arrival(queue_depth)
+
+    def record_handled(self, frame_type: str, size: int, seconds: float) -> None:
+        self.for_type(frame_type).record_handled(size, seconds)
+
+    def record_reject(self, frame_type: str, reason: str) -> None:
+        self.for_type(frame_type).record_reject(reason)
+
+    def snapshot(self) -> Dict[str, dict]:
+        return {frame_type: m.snapshot() for frame_type, m in sorted(self._by_type.items())}
+
+
+def merge_snapshots(snapshots: Iterable[Dict[str, dict]]) -> Dict[str, dict]:
+    """Sums `FrameMetrics.snapshot()`s, e.g. of all nodes of a simulation."""
+    merged: Dict[str, dict] = dict()
+    for snapshot in snapshots:
+        for frame_type, s in snapshot.items():
+            if not frame_type in merged:
+                merged[frame_type] = {"count": 0, "bytes": 0, "total_latency": 0.0,
+                                      "latency_histogram_us": dict(), "rejects": dict(),
+                                "max_queue_depth": 0}
+            m = merged[frame_type]
+            m["count"] += s["count"]
+            m["bytes"] += s["bytes"]
+            m["total_latency"] += s["total_latency"]
+            m["max_queue_depth"] = max(m["max_queue_depth"], s["max_queue_depth"])
+            for k in ("latency_histogram_us", "rejects"):
+                for key, n in s[k].items():
+                    m[k][key] = m[k].get(key, 0)+n
+    for m in merged.values():
+        m["latency_histogram_us"] = dict(sorted(m["latency_histogram_us"].items()))
+    return merged
@@ -12,15 +12,26 @@ def moval(v):
 
 CUR_INT = 0
 
+
+def fields_of(obj):
+    """(name, value) pairs of an object's attributes, whether kept in `__dict__` or in `__slots__`."""
+    if hasattr(obj, "__dict__"):
+        return vars(obj).items()
+    return [(k, getattr(obj, k)) for cls in reversed(type(obj).__mro__)
+            for k in getattr(cls, "__slots__", ()) if hasattr(obj, k)]
+
+
 class ReprObject:
+    __slots__ = ()
+
     def __repr__(self):
         global CUR_INT
         try:
             spaces = ' '*CUR_INT
             CUR_INT+=1
             head = f"{self.__class__.__name__}"
-            items = [f"{k}={moval(v)}" for k, v in vars(
-                self).items() if k[0] != '_']
+            items = [f"{k}={moval(v)}" for k, v in fields_of(
+                self) if k[0] != '_']
             if len(items) == 0:
                 return head+"()\n"+spaces
             elif len(items) == 1:
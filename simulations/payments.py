@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
+import clock
 from myrepr import ReprObject
 from crypto import compute_sha512, generate_symmetric_key
 from collections.abc import Callable
@@ -12,6 +13,9 @@ def compute_payment_hash(preimage: bytes) -> bytes:
 
 
 class HodlInvoice(ReprObject):
+    __slots__ = ("id", "payment_hash", "amount", "valid_till", "is_accepted", "is_settled",
+                 "on_accepted", "on_settled", "preimage")
+
     def __init__(self, payment_hash: bytes, amount: int,
                  on_accepted: Callable[[HodlInvoice]],
                  valid_till: datetime,
@@ -27,6 +31,8 @@ class HodlInvoice(ReprObject):
 
 
 class Invoice(ReprObject):
+    __slots__ = ("_preimage", "payment_hash", "amount", "valid_till", "is_accepted")
+
     def __init__(self, preimage: bytes, amount: int,
                  valid_till: datetime,
                  ) -> None:
@@ -53,7 +59,7 @@ class PaymentChannel(ReprObject):
     def pay_hodl_invoice(self, invoice: HodlInvoice, on_settled: Callable[[HodlInvoice, bytes]]) -> None:
         if invoice.is_accepted:
             return
-        if datetime.now() > invoice.valid_till:
+        if clock.now() > invoice.valid_till:
             return
 
         invoice.on_settled = on_settled
@@ -45,6 +45,8 @@ def compute_pow(obj, pow_scheme: str, pow_target: int) -> int:
 
 
 class ProofOfWork(ReprObject):
+    __slots__ = ("pow_scheme", "pow_target", "nuance")
+
     def __init__(self, pow_scheme: str, pow_target: int, nuance: int) -> None:
         self.pow_scheme = pow_scheme
         self.pow_target = pow_target
@@ -56,6 +58,8 @@ class ProofOfWork(ReprObject):
 
 
 class WorkRequest(ReprObject):
+    __slots__ = ("pow_scheme", "pow_target")
+
     def __init__(self, pow_scheme: str, pow_target: int) -> None:
         self.pow_scheme = pow_scheme
         self.pow_target = pow_target
@@ -0,0 +1,81 @@
+# %%
+# Time to first reply on a loaded torus with FIFO mailboxes against priority mailboxes.
+# Every frame costs its receiver SERVICE_TIMES of simulation time, so mailboxes fill up
+# while customers keep broadcasting.
+#
+#   python priority_sim.py [grid_side] [requests_per_customer]
+import random
+import sys
+from uuid import uuid4
+
+import numpy as np
+
+from mass import OFF, simulate
+from sweetgossip import DEFAULT_MESSAGE_PRIORITIES, Settler
+from torus import TaxiNode, build_torus, create_settler, node_keys, pick_roles
+
+RANDOM_SEED = 1234
+NUM_CUSTOMERS = 8
+NUM_WORKERS = 4
+REQUEST_INTERVAL = 0.2
+SERVICE_TIMES = {
+    "AskForBroadcastFrame": 0.01,
+    "POWBroadcastConditionsFrame": 0.01,
+    "POWBroadcastFrame": 0.03,
+    "ReplyFrame": 0.02,
+    "InterestSummaryFrame": 0.005,
+}
+
+
+class LoadedNode(TaxiNode):
+    def __init__(self, name, certificate, private_key, settler: Settler, message_priorities, requests: int):
+        super().__init__(name, certificate, private_key, settler)
+        self.message_priorities = message_priorities
+        self.requests = requests
+        self.time_to_first_reply = dict()
+
+    def service_time(self, msg):
+        return SERVICE_TIMES.get(type(msg.data).__name__, 0)
+
+    def homeostasis(self, e):
+        if self.is_customer:
+            for _ in range(self.requests):
+                payload_id = uuid4()
+                sent = e.now
+                self.time_to_first_reply[payload_id] = None
+                self.reply_collector(payload_id).subscribe(
+                    lambda reply, payload_id=payload_id, sent=sent:
+                    self.time_to_first_reply[payload_id] is None and
+                    self.time_to_first_reply.__setitem__(payload_id, e.now - sent))
+                self.broadcast(e, self.taxi_request(payload_id))
+                yield e.timeout(REQUEST_INTERVAL)
+        yield e.timeout(float('inf'))
+
+
+def build(grid_side: int, requests: int, message_priorities):
+    ca, settler = create_settler()
+    things = build_torus(grid_side, node_keys(ca, grid_side*grid_side),
+                         lambda name, certificate, private_key: LoadedNode(
+                             name, certificate, private_key, settler, message_priorities, requests))
+    pick_roles(things, random.Random(RANDOM_SEED), NUM_CUSTOMERS, NUM_WORKERS)
+    return things
+
+
+def run(grid_side: int, requests: int, message_priorities):
+    things = build(grid_side, requests, message_priorities)
+    simulate("", things, message_flow_in_trace=False, trace_level=OFF)
+    return [t for node in things.values() for t in node.time_to_first_reply.values()]
+
+
+def main(grid_side: int = 5, requests: int = 3):
+    for label, priorities in (("fifo", None), ("priority", DEFAULT_MESSAGE_PRIORITIES)):
+        times = run(grid_side, requests, priorities)
+        answered = np.array([t for t in times if t is not None])
+        print(f"{label:>8}: requests={len(times)} unanswered={len(times)-len(answered)} "
+              f"time to first reply p50={np.percentile(answered, 50):.2f} "
+              f"p90={np.percentile(answered, 90):.2f} p99={np.percentile(answered, 99):.2f} "
+              f"max={answered.max():.2f}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
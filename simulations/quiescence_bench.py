@@ -0,0 +1,56 @@
+# %%
+# Live simulation processes at the end of runs cut off by `until` while mailboxes are
+# backed up: producers send faster than their consumer serves. With one mailbox
+# consumer per thing the count stays at one per thing, however long the run.
+#
+#   python quiescence_bench.py [num_producers]
+import gc
+import inspect
+import sys
+
+import simpy
+
+from mass import OFF, Agent, simulate
+
+SEND_INTERVAL = 0.01
+SERVICE_TIME = 0.05
+
+
+class Producer(Agent):
+    def homeostasis(self, e):
+        while True:
+            self.new_message(e, e.things["Consumer"], self.name)
+            yield e.timeout(SEND_INTERVAL)
+
+
+class Consumer(Agent):
+    def __init__(self, name):
+        super().__init__(name)
+        self.served = 0
+
+    def service_time(self, msg):
+        return SERVICE_TIME
+
+    def on_message(self, e, m):
+        self.served += 1
+
+
+def live_processes():
+    gc.collect()
+    return sum(1 for o in gc.get_objects()
+               if isinstance(o, simpy.events.Process) and o.is_alive)
+
+
+def main(num_producers: int = 10):
+    print(f"{'until':>6} {'now':>7} {'served':>7} {'backlog':>8} {'processes':>10}")
+    for until in (1, 10, 100, 1000):
+        things = {f"Producer{i}": Producer(f"Producer{i}") for i in range(num_producers)}
+        things["Consumer"] = Consumer("Consumer")
+        env = simulate("", things, until=until, message_flow_in_trace=False, trace_level=OFF)
+        print(f"{until:6d} {env.now:7.2f} {things['Consumer'].served:7d} "
+              f"{len(things['Consumer'].queue):8d} {live_processes():10d}")
+        del env, things
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
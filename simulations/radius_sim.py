@@ -0,0 +1,64 @@
+# %%
+# Flood cost against the hop budget of a request on a torus. One customer broadcasts a
+# single request; for every budget we count the frames it costs, the nodes it reaches
+# and whether the only worker, on the far side of the torus, answers.
+#
+#   python radius_sim.py [grid_side]
+import sys
+from datetime import timedelta
+from uuid import uuid4
+
+from mass import OFF, simulate
+from metrics import merge_snapshots
+from sweetgossip import Settler, geohash_broadcast_radius
+from torus import TaxiNode, TaxiTopic, build_torus, create_settler, node_keys
+
+
+class GeohashTaxiTopic(TaxiTopic):
+    def broadcast_radius(self) -> int:
+        return geohash_broadcast_radius(self.from_geohash)
+
+
+class GridNode(TaxiNode):
+    def __init__(self, name, certificate, private_key, settler: Settler):
+        super().__init__(name, certificate, private_key, settler,
+                         timestamp_tolerance=timedelta(seconds=10))
+        self.request = None
+
+    def homeostasis(self, e):
+        if self.request is not None:
+            self.broadcast(e, self.request)
+        yield e.timeout(float('inf'))
+
+
+def run(grid_side, settler, keys, max_hops):
+    things = build_torus(grid_side, keys,
+                         lambda name, certificate, private_key: GridNode(name, certificate, private_key, settler))
+
+    customer = things["GridNode<0,0>"]
+    things[f"GridNode<{grid_side//2},{grid_side//2}>"].is_worker = True
+    customer.request = customer.taxi_request(uuid4(), timedelta(minutes=20), GeohashTaxiTopic, max_hops)
+
+    simulate("", things, message_flow_in_trace=False, trace_level=OFF)
+    metrics = merge_snapshots(t.metrics.snapshot() for t in things.values())
+    frames = sum(m["count"] for frame_type, m in metrics.items() if frame_type != "InterestSummaryFrame")
+    reached = sum(1 for t in things.values() if t.metrics.for_type("POWBroadcastFrame").count)
+    replies = len(customer.reply_collector(customer.request.payload_id))
+    return frames, reached, replies, customer.request.max_hops
+
+
+def main(grid_side: int = 8):
+    ca, settler = create_settler()
+    keys = node_keys(ca, grid_side*grid_side)
+
+    print(f"torus {grid_side}x{grid_side}, worker {grid_side//2 * 2} hops away")
+    print(f"{'max_hops':>9} {'frames':>7} {'reached':>8} {'replies':>8}")
+    for max_hops in [None] + list(range(1, grid_side+1)):
+        frames, reached, replies, hops = run(grid_side, settler, keys, max_hops)
+        label = f"{hops}*" if max_hops is None else str(hops)
+        print(f"{label:>9} {frames:7d} {reached:8d} {replies:8d}")
+    print("* default radius of a precision-7 geohash topic")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
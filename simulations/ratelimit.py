@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from typing import Dict, Optional, Tuple
+
+
+class TokenBucket:
+    """Allows `rate` events per unit of simulation time with bursts of up to `burst`."""
+
+    __slots__ = ("rate", "burst", "tokens", "last")
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = None
+
+    def take(self, now: float) -> bool:
+        if self.last is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.last)*self.rate)
+        self.last = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class FrameRateLimiter:
+    """Admission control for incoming frames, keyed by frame type name.
+
+    A frame is shed when the receiver's mailbox is deeper than the `shed_depths` of
+    its type. Give cheap-to-drop types (asks) lower depths than the ones carrying
+    finished work (replies) so they go first. Otherwise it has to take a token from
+    its sender's bucket (`per_peer`) and from the node-wide bucket (`total`) of its
+    type. Types missing from a table are not limited by that table.
+    """
+
+    def __init__(self,
+                 per_peer: Dict[str, Tuple[float, float]],
+                 total: Dict[str, Tuple[float, float]],
+                 shed_depths: Dict[str, int]) -> None:
+        self.per_peer = per_peer
+        self.total = total
+        self.shed_depths = shed_depths
+        self._peer_buckets: Dict[Tuple[str, str], TokenBucket] = dict()
+        self._total_buckets: Dict[str, TokenBucket] = {
+            frame_type: TokenBucket(*limit) for frame_type, limit in total.items()}
+
+    def admit(self, now: float, peer_name: str, frame_type: str, queue_depth: int) -> Optional[str]:
+        """Returns None if the frame is admitted, otherwise the reason it is dropped."""
+        if queue_depth > self.shed_depths.get(frame_type, queue_depth):
+            return "shed"
+        if frame_type in self.per_peer:
+            key = (peer_name, frame_type)
+            if not key in self._peer_buckets:
+                self._peer_buckets[key] = TokenBucket(*self.per_peer[frame_type])
+            if not self._peer_buckets[key].take(now):
+                return "peer_rate_limited"
+        if frame_type in self._total_buckets and not self._total_buckets[frame_type].take(now):
+            return "rate_limited"
+        return None
@@ -0,0 +1,94 @@
+# %%
+# One neighbour floods a node with asks while three others ask at a normal pace.
+# Compares what the node spends on each of them without limits and with the default
+# token buckets and shedding.
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import clock
+import crypto
+from cert import create_certification_authority
+from mass import OFF, Agent, simulate
+from payments import PaymentChannel
+from ratelimit import FrameRateLimiter
+from sweetgossip import (DEFAULT_PER_PEER_FRAME_LIMITS, DEFAULT_SHED_DEPTHS,
+                         DEFAULT_TOTAL_FRAME_LIMITS, AbstractTopic, AskForBroadcastFrame,
+                         POWBroadcastConditionsFrame, RequestPayload, Settler,
+                         SweetGossipNode)
+
+FLOOD_ASKS = 5000
+FLOOD_INTERVAL = 0.001
+HONEST_ASKS = 20
+HONEST_INTERVAL = 0.5
+
+
+class TaxiTopic(AbstractTopic):
+    def __init__(self, from_geohash: str,  to_geohash: str) -> None:
+        self.from_geohash = from_geohash
+        self.to_geohash = to_geohash
+
+
+class Asker(Agent):
+    def __init__(self, name, certificate, private_key, target_name, asks, interval):
+        super().__init__(name)
+        self.certificate = certificate
+        self.request_payload = RequestPayload(uuid4(), TaxiTopic("ezs42e4", "ezs42s1"), certificate)
+        self.request_payload.sign(private_key)
+        self.target_name = target_name
+        self.asks = asks
+        self.interval = interval
+        self.answered = 0
+
+    def homeostasis(self, e):
+        target = e.things[self.target_name]
+        for _ in range(self.asks):
+            self.new_message(e, target, AskForBroadcastFrame(self.request_payload))
+            yield e.timeout(self.interval)
+        yield e.timeout(float('inf'))
+
+    def on_message(self, e, m):
+        if isinstance(m.data, POWBroadcastConditionsFrame):
+            self.answered += 1
+
+
+def run(rate_limiter):
+    ca = create_certification_authority("CA")
+    not_valid_after = clock.now()+timedelta(days=7)
+    not_valid_before = clock.now()-timedelta(days=7)
+    ca_certificate = ca.issue_certificate(
+        ca.ca_public_key, "is_ok", True, not_valid_after, not_valid_before)
+    settler = Settler(ca_certificate, ca._ca_private_key, PaymentChannel(), 12)
+    private_key, public_key = crypto.generate_asymetric_keys()
+    certificate = ca.issue_certificate(
+        public_key, "is_ok", True, not_valid_after, not_valid_before)
+
+    node = SweetGossipNode("Node", certificate, private_key, PaymentChannel(), 1,
+                           broadcast_conditions_timeout=timedelta(days=7), broadcast_conditions_pow_scheme="sha256", broadcast_conditions_pow_complexity=0,
+                           timestamp_tolerance=timedelta(seconds=10), invoice_payment_timeout=timedelta(days=1),
+                           settler=settler, rate_limiter=rate_limiter)
+    things = {"Node": node,
+              "Flooder": Asker("Flooder", certificate, private_key, "Node", FLOOD_ASKS, FLOOD_INTERVAL)}
+    for i in range(3):
+        things[f"Honest{i}"] = Asker(f"Honest{i}", certificate, private_key, "Node", HONEST_ASKS, HONEST_INTERVAL)
+    for name, thing in things.items():
+        if name != "Node":
+            node._known_hosts[name] = thing
+    simulate("", things, message_flow_in_trace=False, trace_level=OFF)
+    return things, node.metrics.snapshot()["AskForBroadcastFrame"]
+
+
+# %%
+if __name__ == "__main__":
+    import contextlib
+    import os
+    # an empty limiter admits everything like None, but still records the mailbox depths
+    for label, limiter in (("unlimited", FrameRateLimiter({}, {}, {})),
+                           ("default limits", FrameRateLimiter(DEFAULT_PER_PEER_FRAME_LIMITS,
+                                                               DEFAULT_TOTAL_FRAME_LIMITS,
+                                                               DEFAULT_SHED_DEPTHS))):
+        things, asks = run(limiter)
+        print(f"{label}: asks handled={asks['count']} handler time={asks['total_latency']*1e3:.1f}ms "
+              f"max mailbox={asks['max_queue_depth']} rejects={asks['rejects']}")
+        for name, thing in things.items():
+            if name != "Node":
+                print(f"    {name}: {thing.answered}/{thing.asks} answered")
@@ -0,0 +1,35 @@
+# Token bucket refill and burst, and the admission order of FrameRateLimiter.
+#
+#   python -m pytest -q ratelimit_test.py
+from ratelimit import FrameRateLimiter, TokenBucket
+
+
+def test_burst():
+    bucket = TokenBucket(rate=2, burst=3)
+    assert [bucket.take(0) for _ in range(4)] == [True, True, True, False]
+
+
+def test_refill():
+    bucket = TokenBucket(rate=2, burst=3)
+    for _ in range(3):
+        bucket.take(0)
+    assert not bucket.take(0.25)  # half a token back
+    assert bucket.take(0.5)
+    assert not bucket.take(0.5)
+    # a long pause refills up to the burst, not beyond it
+    assert [bucket.take(100) for _ in range(4)] == [True, True, True, False]
+
+
+def test_admit():
+    limiter = FrameRateLimiter(per_peer={"AskForBroadcastFrame": (1, 2)},
+                               total={"AskForBroadcastFrame": (1, 3)},
+                               shed_depths={"AskForBroadcastFrame": 5, "ReplyFrame": 50})
+    admit = [limiter.admit(0, peer, "AskForBroadcastFrame", 0) for peer in ["A", "A", "A", "B", "C"]]
+    assert admit == [None, None, "peer_rate_limited", None, "rate_limited"]
+    assert limiter.admit(1, "C", "AskForBroadcastFrame", 0) is None
+    # asks are shed before replies as the mailbox fills, limits or not
+    assert limiter.admit(10, "D", "AskForBroadcastFrame", 6) == "shed"
+    assert limiter.admit(10, "D", "ReplyFrame", 6) is None
+    assert limiter.admit(10, "D", "ReplyFrame", 51) == "shed"
+    # types missing from the tables are not limited
+    assert all(limiter.admit(10, "D", "POWBroadcastFrame", 1000) is None for _ in range(100))
@@ -1,12 +1,26 @@
+import heapq
+import math
 from collections import namedtuple
-import numpy as np
-import sys
 
 ScheduleJob = namedtuple('ScheduleJob', 'job on_return')
 ScheduleItem = namedtuple(
     'ScheduleItem', 'event start_at repeat_every num_repeats')
 
 
+def _repeats_after(item, cur):
+    """Whether the cyclic `item` has not fired its last repeat by `cur`."""
+    return item.num_repeats is None or cur < item.start_at+item.repeat_every*(item.num_repeats-1)
+
+
+def _next_due(item, cur):
+    """The first time after `cur` that `item` is due at, None if it is done."""
+    if item.repeat_every is None:
+        return item.start_at if item.start_at > cur else None
+    if not _repeats_after(item, cur):
+        return None
+    return max(math.floor((cur - item.start_at) / item.repeat_every)+1, 0) * item.repeat_every + item.start_at
+
+
 class Scheduler:
     def __init__(self):
         self._event_list = []
@@ -16,46 +30,47 @@ class Scheduler:
             job, on_return), start_at, repeat_every, num_repeats))
 
     def _schedule_event_generator(self):
+        """Yields (time since the previous due events, the events due then).
+
+        Every job has one heap entry, keyed by its next due time and then by cyclic
+        jobs before one-shot ones, each in scheduling order; a cyclic job is pushed
+        back with its following due time once it fires. Jobs scheduled while the
+        generator runs join it at its next step.
+
+        A cyclic job's repeat count is checked again when it comes due, so a job with
+        `num_repeats=0` is dropped once an earlier step passes its last repeat.
+        """
+        heap = []
+        queued = 0
         cur = -1
         while (True):
-            oneshot = [
-                m for m in self._event_list if m.repeat_every is None and m.start_at > cur]
-            cyclic = [m for m in self._event_list if m.repeat_every is not None and (
-                m.num_repeats is None or cur < m.start_at+m.repeat_every*(m.num_repeats-1))]
-            if not oneshot and not cyclic:
+            for index in range(queued, len(self._event_list)):
+                item = self._event_list[index]
+                due = _next_due(item, cur)
+                if due is not None:
+                    heapq.heappush(heap, (due, item.repeat_every is None, index, item))
+            queued = len(self._event_list)
+            if not heap:
                 break
 
-            if cyclic:
-                sched = np.array([m.start_at for m in cyclic])
-                perio = np.array([m.repeat_every for m in cyclic])
-                nexts = np.maximum(np.floor(
-                    (cur - np.array(sched)) / np.array(perio)).astype(int)+1, 0) * perio + sched
-                mincyc = np.min(nexts)
-                mincyci = np.where(nexts == mincyc)[0]
-            else:
-                mincyc = sys.maxsize
-
-            if oneshot:
-                nexts = [m.start_at for m in oneshot]
-                minosh = np.min(nexts)
-                minoshi = np.where(nexts == minosh)[0]
-            else:
-                minosh = sys.maxsize
+            at = heap[0][0]
+            events = []
+            while heap and heap[0][0] == at:
+                _, oneshot, index, item = heapq.heappop(heap)
+                if not oneshot:
+                    if not _repeats_after(item, cur):
+                        continue
+                    due = _next_due(item, at)
+                    if due is not None:
+                        heapq.heappush(heap, (due, oneshot, index, item))
+                events.append(item.event)
+            if not events:
+                continue
 
             if cur < 0:
                 cur = 0
-
-            if mincyc < minosh:
-                yield mincyc-cur, [cyclic[m].event for m in mincyci]
-                cur = mincyc
-            elif minosh < mincyc:
-                yield minosh-cur, [oneshot[m].event for m in minoshi]
-                cur = minosh
-            else:
-                eve = [cyclic[m].event for m in mincyci]
-                eve.extend([oneshot[m].event for m in minoshi])
-                yield minosh-cur, eve
-                cur = minosh
+            yield at-cur, events
+            cur = at
 
 
 def test_scheduler():
@@ -0,0 +1,105 @@
+# %%
+# Next-event cost of the heap Scheduler against the list-scanning generator it
+# replaced, on 100k scheduled jobs (one-shot and cyclic, some with a repeat count),
+# after checking that both produce the same steps on random schedules.
+#
+#   python scheduler_bench.py [jobs] [steps]
+import itertools
+import random
+import sys
+
+import numpy as np
+
+from scheduler import Scheduler
+from stopwatch import Stopwatch
+
+RANDOM_SEED = 1234
+
+
+def scanning_event_generator(event_list):
+    """`Scheduler._schedule_event_generator` as it was: every step scans all the jobs."""
+    cur = -1
+    while (True):
+        oneshot = [
+            m for m in event_list if m.repeat_every is None and m.start_at > cur]
+        cyclic = [m for m in event_list if m.repeat_every is not None and (
+            m.num_repeats is None or cur < m.start_at+m.repeat_every*(m.num_repeats-1))]
+        if not oneshot and not cyclic:
+            break
+
+        if cyclic:
+            sched = np.array([m.start_at for m in cyclic])
+            perio = np.array([m.repeat_every for m in cyclic])
+            nexts = np.maximum(np.floor(
+                (cur - np.array(sched)) / np.array(perio)).astype(int)+1, 0) * perio + sched
+            mincyc = np.min(nexts)
+            mincyci = np.where(nexts == mincyc)[0]
+        else:
+            mincyc = sys.maxsize
+
+        if oneshot:
+            nexts = [m.start_at for m in oneshot]
+            minosh = np.min(nexts)
+            minoshi = np.where(nexts == minosh)[0]
+        else:
+            minosh = sys.maxsize
+
+        if cur < 0:
+            cur = 0
+
+        if mincyc < minosh:
+            yield mincyc-cur, [cyclic[m].event for m in mincyci]
+            cur = mincyc
+        elif minosh < mincyc:
+            yield minosh-cur, [oneshot[m].event for m in minoshi]
+            cur = minosh
+        else:
+            eve = [cyclic[m].event for m in mincyci]
+            eve.extend([oneshot[m].event for m in minoshi])
+            yield minosh-cur, eve
+            cur = minosh
+
+
+def random_scheduler(rnd, jobs, horizon):
+    sched = Scheduler()
+    for i in range(jobs):
+        start_at = rnd.randrange(horizon)
+        if rnd.random() < 0.5:
+            sched.schedule(f"job{i}", None, start_at)
+        else:
+            sched.schedule(f"job{i}", None, start_at, rnd.randrange(1, horizon),
+                           rnd.choice([None, 0, 1, 2, 5]))
+    return sched
+
+
+def steps(generator, count):
+    return [(t, [e.job for e in events]) for t, events in itertools.islice(generator, count)]
+
+
+def timed_steps(generator, count):
+    with Stopwatch() as sw:
+        done = sum(1 for _ in itertools.islice(generator, count))
+    return done, sw.total
+
+
+def main(jobs: int = 100000, steps_count: int = 200):
+    rnd = random.Random(RANDOM_SEED)
+    for _ in range(200):
+        sched = random_scheduler(rnd, rnd.randrange(1, 40), rnd.choice([5, 20, 100]))
+        assert steps(sched._schedule_event_generator(), 300) == \
+            steps(scanning_event_generator(sched._event_list), 300)
+    print("heap and scanning schedulers agree on 200 random schedules")
+
+    sched = random_scheduler(rnd, jobs, jobs)
+    done, scanning = timed_steps(scanning_event_generator(sched._event_list), steps_count)
+    print(f"scanning: {done} steps of {jobs} jobs, {scanning/done*1e6:10.1f} us/step")
+    done, heap = timed_steps(sched._schedule_event_generator(), steps_count)
+    print(f"    heap: {done} steps of {jobs} jobs, {heap/done*1e6:10.1f} us/step "
+          f"(including the {jobs} initial pushes)")
+    done, total = timed_steps(sched._schedule_event_generator(), 10*jobs)
+    print(f"    heap: {done} steps of {jobs} jobs, {total/done*1e6:10.1f} us/step, "
+          f"{scanning/steps_count/(total/done):,.0f}x faster per step")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
@@ -0,0 +1,79 @@
+# %%
+# Settlement trusts per second from a settler called inline by the replier against the
+# batching SettlerService, and how long the replier's handler is blocked for each.
+#
+#   python settler_bench.py [num_requests]
+import asyncio
+import sys
+import time
+from datetime import timedelta
+from uuid import uuid4
+
+import clock
+import crypto
+from cert import create_certification_authority
+from payments import PaymentChannel
+from settler_service import SettlerService
+from sweetgossip import AbstractTopic, RequestPayload, Settler
+
+
+class TaxiTopic(AbstractTopic):
+    def __init__(self, from_geohash: str,  to_geohash: str) -> None:
+        self.from_geohash = from_geohash
+        self.to_geohash = to_geohash
+
+
+def make_requests(num_requests):
+    ca = create_certification_authority("CA")
+    not_valid_after = clock.now()+timedelta(days=7)
+    not_valid_before = clock.now()-timedelta(days=7)
+    ca_certificate = ca.issue_certificate(
+        ca.ca_public_key, "is_ok", True, not_valid_after, not_valid_before)
+    settler = Settler(ca_certificate, ca._ca_private_key, PaymentChannel(), 12)
+    private_key, public_key = crypto.generate_asymetric_keys()
+    certificate = ca.issue_certificate(
+        public_key, "is_ok", True, not_valid_after, not_valid_before)
+    replier_channel = PaymentChannel()
+    requests = list()
+    for _ in range(num_requests):
+        payload = RequestPayload(uuid4(), TaxiTopic("ezs42e4", "ezs42s1"), certificate)
+        payload.sign(private_key)
+        invoice_id, reply_payment_hash, on_accepted = settler.generate_reply_payment_trust()
+        reply_invoice = replier_channel.create_hodl_invoice(
+            4321, reply_payment_hash, on_accepted, invoice_id=invoice_id)
+        requests.append(dict(message=b"mynameis=Worker", reply_invoice=reply_invoice,
+                             signed_request_payload=payload, replier_certificate=certificate))
+    return settler, requests
+
+
+async def serve(settler, requests, workers, max_batch):
+    service = SettlerService(settler, asyncio.get_running_loop(), max_batch=max_batch, workers=workers)
+    started = time.perf_counter()
+    futures = [service.submit_settlement_trust(**request) for request in requests]
+    submitted = time.perf_counter()-started
+    await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+    elapsed = time.perf_counter()-started
+    service.close()
+    return service, futures, submitted, elapsed
+
+
+def main(num_requests: int = 200):
+    settler, requests = make_requests(num_requests)
+
+    started = time.perf_counter()
+    results = [settler.generate_settlement_trust(**request) for request in requests]
+    elapsed = time.perf_counter()-started
+    assert all(promise.verify(settler.settler_certificate.public_key) for promise, _, _ in results)
+    print(f"{'inline':>18}: {num_requests/elapsed:7.1f} trusts/s, "
+          f"handler blocked {elapsed/num_requests*1e3:6.2f} ms/reply")
+
+    for workers, max_batch in ((1, 1), (1, 32), (2, 32)):
+        service, futures, submitted, elapsed = asyncio.run(serve(settler, requests, workers, max_batch))
+        assert all(f.result()[0].verify(settler.settler_certificate.public_key) for f in futures)
+        print(f"{f'service {workers}x{max_batch}':>18}: {num_requests/elapsed:7.1f} trusts/s, "
+              f"handler blocked {submitted/num_requests*1e3:6.2f} ms/reply, "
+              f"{service.batches} batches")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
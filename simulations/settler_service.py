@@ -0,0 +1,226 @@
+"""The settler as a service of its own.
+
+A `Settler` signs every settlement promise it issues, and loading its private key
+costs far more than the signature itself. Repliers hand their requests to a service
+instead of calling the settler inline: requests queue up, are signed in batches with a
+single key load, and each replier gets a `concurrent.futures.Future` whose callback
+sends the reply frame.
+
+`SettlerService` runs the batches on a worker pool for nodes on a real transport;
+`SettlerAgent` is the same service inside a simulation, where its batches take
+simulation time. `ShardedSettler` spreads the replies over several settlers.
+"""
+from __future__ import annotations
+
+import bisect
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from hashlib import blake2b
+from typing import Dict
+from uuid import UUID
+
+from cert import Certificate
+from mass import Agent
+from sweetgossip import Settler
+
+
+def _settle(settler: Settler, batch: list, resolve) -> None:
+    try:
+        results = settler.generate_settlement_trusts([request for request, _ in batch])
+    except Exception as ex:
+        for _, future in batch:
+            resolve(future.set_exception, ex)
+        return
+    for (_, future), result in zip(batch, results):
+        resolve(future.set_result, result)
+
+
+class SettlerService:
+    """Serves settlement trusts of `settler` from a pool of `workers` threads.
+
+    Whatever queues up while a worker signs becomes its next batch of up to
+    `max_batch` requests. The futures are completed on the asyncio `loop` of the node,
+    never on a worker thread, so their callbacks may use the node and its transport.
+    """
+
+    def __init__(self, settler: Settler, loop, max_batch: int = 32, workers: int = 1) -> None:
+        if loop is None:
+            raise ValueError("SettlerService needs the asyncio loop that completes its futures")
+        self.settler = settler
+        self.max_batch = max_batch
+        self.workers = workers
+        self.loop = loop
+        self.batches = 0
+        self.settled = 0
+        self._requests = deque()
+        self._lock = threading.Lock()
+        self._draining = 0
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="settler")
+
+    def generate_reply_payment_trust(self, **route):
+        return self.settler.generate_reply_payment_trust(**route)
+
+    def generate_settlement_trust(self, **request):
+        """Signs a single request right away, outside of the batches."""
+        return self.settler.generate_settlement_trust(**request)
+
+    def submit_settlement_trust(self, **request) -> Future:
+        future = Future()
+        with self._lock:
+            self._requests.append((request, future))
+            if self._draining < self.workers:
+                self._draining += 1
+                self._executor.submit(self._drain)
+        return future
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def _drain(self) -> None:
+        while True:
+            with self._lock:
+                if not self._requests:
+                    self._draining -= 1
+                    return
+                batch = [self._requests.popleft()
+                         for _ in range(min(self.max_batch, len(self._requests)))]
+                self.batches += 1
+                self.settled += len(batch)
+            _settle(self.settler, batch, self._resolve)
+
+    def _resolve(self, complete, value) -> None:
+        self.loop.call_soon_threadsafe(complete, value)
+
+
+class SettlerAgent(Agent):
+    """A `SettlerService` for simulations; add it to the simulated things.
+
+    The agent waits `batch_window` after the first queued request to collect more, then
+    spends `batch_time` plus `signature_time` per request of simulation time on the
+    batch before completing its futures.
+    """
+
+    def __init__(self, name: str, settler: Settler, max_batch: int = 32,
+                 batch_window: float = 0, batch_time: float = 0, signature_time: float = 0) -> None:
+        super().__init__(name)
+        self.settler = settler
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.batch_time = batch_time
+        self.signature_time = signature_time
+        self.batches = 0
+        self.settled = 0
+        self._requests = deque()
+        self._wakeup = None
+
+    def generate_reply_payment_trust(self, **route):
+        return self.settler.generate_reply_payment_trust(**route)
+
+    def generate_settlement_trust(self, **request):
+        """Signs a single request right away, taking no simulation time."""
+        return self.settler.generate_settlement_trust(**request)
+
+    def submit_settlement_trust(self, **request) -> Future:
+        future = Future()
+        self._requests.append((request, future))
+        if self._wakeup is not None and not self._wakeup.triggered:
+            self._wakeup.succeed()
+        return future
+
+    def homeostasis(self, e):
+        while True:
+            if not self._requests:
+                self._wakeup = e.event()
+                yield self._wakeup
+            if self.batch_window:
+                yield e.timeout(self.batch_window)
+            batch = [self._requests.popleft()
+                     for _ in range(min(self.max_batch, len(self._requests)))]
+            if self.batch_time or self.signature_time:
+                yield e.timeout(self.batch_time + self.signature_time*len(batch))
+            self.batches += 1
+            self.settled += len(batch)
+            _settle(self.settler, batch, lambda complete, value: complete(value))
+
+
+def _ring_hash(key: bytes) -> int:
+    return int.from_bytes(blake2b(key, digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing of keys onto named members with `replicas` points per member.
+
+    Adding a member takes over only the keys that now hash closest to its points,
+    about one in (members+1); every other key keeps its member.
+    """
+
+    def __init__(self, replicas: int = 64) -> None:
+        self.replicas = replicas
+        self._hashes = list()
+        self._names = list()
+
+    def add(self, name: str) -> None:
+        for i in range(self.replicas):
+            h = _ring_hash(f"{name}#{i}".encode())
+            at = bisect.bisect(self._hashes, h)
+            self._hashes.insert(at, h)
+            self._names.insert(at, name)
+
+    def remove(self, name: str) -> None:
+        kept = [(h, n) for h, n in zip(self._hashes, self._names) if n != name]
+        self._hashes = [h for h, _ in kept]
+        self._names = [n for _, n in kept]
+
+    def __len__(self) -> int:
+        return len(self._hashes)//self.replicas
+
+    def member_for(self, key: bytes) -> str:
+        if not self._hashes:
+            raise KeyError("empty hash ring")
+        return self._names[bisect.bisect(self._hashes, _ring_hash(key)) % len(self._hashes)]
+
+
+class ShardedSettler:
+    """Spreads the settler work over several settlers by a consistent hash.
+
+    `settlers` are `Settler`s, `SettlerService`s or `SettlerAgent`s by name, each with
+    its own certificate. Both trusts of a reply go to the same settler, picked by the
+    payload id of the request or, with `route_by="replier"`, the replier's public key.
+    """
+
+    def __init__(self, settlers: Dict[str, Settler], route_by: str = "payload", replicas: int = 64) -> None:
+        if route_by not in ("payload", "replier"):
+            raise ValueError(f"unknown route_by {route_by!r}")
+        self.route_by = route_by
+        self.settlers = dict()
+        self.ring = HashRing(replicas)
+        for name, settler in settlers.items():
+            self.add_settler(name, settler)
+
+    def add_settler(self, name: str, settler: Settler) -> None:
+        """Rebalances: the new settler takes its share of the keys from the others."""
+        self.settlers[name] = settler
+        self.ring.add(name)
+
+    def remove_settler(self, name: str) -> None:
+        self.ring.remove(name)
+        del self.settlers[name]
+
+    def settler_for(self, payload_id: UUID, replier_certificate: Certificate) -> Settler:
+        key = payload_id.bytes if self.route_by == "payload" else replier_certificate.public_key
+        return self.settlers[self.ring.member_for(key)]
+
+    def generate_reply_payment_trust(self, payload_id: UUID = None, replier_certificate: Certificate = None):
+        return self.settler_for(payload_id, replier_certificate).generate_reply_payment_trust(
+            payload_id=payload_id, replier_certificate=replier_certificate)
+
+    def generate_settlement_trust(self, message: bytes, reply_invoice, signed_request_payload,
+                                  replier_certificate: Certificate):
+        return self.settler_for(signed_request_payload.payload_id, replier_certificate).generate_settlement_trust(
+            message=message, reply_invoice=reply_invoice, signed_request_payload=signed_request_payload,
+            replier_certificate=replier_certificate)
+
+    def submit_settlement_trust(self, **request) -> Future:
+        return self.settler_for(request["signed_request_payload"].payload_id,
+                                request["replier_certificate"]).submit_settlement_trust(**request)
@@ -0,0 +1,104 @@
+# %%
+# Reply throughput against the number of settlers. Customers broadcast to a pool of
+# workers that all answer; every reply needs a settlement trust from the settler its
+# payload id hashes to, and each settler signs at most SETTLER_MAX_BATCH promises per
+# batch taking SETTLER_BATCH_TIME plus SETTLER_SIGNATURE_TIME per promise.
+#
+#   python settler_sharding_sim.py [requests_per_customer]
+import sys
+from uuid import uuid4
+
+import numpy as np
+
+import crypto
+from cert import create_certification_authority
+from mass import OFF, simulate
+from payments import PaymentChannel
+from settler_service import HashRing, SettlerAgent, ShardedSettler
+from sweetgossip import Settler
+from torus import TaxiNode, issue_certificate, node_keys
+
+NUM_CUSTOMERS = 4
+NUM_WORKERS = 8
+REQUEST_INTERVAL = 0.5
+SETTLER_COUNTS = [1, 2, 4, 8, 16]
+SETTLER_MAX_BATCH = 8
+SETTLER_BATCH_TIME = 0.2
+SETTLER_SIGNATURE_TIME = 0.05
+
+
+class PoolNode(TaxiNode):
+    def __init__(self, name, certificate, private_key, settler, is_worker: bool, requests: int = 0):
+        super().__init__(name, certificate, private_key, settler)
+        self.is_worker = is_worker
+        self.requests = requests
+        self.sent = dict()
+        self.reply_times = list()
+
+    def homeostasis(self, e):
+        for _ in range(self.requests):
+            payload_id = uuid4()
+            self.sent[payload_id] = e.now
+            self.reply_collector(payload_id).subscribe(
+                lambda reply: self.reply_times.append(e.now))
+            self.broadcast(e, self.taxi_request(payload_id))
+            yield e.timeout(REQUEST_INTERVAL)
+        yield e.timeout(float('inf'))
+
+
+def settler_keys(ca, count):
+    keys = list()
+    for _ in range(count):
+        private_key, public_key = crypto.generate_asymetric_keys()
+        keys.append((private_key, issue_certificate(ca, public_key)))
+    return keys
+
+
+def make_settlers(keys):
+    """Fresh settler agents for one run; an agent keeps its simulation's events."""
+    return {f"Settler{i}": SettlerAgent(
+        f"Settler{i}", Settler(certificate, private_key, PaymentChannel(), price_amount_for_settlement=12),
+        max_batch=SETTLER_MAX_BATCH, batch_time=SETTLER_BATCH_TIME, signature_time=SETTLER_SIGNATURE_TIME)
+        for i, (private_key, certificate) in enumerate(keys)}
+
+
+def run(keys, settlers, requests):
+    sharded = ShardedSettler(settlers)
+    customers = [PoolNode(f"Customer{i}", certificate, private_key, sharded, False, requests)
+                 for i, (private_key, certificate) in enumerate(keys[:NUM_CUSTOMERS])]
+    workers = [PoolNode(f"Worker{i}", certificate, private_key, sharded, True)
+               for i, (private_key, certificate) in enumerate(keys[NUM_CUSTOMERS:])]
+    for customer in customers:
+        for worker in workers:
+            customer.connect_to(worker)
+    things = {t.name: t for t in customers + workers + list(settlers.values())}
+    simulate("", things, message_flow_in_trace=False, trace_level=OFF)
+
+    reply_times = np.array([t for c in customers for t in c.reply_times])
+    first_sent = min(t for c in customers for t in c.sent.values())
+    settled = np.array([s.settled for s in settlers.values()])
+    return len(reply_times), reply_times.max()-first_sent, settled, [p for c in customers for p in c.sent]
+
+
+def main(requests: int = 10):
+    ca = create_certification_authority("CA")
+    keys = node_keys(ca, NUM_CUSTOMERS+NUM_WORKERS)
+    all_settler_keys = settler_keys(ca, max(SETTLER_COUNTS))
+
+    print(f"{'settlers':>8} {'replies':>8} {'makespan':>9} {'replies/min':>12} {'max/mean load':>14} {'moved':>6}")
+    ring = HashRing()
+    for count in SETTLER_COUNTS:
+        settlers = make_settlers(all_settler_keys[:count])
+        replies, makespan, settled, payload_ids = run(keys, settlers, requests)
+        # share of this run's payload ids the settlers added since the previous count take over
+        before = [ring.member_for(p.bytes) for p in payload_ids] if len(ring) else None
+        for name in list(settlers)[len(ring):]:
+            ring.add(name)
+        after = [ring.member_for(p.bytes) for p in payload_ids]
+        moved = np.mean([b != a for b, a in zip(before, after)]) if before else 0
+        print(f"{count:8d} {replies:8d} {makespan:9.2f} {replies/makespan:12.1f} "
+              f"{settled.max()/settled.mean():14.2f} {moved:6.2f}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
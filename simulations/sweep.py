@@ -0,0 +1,128 @@
+"""Parameter sweeps over simulation experiments.
+
+`run_sweep(run_cell, grid, results_path)` runs `run_cell(params, seed)` for every cell
+of a parameter grid, `repeats` times each, in a pool of worker processes. Every run
+gets a seed derived from its parameters and repeat number only, and `random` and
+`numpy.random` are seeded with it, so a cell gives the same result in any order, on
+any worker and after a restart.
+
+Each finished run is appended to `results_path` as one JSON line with its parameters,
+seed, status, wall time and the metrics dict `run_cell` returned, and flushed at once.
+A sweep that crashed, or was stopped, is resumed by calling `run_sweep` again with the
+same file: runs already recorded as "ok" are skipped, failed ones are retried, and a
+last line cut short by the crash is truncated away before new runs are appended.
+`pandas.read_json(results_path, lines=True)` loads the table.
+"""
+from __future__ import annotations
+
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from hashlib import blake2b
+from typing import Callable, Dict, List
+
+import numpy as np
+
+
+def parameter_grid(**axes) -> List[dict]:
+    """Every combination of the values of the `axes`, e.g. `parameter_grid(a=[1, 2], b=[3])`."""
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*axes.values())]
+
+
+def run_seed(params: dict, repeat: int, base_seed: int = 1234) -> int:
+    key = json.dumps([base_seed, params, repeat], sort_keys=True).encode()
+    return int.from_bytes(blake2b(key, digest_size=4).digest(), "big")
+
+
+def _run_key(params: dict, repeat: int) -> str:
+    return json.dumps([params, repeat], sort_keys=True)
+
+
+def load_results(results_path: str) -> List[dict]:
+    """The recorded runs; a line cut short by a crash is ignored."""
+    rows = list()
+    if not os.path.exists(results_path):
+        return rows
+    with open(results_path, encoding="utf8") as f:
+        for line in f:
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                pass
+    return rows
+
+
+def _truncate_partial_line(results_path: str) -> None:
+    """Cuts the file back to its last complete line, so that appends start on a line of their own."""
+    if not os.path.exists(results_path):
+        return
+    with open(results_path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        keep = end
+        while keep > 0:
+            start = max(0, keep-4096)
+            f.seek(start)
+            newline = f.read(keep-start).rfind(b"\n")
+            if newline >= 0:
+                keep = start+newline+1
+                break
+            keep = start
+        if keep < end:
+            f.truncate(keep)
+
+
+def _run(run_cell, params, repeat, seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    started = time.perf_counter()
+    try:
+        metrics, status = run_cell(params, seed), "ok"
+    except Exception:
+        metrics, status = {"error": traceback.format_exc()}, "error"
+    return {"params": params, "repeat": repeat, "seed": seed, "status": status,
+            "wall": time.perf_counter()-started, "metrics": metrics}
+
+
+def run_sweep(run_cell: Callable[[dict, int], Dict], grid: List[dict], results_path: str,
+              repeats: int = 1, workers: int = None, base_seed: int = 1234,
+              on_result: Callable[[dict], None] = None) -> List[dict]:
+    """Runs the missing runs of the sweep and returns all its recorded runs.
+
+    Args:
+        run_cell: `run_cell(params, seed)` -> dict of metrics; a module-level function
+        grid (list of dict): the cells, see `parameter_grid`
+        results_path (str): the JSON lines results table, appended to and resumed from
+        repeats (int): runs per cell, each with its own seed
+        workers (int): worker processes (None - one per CPU)
+        base_seed (int): mixed into every run seed
+        on_result: called with every new row as it is recorded
+    """
+    done = {_run_key(row["params"], row["repeat"])
+            for row in load_results(results_path) if row["status"] == "ok"}
+    pending = [(params, repeat) for params in grid for repeat in range(repeats)
+               if _run_key(params, repeat) not in done]
+
+    if pending:
+        _truncate_partial_line(results_path)
+        ctx = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(workers or os.cpu_count(), mp_context=ctx) as pool, \
+                open(results_path, "a", encoding="utf8") as results:
+            futures = [pool.submit(_run, run_cell, params, repeat, run_seed(params, repeat, base_seed))
+                       for params, repeat in pending]
+            for future in as_completed(futures):
+                row = future.result()
+                results.write(json.dumps(row, default=str)+"\n")
+                results.flush()
+                os.fsync(results.fileno())
+                if on_result is not None:
+                    on_result(row)
+
+    recorded = {_run_key(row["params"], row["repeat"]): row for row in load_results(results_path)}
+    return [recorded[_run_key(params, repeat)] for params in grid for repeat in range(repeats)
+            if _run_key(params, repeat) in recorded]
@@ -0,0 +1,78 @@
+# %%
+# A parameter sweep over torus scenarios: grid side, PoW complexity, routing price and
+# broadcast fan-out, every cell on its own worker process. Results go to
+# sweep_results.jsonl; run it again after a crash to finish the missing runs.
+#
+#   python sweep_sim.py [results_path] [repeats]
+import random
+import sys
+from uuid import UUID
+
+from mass import OFF, simulate
+from metrics import merge_snapshots
+from sweep import parameter_grid, run_sweep
+from sweetgossip import Settler
+from torus import TaxiNode, build_torus, create_settler, node_keys, pick_roles
+
+GRID = parameter_grid(grid_side=[4, 6],
+                      pow_complexity=[0, 16],
+                      price_amount_for_routing=[1, 10],
+                      broadcast_fanout=[None, 2])
+NUM_CUSTOMERS = 2
+NUM_WORKERS = 2
+
+
+class SweepNode(TaxiNode):
+    def __init__(self, name, certificate, private_key, settler: Settler, params: dict):
+        super().__init__(name, certificate, private_key, settler, params["price_amount_for_routing"],
+                         pow_complexity=params["pow_complexity"], broadcast_fanout=params["broadcast_fanout"], count_frame_bytes=True)
+        self.payload_id = None
+        self.time_to_first_reply = None
+
+    def homeostasis(self, e):
+        if self.is_customer:
+            yield e.timeout(1)
+            sent = e.now
+            self.reply_collector(self.payload_id).subscribe(
+                lambda reply: self.time_to_first_reply is None and
+                setattr(self, "time_to_first_reply", e.now - sent))
+            self.broadcast(e, self.taxi_request(self.payload_id))
+        yield e.timeout(float('inf'))
+
+
+def run_cell(params: dict, seed: int) -> dict:
+    grid_side = params["grid_side"]
+    ca, settler = create_settler()
+    things = build_torus(grid_side, node_keys(ca, grid_side*grid_side),
+                         lambda name, certificate, private_key: SweepNode(
+                             name, certificate, private_key, settler, params))
+    for customer in pick_roles(things, random, NUM_CUSTOMERS, NUM_WORKERS):
+        customer.payload_id = UUID(int=random.getrandbits(128))
+
+    simulate("", things, message_flow_in_trace=False, trace_level=OFF)
+
+    metrics = merge_snapshots(t.metrics.snapshot() for t in things.values())
+    customers = [t for t in things.values() if t.is_customer]
+    answered = [t.time_to_first_reply for t in customers if t.time_to_first_reply is not None]
+    return {
+        "frames": sum(m["count"] for m in metrics.values()),
+        "bytes": sum(m["bytes"] for m in metrics.values()),
+        "replies": sum(len(t.reply_collector(t.payload_id)) for t in customers),
+        "unanswered": len(customers)-len(answered),
+        "reached": sum(1 for t in things.values() if t.metrics.for_type("AskForBroadcastFrame").count),
+    }
+
+
+def main(results_path: str = "sweep_results.jsonl", repeats: int = 1):
+    def show(row):
+        m = row["metrics"]
+        print(row["status"], row["params"], f"seed={row['seed']} wall={row['wall']:.1f}s",
+              {k: m[k] for k in ("frames", "bytes", "replies", "reached")} if row["status"] == "ok"
+              else m["error"].splitlines()[-1])
+
+    rows = run_sweep(run_cell, GRID, results_path, repeats=int(repeats), on_result=show)
+    print(f"{sum(r['status'] == 'ok' for r in rows)}/{len(GRID)*int(repeats)} runs recorded in {results_path}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -1,103 +1,134 @@
 from __future__ import annotations
-from copy import deepcopy
+import heapq
+import random
+import sys
+import time
+from concurrent.futures import Future
+from copy import copy
+from dataclasses import dataclass, field, fields, is_dataclass, replace
 
 from datetime import datetime, timedelta
 from typing import Callable, Dict, List, Set, Tuple
 from uuid import UUID, uuid4
 
+import clock
 import crypto
 from cert import Certificate
-from mass import Agent
+from bloom import RollingBloomFilter, summary_contains
+from geotrie import GeohashPrefixTrie
+from links import Link
+from mass import Agent, create_mailbox, record_event
+from metrics import FrameMetrics
 from myrepr import ReprObject
 from payments import HodlInvoice, Invoice, PaymentChannel, compute_payment_hash
 from pow import ProofOfWork, WorkRequest, pow_target_from_complexity
+from ratelimit import FrameRateLimiter
 
 from numpy import argmin
 
 
 class SignableObject(ReprObject):
+    __slots__ = ("signature",)
+
     def sign(self, private_key: bytes) -> None:
         self.signature = None
         self.signature = crypto.sign_object(self, private_key)
 
     def verify(self, public_key: bytes) -> bool:
-        signature = self.signature
-        self.signature = None
-        result = crypto.verify_object(self, signature, public_key)
-        self.signature = signature
-        return result
+        unsigned = copy(self)
+        unsigned.signature = None
+        return crypto.verify_object(unsigned, self.signature, public_key)
+
 
+# Frames are immutable: they are passed between agents by reference and derived
+# with `dataclasses.replace` instead of being copied and modified.
+frame = dataclass(frozen=True, slots=True, eq=False, repr=False)
 
+
+@frame
 class OnionLayer(ReprObject):
-    def __init__(self, peer_name: str) -> None:
-        self.peer_name = peer_name
+    peer_name: str
 
 
+@frame
 class OnionRoute(ReprObject):
-    def __init__(self) -> None:
-        self._onion = b""
+    _onion: bytes = b""
 
-    def peel(self, priv_key: bytes) -> OnionLayer:
+    def peel(self, priv_key: bytes) -> Tuple[OnionLayer, OnionRoute]:
         layer, rest = crypto.decrypt_object(self._onion, priv_key)
-        self._onion = rest
-        return layer
+        return OnionLayer(sys.intern(layer.peer_name)), OnionRoute(rest)
 
     def grow(self, layer: OnionLayer, pub_key: bytes) -> OnionRoute:
-        new_onion = OnionRoute()
-        new_onion._onion = crypto.encrypt_object((layer, self._onion), pub_key)
-        return new_onion
+        return OnionRoute(crypto.encrypt_object((layer, self._onion), pub_key))
 
     def is_empty(self) -> bool:
         return len(self._onion) == 0
 
 
+DEFAULT_BROADCAST_RADIUS = 16
+
+
+def geohash_broadcast_radius(geohash: str) -> int:
+    """Hop budget for a request about the area of `geohash`: each precision level less
+    is a cell 4-8 times larger, worth one more hop (precision 7, ~150 m: 5 hops)."""
+    return max(1, 12 - len(geohash))
+
+
 class AbstractTopic(ReprObject):
-    pass
+    def broadcast_radius(self) -> int:
+        """Default hop budget of requests about this topic."""
+        return DEFAULT_BROADCAST_RADIUS
 
 
 class RequestPayload(SignableObject):
-    def __init__(self, id: UUID, topic: AbstractTopic, sender_certificate: Certificate) -> None:
+    __slots__ = ("payload_id", "topic", "sender_certificate", "max_hops")
+
+    def __init__(self, id: UUID, topic: AbstractTopic, sender_certificate: Certificate, max_hops: int = None) -> None:
         self.payload_id = id
         self.topic = topic
         self.sender_certificate = sender_certificate
+        self.max_hops = topic.broadcast_radius() if max_hops is None else max_hops
 
 
+@frame
 class AskForBroadcastFrame(ReprObject):
-    def __init__(self, signed_request_payload: RequestPayload) -> None:
-        self.ask_id = uuid4()
-        self.signed_request_payload = signed_request_payload
+    signed_request_payload: RequestPayload
+    ask_id: UUID = field(default_factory=uuid4)
+    have: bytes = b""
+
 
+@frame
+class InterestSummaryFrame(ReprObject):
+    added: Dict[str, int]
+    removed: List[str]
+    have: bytes = b""
 
+
+@frame
 class POWBroadcastConditionsFrame(ReprObject):
-    def __init__(self, ask_id: UUID, valid_till: datetime, work_request: WorkRequest, timestamp_tolerance: timedelta) -> None:
-        self.ask_id = ask_id
-        self.valid_till = valid_till
-        self.work_request = work_request
-        self.timestamp_tolerance = timestamp_tolerance
+    ask_id: UUID
+    valid_till: datetime
+    work_request: WorkRequest
+    timestamp_tolerance: timedelta
+    have: bytes = b""
 
 
+@frame
 class BroadcastPayload(ReprObject):
-    def __init__(self,
-                 signed_request_payload: RequestPayload,
-                 backward_onion: OnionRoute
-                 ) -> None:
-        self.signed_request_payload = signed_request_payload
-        self.backward_onion = backward_onion
-        self.timestamp = None
-
-    def set_timestamp(self, timestamp: datetime):
-        self.timestamp = timestamp
+    signed_request_payload: RequestPayload
+    backward_onion: OnionRoute
+    timestamp: datetime = None
+    # hops the broadcast may still travel after this one; starts at the signed
+    # `max_hops` - 1 at the origin and is decremented by every forwarder
+    hops_left: int = 0
 
 
+@frame
 class POWBroadcastFrame(ReprObject):
-    def __init__(self,
-                 ask_id: UUID,
-                 broadcast_payload: BroadcastPayload,
-                 proof_of_work: ProofOfWork
-                 ):
-        self.ask_id = ask_id
-        self.broadcast_payload = broadcast_payload
-        self.proof_of_work = proof_of_work
+    ask_id: UUID
+    broadcast_payload: BroadcastPayload
+    proof_of_work: ProofOfWork
+    have: bytes = b""
 
     def verify(self) -> bool:
         if not self.broadcast_payload.signed_request_payload.sender_certificate.verify():
@@ -110,13 +141,18 @@ class POWBroadcastFrame(ReprObject):
 
 
 class SettlementPromise(SignableObject):
+    __slots__ = ("settler_certificate", "payload_id", "network_payment_hash",
+                 "hash_of_encrypted_reply_payload", "reply_payment_amount")
+
     def __init__(self,
                  settler_certificate: Certificate,
+                 payload_id: UUID,
                  network_payment_hash: bytes,
                  hash_of_encrypted_reply_payload: bytes,
                  reply_payment_amount: int
                  ) -> None:
         self.settler_certificate = settler_certificate
+        self.payload_id = payload_id
         self.network_payment_hash = network_payment_hash
         self.hash_of_encrypted_reply_payload = hash_of_encrypted_reply_payload
         self.reply_payment_amount = reply_payment_amount
@@ -131,17 +167,12 @@ class SettlementPromise(SignableObject):
         return True
 
 
+@frame
 class ReplyPayload(ReprObject):
-    def __init__(self,
-                 replier_certificate: Certificate,
-                 signed_request_payload: RequestPayload,
-                 encrypted_reply_message: bytes,
-                 reply_invoice: HodlInvoice
-                 ) -> None:
-        self.replier_certificate = replier_certificate
-        self.signed_request_payload = signed_request_payload
-        self.encrypted_reply_message = encrypted_reply_message
-        self.reply_invoice = reply_invoice
+    replier_certificate: Certificate
+    signed_request_payload: RequestPayload
+    encrypted_reply_message: bytes
+    reply_invoice: HodlInvoice
 
     def verify_all(self):
         if not self.replier_certificate.verify():
@@ -153,17 +184,13 @@ class ReplyPayload(ReprObject):
         return True
 
 
+@frame
 class ReplyFrame(ReprObject):
-    def __init__(self,
-                 encrypted_reply_payload: bytes,
-                 signed_settlement_promise: SettlementPromise,
-                 forward_onion: OnionRoute,
-                 network_invoice: HodlInvoice) -> None:
-
-        self.encrypted_reply_payload = encrypted_reply_payload
-        self.signed_settlement_promise = signed_settlement_promise
-        self.forward_onion = forward_onion
-        self.network_invoice = network_invoice
+    encrypted_reply_payload: bytes
+    signed_settlement_promise: SettlementPromise
+    forward_onion: OnionRoute
+    network_invoice: HodlInvoice
+    have: bytes = b""
 
     def decrypt_and_verify(self, sender_private_key: bytes) -> ReplyPayload:
         reply_payload: ReplyPayload = crypto.decrypt_object(
@@ -176,9 +203,177 @@ class ReplyFrame(ReprObject):
         return reply_payload
 
 
+class CollectedReply(ReprObject):
+    """A reply kept encrypted at the originator until it is read.
+
+    Ranking and lookups only use the cleartext settlement promise and network invoice;
+    the reply payload is decrypted and verified on first access of `reply_payload`.
+    """
+
+    def __init__(self, reply_frame: ReplyFrame, private_key: bytes) -> None:
+        self.signed_settlement_promise = reply_frame.signed_settlement_promise
+        self.network_invoice = reply_frame.network_invoice
+        self._reply_frame = reply_frame
+        self._private_key = private_key
+        self._reply_payload = None
+        self._opened = False
+
+    @property
+    def reply_payload(self) -> ReplyPayload:
+        if not self._opened:
+            self._reply_payload = self._open()
+            self._opened = True
+            self._private_key = None
+        return self._reply_payload
+
+    def _open(self) -> ReplyPayload:
+        promise = self.signed_settlement_promise
+        if not promise.verify_all(self._reply_frame.encrypted_reply_payload):
+            return None
+        reply_payload = self._reply_frame.decrypt_and_verify(self._private_key)
+        if reply_payload is None:
+            return None
+        if reply_payload.signed_request_payload.payload_id != promise.payload_id:
+            return None
+        if reply_payload.reply_invoice.amount != promise.reply_payment_amount:
+            return None
+        return reply_payload
+
+    def is_opened(self) -> bool:
+        return self._opened
+
+    def is_rejected(self) -> bool:
+        return self._opened and self._reply_payload is None
+
+
+def reply_total_price(reply: CollectedReply) -> int:
+    """Default reply score: what the customer pays in total (reply price plus network fees)."""
+    return reply.signed_settlement_promise.reply_payment_amount + reply.network_invoice.amount
+
+
+class ReplyCollector:
+    """Collects replies to one request, ordered by `score` (lower is better).
+
+    Replies can be consumed as they arrive (`subscribe`, `wait_for`) or queried
+    for the best `k` seen so far (`best`) while the flood is still in progress.
+    """
+
+    def __init__(self, score: Callable[[CollectedReply], float] = reply_total_price) -> None:
+        self.score = score
+        self._heap: List[Tuple[float, int, CollectedReply]] = list()
+        self._arrivals: List[CollectedReply] = list()
+        self._by_payment_hash: Dict[bytes, List[CollectedReply]] = dict()
+        self._by_settler: Dict[bytes, List[CollectedReply]] = dict()
+        self._subscribers: List[Callable[[CollectedReply], None]] = list()
+        self._waiters = list()
+
+    def add(self, reply: CollectedReply) -> None:
+        heapq.heappush(self._heap, (self.score(reply), len(self._arrivals), reply))
+        self._arrivals.append(reply)
+        payment_hash = reply.signed_settlement_promise.network_payment_hash
+        if not payment_hash in self._by_payment_hash:
+            self._by_payment_hash[payment_hash] = list()
+        self._by_payment_hash[payment_hash].append(reply)
+        settler_id = reply.signed_settlement_promise.settler_certificate.public_key
+        if not settler_id in self._by_settler:
+            self._by_settler[settler_id] = list()
+        self._by_settler[settler_id].append(reply)
+        for on_reply in list(self._subscribers):
+            on_reply(reply)
+        waiters = self._waiters
+        self._waiters = list()
+        for count, event in waiters:
+            if len(self._arrivals) >= count:
+                event.succeed(self.best(count))
+            else:
+                self._waiters.append((count, event))
+
+    def subscribe(self, on_reply: Callable[[CollectedReply], None], replay: bool = True) -> None:
+        if replay:
+            for reply in self._arrivals:
+                on_reply(reply)
+        self._subscribers.append(on_reply)
+
+    def unsubscribe(self, on_reply: Callable[[CollectedReply], None]) -> None:
+        self._subscribers.remove(on_reply)
+
+    def wait_for(self, env, count: int = 1):
+        """A simpy event that fires with the best `count` replies once that many have arrived."""
+        event = env.event()
+        if len(self._arrivals) >= count:
+            event.succeed(self.best(count))
+        else:
+            self._waiters.append((count, event))
+        return event
+
+    def _ranked(self):
+        n = 1
+        yielded = 0
+        while yielded < len(self._heap):
+            n = min(n*2, len(self._heap))
+            for _, _, reply in heapq.nsmallest(n, self._heap)[yielded:]:
+                yield reply
+            yielded = n
+
+    def best(self, k: int = 1) -> List[CollectedReply]:
+        """Best `k` replies by score, without decrypting anything."""
+        result = list()
+        for reply in self._ranked():
+            if len(result) >= k:
+                break
+            if not reply.is_rejected():
+                result.append(reply)
+        return result
+
+    def best_valid(self, k: int = 1) -> List[CollectedReply]:
+        """Best `k` replies that decrypt and verify, opening them in score order."""
+        result = list()
+        for reply in self._ranked():
+            if len(result) >= k:
+                break
+            if reply.reply_payload is not None:
+                result.append(reply)
+        return result
+
+    def with_payment_hash(self, network_payment_hash: bytes) -> List[CollectedReply]:
+        return self._by_payment_hash.get(network_payment_hash, [])
+
+    def from_settler(self, settler_public_key: bytes) -> List[CollectedReply]:
+        return self._by_settler.get(settler_public_key, [])
+
+    def __iter__(self):
+        return iter(self._arrivals)
+
+    def __len__(self) -> int:
+        return len(self._arrivals)
+
+
 InvoiceById: Dict[UUID, Tuple[PaymentChannel, bytes]] = dict()
 
 
+def frame_payload_id(frame) -> UUID:
+    """The id of the request a frame is about; None for frames that do not carry it."""
+    if isinstance(frame, AskForBroadcastFrame):
+        return frame.signed_request_payload.payload_id
+    if isinstance(frame, POWBroadcastFrame):
+        return frame.broadcast_payload.signed_request_payload.payload_id
+    if isinstance(frame, ReplyFrame):
+        return frame.signed_settlement_promise.payload_id
+    return None
+
+
+_CARRIES_HAVE: Dict[type, bool] = dict()
+
+
+def carries_have(data) -> bool:
+    """Whether `data` is a dataclass frame with a "have" field to piggyback a summary on."""
+    cls = type(data)
+    carries = _CARRIES_HAVE.get(cls)
+    if carries is None:
+        carries = _CARRIES_HAVE[cls] = is_dataclass(cls) and any(f.name == "have" for f in fields(cls))
+    return carries
+
+
 def SetSettementCommand(payment_channel: PaymentChannel, invoice_id: UUID, preimage) -> None:
     global InvoiceById
     InvoiceById[invoice_id] = (payment_channel, preimage)
@@ -203,7 +398,8 @@ class Settler:
         self.payment_channel = payment_channel
         self.price_amount_for_settlement = price_amount_for_settlement
 
-    def generate_reply_payment_trust(self) -> Tuple[bytes, Callable[[HodlInvoice]]]:
+    def generate_reply_payment_trust(self, payload_id: UUID = None, replier_certificate: Certificate = None) -> Tuple[bytes, Callable[[HodlInvoice]]]:
+        # the arguments only route the call when settlers are sharded (see settler_service.ShardedSettler)
         reply_preimage = crypto.generate_symmetric_key()
         reply_payment_hash = compute_payment_hash(reply_preimage)
 
@@ -211,44 +407,105 @@ class Settler:
         SetSettementCommand(self.payment_channel, invoice_id, reply_preimage)
         return invoice_id, reply_payment_hash, OnSettementCommand
 
-    def generate_settlement_trust(self, message: bytes, reply_invoice: HodlInvoice, signed_request_payload: RequestPayload, replier_certificate: Certificate) -> Tuple[HodlInvoice, SettlementPromise, bytes]:
-
-        network_preimage = crypto.generate_symmetric_key()
-        network_payment_hash = compute_payment_hash(network_preimage)
-
-        encrypted_reply_message = crypto.symmetric_encrypt(
-            network_preimage, message)
-
-        network_payment_hash = compute_payment_hash(
-            network_preimage)
-
-        def on_accepted(i: Invoice):
-            self.payment_channel.settle_hodl_invoice(
-                i, network_preimage)
-
-        network_invoice = self.payment_channel.create_hodl_invoice(
-            self.price_amount_for_settlement,
-            network_payment_hash,
-            on_accepted=on_accepted
-        )
-
-        reply_payload = ReplyPayload(replier_certificate,
-                                     signed_request_payload,
-                                     encrypted_reply_message,
-                                     reply_invoice)
-
-        encrypted_reply_payload = crypto.encrypt_object(
-            reply_payload, signed_request_payload.sender_certificate.public_key)
-
-        hash_of_encrypted_reply_payload = crypto.compute_sha256(
-            [encrypted_reply_payload])
-        signed_settlement_promise = SettlementPromise(
-            self.settler_certificate, network_payment_hash, hash_of_encrypted_reply_payload, reply_invoice.amount)
-        signed_settlement_promise.sign(self._settler_private_key)
-        return signed_settlement_promise, network_invoice, encrypted_reply_payload
+    def generate_settlement_trust(self, message: bytes, reply_invoice: HodlInvoice, signed_request_payload: RequestPayload, replier_certificate: Certificate) -> Tuple[SettlementPromise, HodlInvoice, bytes]:
+        return self.generate_settlement_trusts([dict(message=message,
+                                                     reply_invoice=reply_invoice,
+                                                     signed_request_payload=signed_request_payload,
+                                                     replier_certificate=replier_certificate)])[0]
+
+    def submit_settlement_trust(self, **request) -> Future:
+        """The asynchronous form of `generate_settlement_trust`; a plain settler completes it at once."""
+        future = Future()
+        try:
+            future.set_result(self.generate_settlement_trust(**request))
+        except Exception as ex:
+            future.set_exception(ex)
+        return future
+
+    def generate_settlement_trusts(self, requests: List[dict]) -> List[Tuple[SettlementPromise, HodlInvoice, bytes]]:
+        """`generate_settlement_trust` for a batch of requests given as its keyword arguments.
+
+        Loading the settler key dominates the cost of a signature, so a batch loads it
+        once and signs every promise with it.
+        """
+        network_invoices = list()
+        reply_payloads = list()
+        for request in requests:
+            network_preimage = crypto.generate_symmetric_key()
+            network_payment_hash = compute_payment_hash(network_preimage)
+
+            encrypted_reply_message = crypto.symmetric_encrypt(
+                network_preimage, request["message"])
+
+            def on_accepted(i: Invoice, network_preimage=network_preimage):
+                self.payment_channel.settle_hodl_invoice(
+                    i, network_preimage)
+
+            network_invoices.append(self.payment_channel.create_hodl_invoice(
+                self.price_amount_for_settlement,
+                network_payment_hash,
+                on_accepted=on_accepted
+            ))
+
+            reply_payloads.append(ReplyPayload(request["replier_certificate"],
+                                               request["signed_request_payload"],
+                                               encrypted_reply_message,
+                                               request["reply_invoice"]))
+
+        encrypted_reply_payloads = crypto.encrypt_objects(
+            reply_payloads, [request["signed_request_payload"].sender_certificate.public_key for request in requests])
+
+        settlement_promises = list()
+        for request, network_invoice, encrypted_reply_payload in zip(requests, network_invoices, encrypted_reply_payloads):
+            hash_of_encrypted_reply_payload = crypto.compute_sha256(
+                [encrypted_reply_payload])
+            settlement_promise = SettlementPromise(
+                self.settler_certificate, request["signed_request_payload"].payload_id, network_invoice.payment_hash, hash_of_encrypted_reply_payload, request["reply_invoice"].amount)
+            settlement_promise.signature = None
+            settlement_promises.append(settlement_promise)
+        for settlement_promise, signature in zip(settlement_promises, crypto.sign_objects(settlement_promises, self._settler_private_key)):
+            settlement_promise.signature = signature
+        return list(zip(settlement_promises, network_invoices, encrypted_reply_payloads))
+
+
+# Limits on incoming frames by type: (frames per minute, burst) per peer and for the
+# whole node, and the mailbox depths beyond which a type is shed (asks go first).
+DEFAULT_PER_PEER_FRAME_LIMITS = {
+    "AskForBroadcastFrame": (60, 30),
+    "POWBroadcastConditionsFrame": (60, 30),
+    "POWBroadcastFrame": (60, 30),
+    "ReplyFrame": (600, 300),
+    "InterestSummaryFrame": (60, 60),
+}
+DEFAULT_TOTAL_FRAME_LIMITS = {
+    "AskForBroadcastFrame": (600, 300),
+    "POWBroadcastConditionsFrame": (600, 300),
+    "POWBroadcastFrame": (600, 300),
+    "ReplyFrame": (6000, 3000),
+    "InterestSummaryFrame": (600, 600),
+}
+DEFAULT_SHED_DEPTHS = {
+    "AskForBroadcastFrame": 100,
+    "POWBroadcastConditionsFrame": 200,
+    "POWBroadcastFrame": 200,
+    "InterestSummaryFrame": 400,
+    "ReplyFrame": 1000,
+}
+
+# Mailbox classes: replies carry money back toward customers and overtake everything,
+# fresh asks wait the longest.
+DEFAULT_MESSAGE_PRIORITIES = {
+    "ReplyFrame": 0,
+    "POWBroadcastFrame": 1,
+    "POWBroadcastConditionsFrame": 2,
+    "InterestSummaryFrame": 2,
+    "AskForBroadcastFrame": 3,
+}
 
 
 class SweetGossipNode(Agent):
+    message_priorities = DEFAULT_MESSAGE_PRIORITIES
+
     def __init__(self,
                  name,
                  certificate: Certificate,
@@ -261,9 +518,13 @@ class SweetGossipNode(Agent):
                  timestamp_tolerance: timedelta,
                  invoice_payment_timeout: timedelta,
                  settler: Settler,
+                 interest_radius: int = 16,
+                 seen_filter_capacity: int = 256,
+                 rate_limiter: FrameRateLimiter = None,
+                 broadcast_fanout: int = None,
+                 count_frame_bytes: bool = False,
                  ):
         super().__init__(name)
-        self.name = name
         self.certificate = certificate
         self._private_key = private_key
         self.payment_channel = payment_channel
@@ -274,6 +535,15 @@ class SweetGossipNode(Agent):
         self.timestamp_tolerance = timestamp_tolerance
         self.invoice_payment_timeout = invoice_payment_timeout
         self.settler = settler
+        self.interest_radius = interest_radius
+        # peers a broadcast is offered to, picked at random among the eligible ones (None - all)
+        self.broadcast_fanout = broadcast_fanout
+        # None admits every frame; pass FrameRateLimiter(DEFAULT_PER_PEER_FRAME_LIMITS,
+        # DEFAULT_TOTAL_FRAME_LIMITS, DEFAULT_SHED_DEPTHS) for the default limits
+        self.rate_limiter = rate_limiter
+        # whether the metrics count the encoded bytes of frames whose size nothing else needed
+        # (no history, no link bandwidth); encoding a frame only for its size is not free
+        self.count_frame_bytes = count_frame_bytes
 
         self._known_hosts: Dict[str, SweetGossipNode] = dict()
         self._broadcast_payloads_by_ask_id: Dict[UUID, BroadcastPayload] = dict(
@@ -281,19 +551,154 @@ class SweetGossipNode(Agent):
         self._my_pow_br_cond_by_ask_id: Dict[UUID,
                                              POWBroadcastConditionsFrame] = dict()
         self._already_broadcasted_request_payload_ids: Dict[UUID, int] = dict()
-        self.reply_payloads: Dict[UUID,
-                                  Dict[bytes,
-                                       List[Tuple[ReplyPayload, HodlInvoice]]]] = dict()
-
-    def connect_to(self, other):
+        self.reply_score: Callable[[CollectedReply], float] = reply_total_price
+        self.reply_collectors: Dict[UUID, ReplyCollector] = dict()
+        self._own_interests: Set[str] = set()
+        self._peer_interests: Dict[str, GeohashPrefixTrie] = dict()
+        self._advertised_interests: Dict[str, Dict[str, int]] = dict()
+        self._seen_payloads = RollingBloomFilter(seen_filter_capacity)
+        self._peer_have: Dict[str, bytes] = dict()
+        self._have_sent: Dict[str, bytes] = dict()
+        self.metrics = FrameMetrics()
+        self._frame_handlers: Dict[type, Callable] = {
+            AskForBroadcastFrame: self.on_ask_for_broadcast_frame,
+            POWBroadcastConditionsFrame: self.on_pow_broadcast_conditions_frame,
+            POWBroadcastFrame: self.on_pow_broadcast_frame,
+            ReplyFrame: self.on_response_frame,
+            InterestSummaryFrame: self.on_interest_summary_frame,
+        }
+
+    def connect_to(self, other, link: Link = None):
+        """Connects the two nodes both ways, over a copy of `link` in each direction if given."""
         if other.name == self.name:
             raise Exception("Cannot connect node to itself")
+        if link is not None:
+            self.set_link(other.name, link.copy())
+            other.set_link(self.name, link.copy())
         self._known_hosts[other.name] = other
         other._known_hosts[self.name] = self
 
+    def neighbours(self):
+        return self._known_hosts.keys()
+
+    def create_queue(self, env):
+        self.queue = create_mailbox(env, self.message_priorities, self.mailbox_max_bypass,
+                                    admit=lambda m: self.admit(env, m))
+
+    def queue_depth(self) -> int:
+        """Frames waiting in the mailbox; 0 when the node runs over a transport, which has none."""
+        return len(self.queue) if hasattr(self, "queue") else 0
+
+    def admit(self, e, m) -> bool:
+        """Decides whether an incoming message enters the mailbox, see `FrameRateLimiter`."""
+        if self.rate_limiter is None:
+            return True
+        frame_type = type(m.data).__name__
+        queue_depth = self.queue_depth()
+        self.metrics.record_arrival(frame_type, queue_depth)
+        reason = self.rate_limiter.admit(e.now, m.sender.name, frame_type, queue_depth)
+        if reason is None:
+            return True
+        self.reject(m.data, reason)
+        if e.history is not None:
+            record_event(e, self.name, "rejected:"+reason, frame_type,
+                         0, str(frame_payload_id(m.data) or ""))
+        return False
+
     def accept_topic(self, topic: AbstractTopic) -> bool:
         return False
 
+    def topic_geohash(self, topic: AbstractTopic) -> str:
+        return None
+
+    def add_interest(self, e, geohash_prefix: str) -> None:
+        self._own_interests.add(geohash_prefix)
+        self._update_interest_summaries(e, [geohash_prefix])
+
+    def remove_interest(self, e, geohash_prefix: str) -> None:
+        self._own_interests.discard(geohash_prefix)
+        self._update_interest_summaries(e, [geohash_prefix])
+
+    def advertise_interests(self, e) -> None:
+        """Sends the full interest summary to every peer, even if it is empty.
+
+        A peer that has never received a summary from us keeps flooding every topic our way.
+        """
+        for peer in self._known_hosts.values():
+            added = self._interest_summary_for(peer.name)
+            self._advertised_interests[peer.name] = added
+            self.new_message(e, peer, InterestSummaryFrame(dict(added), []))
+
+    def _interest_hops_for(self, peer_name: str, geohash_prefix: str) -> int:
+        if geohash_prefix in self._own_interests:
+            return 0
+        best = None
+        for name, trie in self._peer_interests.items():
+            if name == peer_name:
+                continue
+            hops = trie.get(geohash_prefix)
+            if hops is not None and (best is None or hops < best):
+                best = hops
+        if best is None or best+1 > self.interest_radius:
+            return None
+        return best+1
+
+    def _interest_summary_for(self, peer_name: str) -> Dict[str, int]:
+        prefixes = set(self._own_interests)
+        for trie in self._peer_interests.values():
+            prefixes.update(prefix for prefix, _ in trie.items())
+        summary = dict()
+        for prefix in prefixes:
+            hops = self._interest_hops_for(peer_name, prefix)
+            if hops is not None:
+                summary[prefix] = hops
+        return summary
+
+    def _update_interest_summaries(self, e, prefixes: List[str]) -> None:
+        for peer in self._known_hosts.values():
+            if not peer.name in self._advertised_interests:
+                continue
+            advertised = self._advertised_interests[peer.name]
+            added = dict()
+            removed = list()
+            for prefix in prefixes:
+                hops = self._interest_hops_for(peer.name, prefix)
+                if hops is None:
+                    if prefix in advertised:
+                        del advertised[prefix]
+                        removed.append(prefix)
+                elif advertised.get(prefix) != hops:
+                    advertised[prefix] = hops
+                    added[prefix] = hops
+            if added or removed:
+                self.new_message(e, peer, InterestSummaryFrame(added, removed))
+
+    def peer_covers_topic(self, peer_name: str, geohash: str) -> bool:
+        if geohash is None:
+            return True
+        if not peer_name in self._peer_interests:
+            return True
+        return self._peer_interests[peer_name].overlaps(geohash)
+
+    def on_interest_summary_frame(self, e, m, peer: SweetGossipNode, interest_summary_frame: InterestSummaryFrame):
+        first_summary = not peer.name in self._peer_interests
+        if first_summary:
+            self._peer_interests[peer.name] = GeohashPrefixTrie()
+        trie = self._peer_interests[peer.name]
+        for prefix in interest_summary_frame.removed:
+            trie.discard(prefix)
+        for prefix, hops in interest_summary_frame.added.items():
+            if hops > self.interest_radius:
+                trie.discard(prefix)
+            else:
+                trie.set(prefix, hops)
+        if first_summary and not peer.name in self._advertised_interests:
+            added = self._interest_summary_for(peer.name)
+            self._advertised_interests[peer.name] = added
+            self.new_message(e, peer, InterestSummaryFrame(dict(added), []))
+        self._update_interest_summaries(e, list(interest_summary_frame.added.keys()) +
+                                        list(interest_summary_frame.removed))
+
     def increment_broadcasted(self, payload_id: int) -> None:
         if not payload_id in self._already_broadcasted_request_payload_ids:
             self._already_broadcasted_request_payload_ids[payload_id] = 0
@@ -307,7 +712,10 @@ class SweetGossipNode(Agent):
     def broadcast(self, e,
                   request_payload: RequestPayload,
                   originator_peer_name: str = None,
-                  backward_onion: OnionRoute = OnionRoute()):
+                  backward_onion: OnionRoute = OnionRoute(),
+                  hops_left: int = None):
+        """Offers `request_payload` to the peers. The origin leaves `hops_left` out, so the
+        payload can travel its signed `max_hops`; forwarders pass what is left of it."""
         if not self.accept_topic(request_payload.topic):
             return
 
@@ -317,24 +725,77 @@ class SweetGossipNode(Agent):
             self.info(e, "already broadcasted")
             return
 
-        for peer in self._known_hosts.values():
-            if peer.name == originator_peer_name:
-                continue
-            print(self.name, "================>>>>>>>>>", peer.name)
+        if hops_left is None:
+            hops_left = request_payload.max_hops - 1
+        if hops_left < 0:
+            self.info(e, "hop budget exhausted")
+            return
+
+        geohash = self.topic_geohash(request_payload.topic)
+        peers = [peer for peer in self._known_hosts.values()
+                 if peer.name != originator_peer_name
+                 and self.peer_covers_topic(peer.name, geohash)
+                 and not self.peer_has_seen(peer.name, request_payload.payload_id)]
+        if self.broadcast_fanout is not None and len(peers) > self.broadcast_fanout:
+            peers = random.sample(peers, self.broadcast_fanout)
+        if peers:
+            # advertised in the "have" summaries only once the payload is on its way from here
+            self._seen_payloads.add(request_payload.payload_id.bytes)
+        for peer in peers:
+            self.trace(e, "================>>>>>>>>>", peer.name)
             ask_for_broadcast_frame = AskForBroadcastFrame(request_payload)
             broadcast_payload = BroadcastPayload(request_payload,
                                                  backward_onion.grow(OnionLayer(
-                                                     self.name), peer.certificate.public_key))
+                                                     self.name), peer.certificate.public_key),
+                                                 hops_left=hops_left)
             self._broadcast_payloads_by_ask_id[ask_for_broadcast_frame.ask_id] = broadcast_payload
             self.new_message(e, peer, ask_for_broadcast_frame)
 
+    def peer_has_seen(self, peer_name: str, payload_id: UUID) -> bool:
+        """Whether the last "have" summary from `peer_name` contains `payload_id` (false positives possible)."""
+        return summary_contains(self._peer_have.get(peer_name, b""), payload_id.bytes)
+
+    def new_message(self, env, target, data, size=None):
+        """Sends `data`, piggybacking the summary of the payloads this node has seen if `target` has not got it yet
+        and `data` has a "have" field (see `carries_have`); other data is sent unchanged.
+
+        The frame is encoded for its size only when something needs it: the history here,
+        a link with a bandwidth (`Thing.new_message`) or the receiver's metrics (`on_message`).
+        Each of them reuses the size once it is on the message.
+        """
+        summary = self._seen_payloads.summary()
+        if carries_have(data) and self._have_sent.get(target.name) is not summary:
+            self._have_sent[target.name] = summary
+            data = replace(data, have=summary)
+            size = None
+        if env.history is not None:
+            if size is None:
+                size = self.frame_size(data)
+            record_event(env, self.name, "sent", type(data).__name__,
+                         size, str(frame_payload_id(data) or ""))
+        super().new_message(env, target, data, size)
+
+    def register_frame_handler(self, frame_type: type, handler: Callable) -> None:
+        """Routes frames of `frame_type` to `handler(e, m, peer, frame)` in `on_message`."""
+        self._frame_handlers[frame_type] = handler
+
+    def reject(self, frame, reason: str) -> None:
+        """Records that `frame` was dropped for `reason`. Handlers call it on every early return."""
+        self.metrics.record_reject(type(frame).__name__, reason)
+
+    def message_size(self, data) -> int:
+        return self.frame_size(data)
+
+    def frame_size(self, frame) -> int:
+        return len(wire.encode_frame(frame))
+
     def on_ask_for_broadcast_frame(self, e, m, peer: SweetGossipNode, ask_for_broadcast_frame: AskForBroadcastFrame):
         if not self.can_increment_broadcast(ask_for_broadcast_frame.signed_request_payload.payload_id):
             self.info(e, "already broadcasted dont ask")
-            return
+            return self.reject(ask_for_broadcast_frame, "already_broadcasted")
         pow_broadcast_conditions_frame = POWBroadcastConditionsFrame(
             ask_id=ask_for_broadcast_frame.ask_id,
-            valid_till=datetime.now()+self.broadcast_conditions_timeout,
+            valid_till=clock.now()+self.broadcast_conditions_timeout,
             work_request=WorkRequest(pow_scheme=self.broadcast_conditions_pow_scheme,
                                      pow_target=pow_target_from_complexity(
                                          self.broadcast_conditions_pow_scheme, self.broadcast_conditions_pow_complexity)),
@@ -343,17 +804,18 @@ class SweetGossipNode(Agent):
         self.new_message(e, peer, pow_broadcast_conditions_frame)
 
     def on_pow_broadcast_conditions_frame(self, e, m, peer: SweetGossipNode, pow_broadcast_condtitions_frame: POWBroadcastConditionsFrame):
-        if datetime.now() <= pow_broadcast_condtitions_frame.valid_till:
-            if pow_broadcast_condtitions_frame.ask_id in self._broadcast_payloads_by_ask_id:
-                broadcast_payload = self._broadcast_payloads_by_ask_id[
-                    pow_broadcast_condtitions_frame.ask_id]
-                broadcast_payload.set_timestamp(datetime.now())
-                pow = pow_broadcast_condtitions_frame.work_request.compute_proof(
-                    broadcast_payload)
-                pow_broadcast_frame = POWBroadcastFrame(pow_broadcast_condtitions_frame.ask_id,
-                                                        broadcast_payload,
-                                                        pow)
-                self.new_message(e, peer, pow_broadcast_frame)
+        if clock.now() > pow_broadcast_condtitions_frame.valid_till:
+            return self.reject(pow_broadcast_condtitions_frame, "expired_conditions")
+        if not pow_broadcast_condtitions_frame.ask_id in self._broadcast_payloads_by_ask_id:
+            return self.reject(pow_broadcast_condtitions_frame, "unknown_ask_id")
+        broadcast_payload = replace(self._broadcast_payloads_by_ask_id[
+            pow_broadcast_condtitions_frame.ask_id], timestamp=clock.now())
+        pow = pow_broadcast_condtitions_frame.work_request.compute_proof(
+            broadcast_payload)
+        pow_broadcast_frame = POWBroadcastFrame(pow_broadcast_condtitions_frame.ask_id,
+                                                broadcast_payload,
+                                                pow)
+        self.new_message(e, peer, pow_broadcast_frame)
 
     def accept_broadcast(self, signed_request_payload: RequestPayload) -> Tuple[bytes, int]:
         return None, 0
@@ -361,123 +823,155 @@ class SweetGossipNode(Agent):
     def on_pow_broadcast_frame(self, e, m, peer: SweetGossipNode, pow_broadcast_frame: POWBroadcastFrame):
 
         if not pow_broadcast_frame.ask_id in self._my_pow_br_cond_by_ask_id:
-            return
+            return self.reject(pow_broadcast_frame, "unknown_ask_id")
 
         my_pow_broadcast_condition_frame = self._my_pow_br_cond_by_ask_id[
             pow_broadcast_frame.ask_id]
 
         if pow_broadcast_frame.proof_of_work.pow_scheme != my_pow_broadcast_condition_frame.work_request.pow_scheme:
-            return
+            return self.reject(pow_broadcast_frame, "pow_scheme_mismatch")
 
         if pow_broadcast_frame.proof_of_work.pow_target != my_pow_broadcast_condition_frame.work_request.pow_target:
-            return
+            return self.reject(pow_broadcast_frame, "pow_target_mismatch")
 
-        if pow_broadcast_frame.broadcast_payload.timestamp > datetime.now():
-            return
+        if pow_broadcast_frame.broadcast_payload.timestamp > clock.now():
+            return self.reject(pow_broadcast_frame, "timestamp_in_future")
 
-        if pow_broadcast_frame.broadcast_payload.timestamp+my_pow_broadcast_condition_frame.timestamp_tolerance < datetime.now():
-            return
+        if pow_broadcast_frame.broadcast_payload.timestamp+my_pow_broadcast_condition_frame.timestamp_tolerance < clock.now():
+            return self.reject(pow_broadcast_frame, "timestamp_too_old")
 
-        if not pow_broadcast_frame.verify():
-            return
+        signed_request_payload = pow_broadcast_frame.broadcast_payload.signed_request_payload
+        if not signed_request_payload.sender_certificate.verify():
+            return self.reject(pow_broadcast_frame, "bad_certificate")
+
+        if not signed_request_payload.verify(signed_request_payload.sender_certificate.public_key):
+            return self.reject(pow_broadcast_frame, "bad_signature")
+
+        if not pow_broadcast_frame.proof_of_work.validate(pow_broadcast_frame.broadcast_payload):
+            return self.reject(pow_broadcast_frame, "bad_pow")
+
+        if pow_broadcast_frame.broadcast_payload.hops_left >= signed_request_payload.max_hops:
+            return self.reject(pow_broadcast_frame, "hop_budget_exceeded")
 
         message, fee = self.accept_broadcast(
             pow_broadcast_frame.broadcast_payload.signed_request_payload)
 
         if message is not None:
 
-            invoice_id, reply_payment_hash, on_accepted = self.settler.generate_reply_payment_trust()
+            invoice_id, reply_payment_hash, on_accepted = self.settler.generate_reply_payment_trust(
+                payload_id=signed_request_payload.payload_id, replier_certificate=self.certificate)
 
             reply_invoice = self.payment_channel.create_hodl_invoice(
                 fee, reply_payment_hash, on_accepted, invoice_id=invoice_id)
 
-            signed_settlement_promise, network_invoice, encrypted_reply_payload = self.settler.generate_settlement_trust(
+            self.settler.submit_settlement_trust(
                 message=message,
                 reply_invoice=reply_invoice,
                 signed_request_payload=pow_broadcast_frame.broadcast_payload.signed_request_payload,
-                replier_certificate=self.certificate)
-
-            response_frame = ReplyFrame(
-                encrypted_reply_payload=encrypted_reply_payload,
-                signed_settlement_promise=signed_settlement_promise,
-                forward_onion=pow_broadcast_frame.broadcast_payload.backward_onion,
-                network_invoice=network_invoice
-            )
-
-            self.on_response_frame(
-                e, m, peer, response_frame=response_frame, new_response=True)
+                replier_certificate=self.certificate).add_done_callback(
+                    lambda future: self.on_settlement_trust(e, m, peer, pow_broadcast_frame, future))
         else:
             self.broadcast(e, request_payload=pow_broadcast_frame.broadcast_payload.signed_request_payload,
                            originator_peer_name=peer.name,
-                           backward_onion=pow_broadcast_frame.broadcast_payload.backward_onion)
+                           backward_onion=pow_broadcast_frame.broadcast_payload.backward_onion,
+                           hops_left=pow_broadcast_frame.broadcast_payload.hops_left-1)
+
+    def on_settlement_trust(self, e, m, peer: SweetGossipNode, pow_broadcast_frame: POWBroadcastFrame, future: Future):
+        if future.exception() is not None:
+            self.error(e, "settler failed:", repr(future.exception()))
+            return
+        signed_settlement_promise, network_invoice, encrypted_reply_payload = future.result()
+
+        response_frame = ReplyFrame(
+            encrypted_reply_payload=encrypted_reply_payload,
+            signed_settlement_promise=signed_settlement_promise,
+            forward_onion=pow_broadcast_frame.broadcast_payload.backward_onion,
+            network_invoice=network_invoice
+        )
+
+        self.on_response_frame(
+            e, m, peer, response_frame=response_frame, new_response=True)
 
     def on_response_frame(self, e, m, peer: SweetGossipNode, response_frame: ReplyFrame, new_response: bool = False):
         if response_frame.forward_onion.is_empty():
             if response_frame.signed_settlement_promise.network_payment_hash != response_frame.network_invoice.payment_hash:
                 self.error(
                     e, "reply payload has different network_payment_hash than network_invoice")
-                return
+                return self.reject(response_frame, "network_payment_hash_mismatch")
 
-            reply_payload = response_frame.decrypt_and_verify(
-                self._private_key)
-            if reply_payload is None:
-                self.error(e, "reply payload mismatch")
-                return
-            payload_id = reply_payload.signed_request_payload.payload_id
-            if not payload_id in self.reply_payloads:
-                self.reply_payloads[payload_id] = dict()
-            replier_id = reply_payload.replier_certificate.public_key
-            if not replier_id in self.reply_payloads[payload_id]:
-                self.reply_payloads[payload_id][replier_id] = list()
-
-            self.reply_payloads[payload_id][replier_id].append(
-                (reply_payload, response_frame.network_invoice))
+            payload_id = response_frame.signed_settlement_promise.payload_id
+            self.reply_collector(payload_id).add(
+                CollectedReply(response_frame, self._private_key))
             self.info(e, "reply payload frame collected")
         else:
-            top_layer = response_frame.forward_onion.peel(
+            top_layer, forward_onion = response_frame.forward_onion.peel(
                 self._private_key)
-            if top_layer.peer_name in self._known_hosts:
-                if not response_frame.signed_settlement_promise.verify_all(response_frame.encrypted_reply_payload):
-                    return
-                if response_frame.signed_settlement_promise.network_payment_hash != response_frame.network_invoice.payment_hash:
-                    return
-                network_invoice = None
-                if not new_response:
-                    next_network_invoice = response_frame.network_invoice
-
-                    def on_accepted(i: HodlInvoice):
-                        def on_settled(j: HodlInvoice, preimage: bytes):
-                            self.payment_channel.settle_hodl_invoice(
-                                i, preimage)
-
-                        self.payment_channel.pay_hodl_invoice(next_network_invoice,
-                                                              on_settled,
-                                                              )
-
-                    network_invoice = self.payment_channel.create_hodl_invoice(
-                        response_frame.network_invoice.amount+self.price_amount_for_routing,
-                        response_frame.network_invoice.payment_hash,
-                        on_accepted,
-                    )
-
-                    response_frame = deepcopy(response_frame)
-                    response_frame.network_invoice = network_invoice
-                self.new_message(
-                    e, self._known_hosts[top_layer.peer_name], response_frame)
+            if not top_layer.peer_name in self._known_hosts:
+                return self.reject(response_frame, "unknown_next_hop")
+            if not response_frame.signed_settlement_promise.verify_all(response_frame.encrypted_reply_payload):
+                return self.reject(response_frame, "bad_settlement_promise")
+            if response_frame.signed_settlement_promise.network_payment_hash != response_frame.network_invoice.payment_hash:
+                return self.reject(response_frame, "network_payment_hash_mismatch")
+            network_invoice = response_frame.network_invoice
+            if not new_response:
+                next_network_invoice = response_frame.network_invoice
+
+                def on_accepted(i: HodlInvoice):
+                    def on_settled(j: HodlInvoice, preimage: bytes):
+                        self.payment_channel.settle_hodl_invoice(
+                            i, preimage)
+
+                    self.payment_channel.pay_hodl_invoice(next_network_invoice,
+                                                          on_settled,
+                                                          )
+
+                network_invoice = self.payment_channel.create_hodl_invoice(
+                    response_frame.network_invoice.amount+self.price_amount_for_routing,
+                    response_frame.network_invoice.payment_hash,
+                    on_accepted,
+                )
+
+            # the "have" summary received with the frame is the upstream peer's, not ours
+            self.new_message(
+                e, self._known_hosts[top_layer.peer_name],
+                replace(response_frame, forward_onion=forward_onion, network_invoice=network_invoice, have=b""))
+
+    def reply_collector(self, payload_id: UUID) -> ReplyCollector:
+        if not payload_id in self.reply_collectors:
+            self.reply_collectors[payload_id] = ReplyCollector(self.reply_score)
+        return self.reply_collectors[payload_id]
 
     def get_responses(self, e, payload_id: UUID) -> List[List[Tuple[ReplyPayload, HodlInvoice]]]:
-        if not payload_id in self.reply_payloads:
+        if not payload_id in self.reply_collectors or not self.reply_collectors[payload_id]:
             self.error(e, "topic has no responses")
             return list()
-        return [list(response_frame_list) for response_frame_list in self.reply_payloads[payload_id].values()]
+        by_replier: Dict[bytes, List[Tuple[ReplyPayload, HodlInvoice]]] = dict()
+        for reply in self.reply_collectors[payload_id]:
+            if reply.reply_payload is None:
+                self.error(e, "reply payload mismatch")
+                continue
+            replier_id = reply.reply_payload.replier_certificate.public_key
+            if not replier_id in by_replier:
+                by_replier[replier_id] = list()
+            by_replier[replier_id].append(
+                (reply.reply_payload, reply.network_invoice))
+        return list(by_replier.values())
+
+    def get_best_responses(self, e, payload_id: UUID, k: int = 1) -> List[Tuple[ReplyPayload, HodlInvoice]]:
+        if not payload_id in self.reply_collectors or not self.reply_collectors[payload_id]:
+            self.error(e, "topic has no responses")
+            return list()
+        return [(reply.reply_payload, reply.network_invoice)
+                for reply in self.reply_collectors[payload_id].best_valid(k)]
 
     def pay_and_read_response(self, e, reply_payload: ReplyPayload, network_invoice: HodlInvoice):
         payload_id = reply_payload.signed_request_payload.payload_id
-        if not payload_id in self.reply_payloads:
+        if not payload_id in self.reply_collectors:
             self.error(e, "topic has no responses")
             return
 
-        if not reply_payload.replier_certificate.public_key in self.reply_payloads[payload_id]:
+        if not any(reply.reply_payload is reply_payload
+                   for reply in self.reply_collectors[payload_id].with_payment_hash(network_invoice.payment_hash)):
             self.error(e, "replier has not responsed for this topic")
             return
 
@@ -494,13 +988,23 @@ class SweetGossipNode(Agent):
             on_settled=on_settled)
 
     def on_message(self, e, m):
-        if isinstance(m.data, AskForBroadcastFrame):
-            self.on_ask_for_broadcast_frame(e, m, m.sender, m.data)
-        elif isinstance(m.data, POWBroadcastConditionsFrame):
-            self.on_pow_broadcast_conditions_frame(e, m, m.sender, m.data)
-        elif isinstance(m.data, POWBroadcastFrame):
-            self.on_pow_broadcast_frame(e, m, m.sender, m.data)
-        elif isinstance(m.data, ReplyFrame):
-            self.on_response_frame(e, m, m.sender, m.data)
-        else:
+        handler = self._frame_handlers.get(type(m.data))
+        if handler is None:
             self.trace(e, "unknown request:", m)
+            return
+        have = getattr(m.data, "have", None)
+        if have:
+            self._peer_have[m.sender.name] = have
+        started = time.perf_counter()
+        handler(e, m, m.sender, m.data)
+        elapsed = time.perf_counter()-started
+        if m.size is None and (self.count_frame_bytes or e.history is not None):
+            m.size = self.frame_size(m.data)
+        size = m.size or 0
+        self.metrics.record_handled(type(m.data).__name__, size, elapsed)
+        if e.history is not None:
+            record_event(e, self.name, "handled", type(m.data).__name__,
+                         size, str(frame_payload_id(m.data) or ""))
+
+
+import wire  # noqa: E402 - wire imports this module, so it can only come after the frames
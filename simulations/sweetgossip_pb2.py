@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
+# source: sweetgossip.proto
+# Protobuf Python Version: 7.35.1
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    7,
+    35,
+    1,
+    '',
+    'sweetgossip.proto'
+)
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x11sweetgossip.proto\x12\x0bsweetgossip\"\x15\n\x04UUID\x12\r\n\x05Value\x18\x01 \x01(\x0c\"\x1a\n\tTimestamp\x12\r\n\x05Value\x18\x01 \x01(\x03\"\x19\n\x08\x44uration\x12\r\n\x05Value\x18\x01 \x01(\x03\"\xa1\x01\n\x05Value\x12\x0e\n\x04\x42ool\x18\x01 \x01(\x08H\x00\x12\r\n\x03Int\x18\x02 \x01(\x12H\x00\x12\x10\n\x06\x44ouble\x18\x03 \x01(\x01H\x00\x12\x10\n\x06String\x18\x04 \x01(\tH\x00\x12\x0f\n\x05\x42ytes\x18\x05 \x01(\x0cH\x00\x12+\n\tTimestamp\x18\x06 \x01(\x0b\x32\x16.sweetgossip.TimestampH\x00\x12\x0e\n\x04Null\x18\x07 \x01(\x08H\x00\x42\x07\n\x05Value\"\xd3\x01\n\x0b\x43\x65rtificate\x12\x0e\n\x06\x43\x61Name\x18\x01 \x01(\t\x12\x11\n\tPublicKey\x18\x02 \x01(\x0c\x12\x0c\n\x04Name\x18\x03 \x01(\t\x12!\n\x05Value\x18\x04 \x01(\x0b\x32\x12.sweetgossip.Value\x12-\n\rNotValidAfter\x18\x05 \x01(\x0b\x32\x16.sweetgossip.Timestamp\x12.\n\x0eNotValidBefore\x18\x06 \x01(\x0b\x32\x16.sweetgossip.Timestamp\x12\x11\n\tSignature\x18\x07 \x01(\x0c\"=\n\nTopicField\x12\x0c\n\x04Name\x18\x01 \x01(\t\x12!\n\x05Value\x18\x02 \x01(\x0b\x32\x12.sweetgossip.Value\">\n\x05Topic\x12\x0c\n\x04Type\x18\x01 \x01(\t\x12\'\n\x06\x46ields\x18\x02 \x03(\x0b\x32\x17.sweetgossip.TopicField\"\xb2\x01\n\x0eRequestPayload\x12$\n\tPayloadId\x18\x01 \x01(\x0b\x32\x11.sweetgossip.UUID\x12!\n\x05Topic\x18\x02 \x01(\x0b\x32\x12.sweetgossip.Topic\x12\x33\n\x11SenderCertificate\x18\x03 \x01(\x0b\x32\x18.sweetgossip.Certificate\x12\x11\n\tSignature\x18\x04 \x01(\x0c\x12\x0f\n\x07MaxHops\x18\x05 \x01(\x05\"3\n\x0bWorkRequest\x12\x11\n\tPowScheme\x18\x01 \x01(\t\x12\x11\n\tPowTarget\x18\x02 \x01(\x0c\"C\n\x0bProofOfWork\x12\x11\n\tPowScheme\x18\x01 \x01(\t\x12\x11\n\tPowTarget\x18\x02 \x01(\x0c\x12\x0e\n\x06Nuance\x18\x03 \x01(\x03\"|\n\x0bHodlInvoice\x12\x1d\n\x02Id\x18\x01 \x01(\x0b\x32\x11.sweetgossip.UUID\x12\x13\n\x0bPaymentHash\x18\x02 \x01(\x0c\x12\x0e\n\x06\x41mount\x18\x03 \x01(\x03\x12)\n\tValidTill\x18\x04 \x01(\x0b\x32\x16.sweetgossip.Timestamp\"\xdf\x01\n\x11SettlementPromise\x12\x34\n\x12SettlerCertificate\x18\x01 \x01(\x0b\x32\x18.sweetgossip.Certificate\x12$\n\tPayloadId\x18\x02 \x01(\x0b\x32\x11.sweetgossip.UUID\x12\x1a\n\x12NetworkPaymentHash\x18\x03 \x01(\x0c\x12#\n\x1bHashOfEncryptedReplyPayload\x18\x04 \x01(\x0c\x12\x1a\n\x12ReplyPaymentAmount\x18\x05 \x01(\x03\x12\x11\n\tSignature\x18\x06 \x01(\x0c\"s\n\x14\x41skForBroadcastFrame\x12\x39\n\x14SignedRequestPayload\x18\x01 \x01(\x0b\x32\x1b.sweetgossip.RequestPayload\x12 \n\x05\x41skId\x18\x02 \x01(\x0b\x32\x11.sweetgossip.UUID\"\x92\x01\n\x14InterestSummaryFrame\x12;\n\x05\x41\x64\x64\x65\x64\x18\x01 \x03(\x0b\x32,.sweetgossip.InterestSummaryFrame.AddedEntry\x12\x0f\n\x07Removed\x18\x02 \x03(\t\x1a,\n\nAddedEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x05:\x02\x38\x01\"\xcc\x01\n\x1bPOWBroadcastConditionsFrame\x12 \n\x05\x41skId\x18\x01 \x01(\x0b\x32\x11.sweetgossip.UUID\x12)\n\tValidTill\x18\x02 \x01(\x0b\x32\x16.sweetgossip.Timestamp\x12-\n\x0bWorkRequest\x18\x03 \x01(\x0b\x32\x18.sweetgossip.WorkRequest\x12\x31\n\x12TimestampTolerance\x18\x04 \x01(\x0b\x32\x15.sweetgossip.Duration\"\xa1\x01\n\x10\x42roadcastPayload\x12\x39\n\x14SignedRequestPayload\x18\x01 \x01(\x0b\x32\x1b.sweetgossip.RequestPayload\x12\x15\n\rBackwardOnion\x18\x02 \x01(\x0c\x12)\n\tTimestamp\x18\x03 \x01(\x0b\x32\x16.sweetgossip.Timestamp\x12\x10\n\x08HopsLeft\x18\x04 \x01(\x05\"\x9d\x01\n\x11POWBroadcastFrame\x12 \n\x05\x41skId\x18\x01 \x01(\x0b\x32\x11.sweetgossip.UUID\x12\x37\n\x10\x42roadcastPayload\x18\x02 \x01(\x0b\x32\x1d.sweetgossip.BroadcastPayload\x12-\n\x0bProofOfWork\x18\x03 \x01(\x0b\x32\x18.sweetgossip.ProofOfWork\"\xb4\x01\n\nReplyFrame\x12\x1d\n\x15\x45ncryptedReplyPayload\x18\x01 \x01(\x0c\x12?\n\x17SignedSettlementPromise\x18\x02 \x01(\x0b\x32\x1e.sweetgossip.SettlementPromise\x12\x14\n\x0c\x46orwardOnion\x18\x03 \x01(\x0c\x12\x30\n\x0eNetworkInvoice\x18\x04 \x01(\x0b\x32\x18.sweetgossip.HodlInvoice\"\xc8\x02\n\x05\x46rame\x12<\n\x0f\x41skForBroadcast\x18\x01 \x01(\x0b\x32!.sweetgossip.AskForBroadcastFrameH\x00\x12J\n\x16POWBroadcastConditions\x18\x02 \x01(\x0b\x32(.sweetgossip.POWBroadcastConditionsFrameH\x00\x12\x36\n\x0cPOWBroadcast\x18\x03 \x01(\x0b\x32\x1e.sweetgossip.POWBroadcastFrameH\x00\x12(\n\x05Reply\x18\x04 \x01(\x0b\x32\x17.sweetgossip.ReplyFrameH\x00\x12<\n\x0fInterestSummary\x18\x05 \x01(\x0b\x32!.sweetgossip.InterestSummaryFrameH\x00\x12\x0c\n\x04Have\x18\x06 \x01(\x0c\x42\x07\n\x05Valueb\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'sweetgossip_pb2', _globals)
+if not _descriptor._USE_C_DESCRIPTORS:
+  DESCRIPTOR._loaded_options = None
+  _globals['_INTERESTSUMMARYFRAME_ADDEDENTRY']._loaded_options = None
+  _globals['_INTERESTSUMMARYFRAME_ADDEDENTRY']._serialized_options = b'8\001'
+  _globals['_UUID']._serialized_start=34
+  _globals['_UUID']._serialized_end=55
+  _globals['_TIMESTAMP']._serialized_start=57
+  _globals['_TIMESTAMP']._serialized_end=83
+  _globals['_DURATION']._serialized_start=85
+  _globals['_DURATION']._serialized_end=110
+  _globals['_VALUE']._serialized_start=113
+  _globals['_VALUE']._serialized_end=274
+  _globals['_CERTIFICATE']._serialized_start=277
+  _globals['_CERTIFICATE']._serialized_end=488
+  _globals['_TOPICFIELD']._serialized_start=490
+  _globals['_TOPICFIELD']._serialized_end=551
+  _globals['_TOPIC']._serialized_start=553
+  _globals['_TOPIC']._serialized_end=615
+  _globals['_REQUESTPAYLOAD']._serialized_start=618
+  _globals['_REQUESTPAYLOAD']._serialized_end=796
+  _globals['_WORKREQUEST']._serialized_start=798
+  _globals['_WORKREQUEST']._serialized_end=849
+  _globals['_PROOFOFWORK']._serialized_start=851
+  _globals['_PROOFOFWORK']._serialized_end=918
+  _globals['_HODLINVOICE']._serialized_start=920
+  _globals['_HODLINVOICE']._serialized_end=1044
+  _globals['_SETTLEMENTPROMISE']._serialized_start=1047
+  _globals['_SETTLEMENTPROMISE']._serialized_end=1270
+  _globals['_ASKFORBROADCASTFRAME']._serialized_start=1272
+  _globals['_ASKFORBROADCASTFRAME']._serialized_end=1387
+  _globals['_INTERESTSUMMARYFRAME']._serialized_start=1390
+  _globals['_INTERESTSUMMARYFRAME']._serialized_end=1536
+  _globals['_INTERESTSUMMARYFRAME_ADDEDENTRY']._serialized_start=1492
+  _globals['_INTERESTSUMMARYFRAME_ADDEDENTRY']._serialized_end=1536
+  _globals['_POWBROADCASTCONDITIONSFRAME']._serialized_start=1539
+  _globals['_POWBROADCASTCONDITIONSFRAME']._serialized_end=1743
+  _globals['_BROADCASTPAYLOAD']._serialized_start=1746
+  _globals['_BROADCASTPAYLOAD']._serialized_end=1907
+  _globals['_POWBROADCASTFRAME']._serialized_start=1910
+  _globals['_POWBROADCASTFRAME']._serialized_end=2067
+  _globals['_REPLYFRAME']._serialized_start=2070
+  _globals['_REPLYFRAME']._serialized_end=2250
+  _globals['_FRAME']._serialized_start=2253
+  _globals['_FRAME']._serialized_end=2581
+# @@protoc_insertion_point(module_scope)
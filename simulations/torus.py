@@ -0,0 +1,119 @@
+"""The taxi scenario shared by the torus simulations.
+
+One certification authority issues the certificates of every node and backs the one
+`Settler` they all use. `build_torus` places a node at every point of a `grid_side` x
+`grid_side` torus, named "GridNode<x,y>" as `utilisation.grid_position` expects, and
+connects it to its right and lower neighbours, wrapping round at the edges.
+`pick_roles` then makes some of them customers and some workers. A `TaxiNode` accepts
+every `TaxiTopic` that is still open and, as a worker, answers it.
+
+    ca, settler = create_settler()
+    things = build_torus(grid_side, node_keys(ca, grid_side*grid_side),
+                         lambda name, certificate, private_key: TaxiNode(name, certificate, private_key, settler))
+    pick_roles(things, random.Random(seed), num_customers, num_workers)
+"""
+from __future__ import annotations
+
+import itertools
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+from uuid import UUID
+
+import clock
+import crypto
+from cert import Certificate, CertificationAuthority, create_certification_authority
+from links import Link
+from payments import PaymentChannel
+from sweetgossip import AbstractTopic, RequestPayload, Settler, SweetGossipNode
+from wire import register_topic
+
+CERTIFICATE_VALIDITY = timedelta(days=7)
+
+
+@register_topic
+class TaxiTopic(AbstractTopic):
+    def __init__(self, from_geohash: str,  to_geohash: str, pickup_after: datetime, dropoff_before: datetime) -> None:
+        self.from_geohash = from_geohash
+        self.to_geohash = to_geohash
+        self.pickup_after = pickup_after
+        self.dropoff_before = dropoff_before
+
+
+class TaxiNode(SweetGossipNode):
+    """A node that routes taxi requests for 1 and, if `is_worker`, answers them."""
+
+    def __init__(self, name, certificate, private_key, settler: Settler, price_amount_for_routing: int = 1,
+                 pow_complexity: int = 0, timestamp_tolerance: timedelta = timedelta(days=1), **kwargs) -> None:
+        super().__init__(name, certificate, private_key, PaymentChannel(), price_amount_for_routing,
+                         broadcast_conditions_timeout=timedelta(days=7), broadcast_conditions_pow_scheme="sha256",
+                         broadcast_conditions_pow_complexity=pow_complexity, invoice_payment_timeout=timedelta(days=1),
+                         timestamp_tolerance=timestamp_tolerance,
+                         settler=settler, **kwargs)
+        self.is_customer = False
+        self.is_worker = False
+
+    def accept_topic(self, topic: AbstractTopic) -> bool:
+        return isinstance(topic, TaxiTopic) and clock.now() <= topic.dropoff_before
+
+    def accept_broadcast(self, signed_topic: RequestPayload) -> Tuple[bytes, int]:
+        if self.is_worker:
+            return bytes(f"mynameis={self.name}", encoding="utf8"), 4321
+        return None, 0
+
+    def taxi_request(self, payload_id: UUID, valid_for: timedelta = timedelta(days=1),
+                     topic_class: type = TaxiTopic, max_hops: int = None) -> RequestPayload:
+        """A signed request for a taxi from now until `valid_for` from now."""
+        request = RequestPayload(payload_id,
+                                 topic_class("ezs42e4", "ezs42s1", clock.now(), clock.now()+valid_for),
+                                 self.certificate, max_hops)
+        request.sign(self._private_key)
+        return request
+
+
+def issue_certificate(ca: CertificationAuthority, public_key: bytes) -> Certificate:
+    """A certificate valid for `CERTIFICATE_VALIDITY` either side of now."""
+    return ca.issue_certificate(public_key, "is_ok", True,
+                                clock.now()+CERTIFICATE_VALIDITY, clock.now()-CERTIFICATE_VALIDITY)
+
+
+def create_settler(ca_name: str = "CA") -> Tuple[CertificationAuthority, Settler]:
+    """A certification authority and a settler that signs with its key."""
+    ca = create_certification_authority(ca_name)
+    settler = Settler(issue_certificate(ca, ca.ca_public_key), ca._ca_private_key,
+                      PaymentChannel(), price_amount_for_settlement=12)
+    return ca, settler
+
+
+def node_keys(ca: CertificationAuthority, count: int) -> List[Tuple[bytes, Certificate]]:
+    """(private key, certificate) of `count` nodes; generating keys is slow, so reuse them across runs."""
+    keys = list()
+    for _ in range(count):
+        private_key, public_key = crypto.generate_asymetric_keys()
+        keys.append((private_key, issue_certificate(ca, public_key)))
+    return keys
+
+
+def build_torus(grid_side: int, keys: List[Tuple[bytes, Certificate]],
+                make_node: Callable[[str, Certificate, bytes], SweetGossipNode],
+                link: Link = None) -> Dict[str, SweetGossipNode]:
+    """The nodes `make_node(name, certificate, private_key)` of the torus by name, connected over `link`."""
+    things = dict()
+    for (x, y), (private_key, certificate) in zip(itertools.product(range(grid_side), repeat=2), keys):
+        things[f"GridNode<{x},{y}>"] = make_node(f"GridNode<{x},{y}>", certificate, private_key)
+    for x, y in itertools.product(range(grid_side), repeat=2):
+        things[f"GridNode<{x},{y}>"].connect_to(
+            things[f"GridNode<{(x+1) % grid_side},{y}>"], link)
+        things[f"GridNode<{x},{y}>"].connect_to(
+            things[f"GridNode<{x},{(y+1) % grid_side}>"], link)
+    return things
+
+
+def pick_roles(things: Dict[str, TaxiNode], rnd, num_customers: int, num_workers: int) -> List[TaxiNode]:
+    """Samples the customers, then the workers, by name with `rnd`; returns the customers."""
+    names = sorted(things)
+    customers = [things[name] for name in rnd.sample(names, num_customers)]
+    for customer in customers:
+        customer.is_customer = True
+    for name in rnd.sample(names, num_workers):
+        things[name].is_worker = True
+    return customers
@@ -0,0 +1,69 @@
+# %%
+# Cost of tracing: a ring of agents passes AskForBroadcastFrames around, fully traced
+# (every message and handler printed to /dev/null and kept in the history), at INFO and
+# untraced. The agents do nothing else, so the difference is the tracing itself.
+#
+#   python trace_bench.py [num_agents] [hops]
+import contextlib
+import os
+import sys
+from datetime import timedelta
+from uuid import uuid4
+
+import clock
+import crypto
+from cert import create_certification_authority
+from mass import INFO, OFF, TRACE, Agent, format_trace_row, simulate
+from stopwatch import Stopwatch
+from sweetgossip import AbstractTopic, AskForBroadcastFrame, RequestPayload
+
+
+class TaxiTopic(AbstractTopic):
+    def __init__(self, from_geohash: str,  to_geohash: str) -> None:
+        self.from_geohash = from_geohash
+        self.to_geohash = to_geohash
+
+
+class Passer(Agent):
+    def __init__(self, name, next_name, frame=None, hops=0):
+        super().__init__(name)
+        self.next_name = next_name
+        self.frame = frame
+        self.hops = hops
+
+    def homeostasis(self, e):
+        if self.frame is not None:
+            self.new_message(e, e.things[self.next_name], (self.hops, self.frame))
+        yield e.timeout(float('inf'))
+
+    def on_message(self, e, m):
+        hops, frame = m.data
+        if hops:
+            self.new_message(e, e.things[self.next_name], (hops-1, frame))
+
+
+def main(num_agents: int = 100, hops: int = 20000):
+    ca = create_certification_authority("CA")
+    private_key, public_key = crypto.generate_asymetric_keys()
+    certificate = ca.issue_certificate(
+        public_key, "is_ok", True, clock.now()+timedelta(days=7), clock.now()-timedelta(days=7))
+    payload = RequestPayload(uuid4(), TaxiTopic("ezs42e4", "ezs42s1"), certificate)
+    payload.sign(private_key)
+    frame = AskForBroadcastFrame(payload)
+
+    for label, trace_level in (("traced", TRACE), ("info", INFO), ("untraced", OFF)):
+        things = {f"Passer{i}": Passer(f"Passer{i}", f"Passer{(i+1) % num_agents}",
+                                       frame if i == 0 else None, hops)
+                  for i in range(num_agents)}
+        history = list()
+        with open(os.devnull, "w") as devnull, Stopwatch() as sw, contextlib.redirect_stdout(devnull):
+            simulate("", things, history=history, trace_level=trace_level)
+        with Stopwatch() as formatting:
+            for row in history[:1000]:
+                format_trace_row(row)
+        print(f"{label:>9}: {hops} messages in {sw.total:.2f}s ({sw.total/hops*1e6:.1f} us/message), "
+              f"history rows={len(history)}, formatting 1000 rows afterwards {formatting.total*1e3:.0f} ms")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
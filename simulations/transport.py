@@ -0,0 +1,203 @@
+"""Asyncio TCP transport that runs a `SweetGossipNode` as a real process instead of inside simpy.
+
+Peers are represented by `RemotePeer`s whose `queue` is a `PeerConnection`, so the node's
+unchanged `Agent.new_message` calls end up on the wire. Frames are protobuf-encoded
+(see wire.py) and length-prefixed. Each peer gets one pooled outbound connection;
+everything queued for it while a write is in flight goes out in a single batched write.
+When the outbound backlog of a node grows past `high_water` frames, it stops reading
+from its inbound connections until the backlog drains, so TCP pushes back on senders.
+
+Settlement is not supported across processes: the payment callbacks of the network
+invoice in a `ReplyFrame` cannot go over the wire, so a received reply carries a
+detached `HodlInvoice` (`on_accepted` is None) that cannot be paid. Only invoices found
+in the `invoices` registry (by id) given to `AsyncioTransport`, which nodes sharing a
+process with the settler can pass, come back as the live objects.
+"""
+from __future__ import annotations
+
+import asyncio
+import struct
+import time
+from collections import deque
+from typing import Dict
+from uuid import UUID
+
+import simpy.core
+
+from cert import Certificate
+from mass import TRACE, DirectMessage
+from payments import HodlInvoice
+from wire import decode_frame, encode_frame
+
+_LENGTH = struct.Struct(">I")
+
+
+class WallClockEnvironment(simpy.core.Environment):
+    """Stands in for the simpy environment passed to node handlers; `now` is wall-clock minutes."""
+
+    def __init__(self, sim_id: str = "", trace_level: int = TRACE) -> None:
+        super().__init__()
+        self.sim_id = sim_id
+        self.history = None
+        self.trace_level = trace_level
+        self._started = time.monotonic()
+
+    @property
+    def now(self) -> float:
+        return (time.monotonic() - self._started)/60
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> bytes:
+    header = await reader.readexactly(_LENGTH.size)
+    return await reader.readexactly(_LENGTH.unpack(header)[0])
+
+
+def _framed(data: bytes) -> bytes:
+    return _LENGTH.pack(len(data)) + data
+
+
+class PeerConnection:
+    """The pooled outbound connection to one peer."""
+
+    def __init__(self, transport: AsyncioTransport, name: str, host: str, port: int) -> None:
+        self.transport = transport
+        self.name = name
+        self.host = host
+        self.port = port
+        self._queue = deque()
+        self._wakeup = asyncio.Event()
+        self._writer: asyncio.StreamWriter = None
+
+    def put(self, msg: DirectMessage) -> None:
+        self._queue.append(_framed(encode_frame(msg.data)))
+        self.transport.frames_sent += 1
+        self._wakeup.set()
+
+    def backlog(self) -> int:
+        return len(self._queue)
+
+    async def _connect(self) -> None:
+        delay = 0.05
+        while True:
+            try:
+                _, self._writer = await asyncio.open_connection(self.host, self.port)
+                self._writer.write(_framed(self.transport.node.name.encode("utf8")))
+                return
+            except OSError:
+                await asyncio.sleep(delay)
+                delay = min(delay*2, 2.0)
+
+    async def run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._queue:
+                continue
+            if self._writer is None:
+                await self._connect()
+            batch = list()
+            while self._queue:
+                batch.append(self._queue.popleft())
+            try:
+                self._writer.write(b"".join(batch))
+                await self._writer.drain()
+                self.transport.batches_written += 1
+            except (ConnectionError, OSError):
+                self._writer.close()
+                self._writer = None
+                self.transport.frames_dropped += len(batch)
+            self.transport._on_drained()
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+
+
+class RemotePeer:
+    """What a node running over a transport sees in place of another node object."""
+
+    def __init__(self, name: str, certificate: Certificate, connection: PeerConnection) -> None:
+        self.name = name
+        self.certificate = certificate
+        self.queue = connection
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return f"{self.__class__.__name__}({self.name})"
+
+
+class AsyncioTransport:
+    def __init__(self, node, host: str, port: int, high_water: int = 1000, sim_id: str = "",
+                 invoices: Dict[UUID, HodlInvoice] = None) -> None:
+        self.node = node
+        self.host = host
+        self.port = port
+        self.high_water = high_water
+        self.invoices = invoices
+        self.env = WallClockEnvironment(sim_id)
+        self.peers: Dict[str, RemotePeer] = dict()
+        self.frames_received = 0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.batches_written = 0
+        self._drained = asyncio.Event()
+        self._server = None
+        self._tasks = list()
+
+    def add_peer(self, name: str, certificate: Certificate, host: str, port: int) -> RemotePeer:
+        peer = RemotePeer(name, certificate, PeerConnection(self, name, host, port))
+        self.peers[name] = peer
+        self.node._known_hosts[name] = peer
+        return peer
+
+    def backlog(self) -> int:
+        return sum(peer.queue.backlog() for peer in self.peers.values())
+
+    def _on_drained(self) -> None:
+        if self.backlog() <= self.high_water:
+            self._drained.set()
+
+    async def _wait_for_capacity(self) -> None:
+        while self.backlog() > self.high_water:
+            self._drained.clear()
+            await self._drained.wait()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            name = (await _read_frame(reader)).decode("utf8", errors="replace")
+            peer = self.peers.get(name)
+            if peer is None:
+                self.node.error(self.env, "handshake from unknown peer:", name)
+                return
+            while True:
+                data = await _read_frame(reader)
+                await self._wait_for_capacity()
+                self.frames_received += 1
+                try:
+                    msg = DirectMessage(sender=peer, target=self.node, data=decode_frame(data, self.invoices),
+                                        size=len(data))
+                    if self.node.admit(self.env, msg):
+                        self.node.on_message(self.env, msg)
+                except Exception as ex:
+                    self.node.error(self.env, "frame handler failed:", repr(ex))
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        for peer in self.peers.values():
+            self._tasks.append(asyncio.create_task(peer.queue.run()))
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for peer in self.peers.values():
+            await peer.queue.close()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
@@ -0,0 +1,182 @@
+# %%
+# Runs a few dozen SweetGossipNodes as separate processes talking over loopback TCP
+# and reports real frames/s and broadcast-to-reply latency.
+#
+#   python transport_harness.py [num_nodes] [num_requests]
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Tuple
+from uuid import uuid4
+
+import numpy as np
+
+import clock
+import crypto
+from cert import create_certification_authority
+from metrics import merge_snapshots
+from payments import PaymentChannel
+from settler_service import SettlerService
+from sweetgossip import AbstractTopic, RequestPayload, Settler, SweetGossipNode
+from transport import AsyncioTransport
+from wire import register_topic
+
+HOST = "127.0.0.1"
+BASE_PORT = 47000
+RANDOM_SEED = 1234
+NUM_CHORDS = 2
+NUM_WORKERS = 3
+REPLY_TIMEOUT = 10.0
+
+
+@register_topic
+class TaxiTopic(AbstractTopic):
+    def __init__(self, from_geohash: str,  to_geohash: str, pickup_after: datetime, dropoff_before: datetime) -> None:
+        self.from_geohash = from_geohash
+        self.to_geohash = to_geohash
+        self.pickup_after = pickup_after
+        self.dropoff_before = dropoff_before
+
+
+class HarnessNode(SweetGossipNode):
+    def __init__(self, name, certificate, private_key, settler: Settler, is_worker: bool):
+        super().__init__(name, certificate, private_key, PaymentChannel(), 1,
+                         broadcast_conditions_timeout=timedelta(days=7), broadcast_conditions_pow_scheme="sha256", broadcast_conditions_pow_complexity=1, invoice_payment_timeout=timedelta(days=1),
+                         timestamp_tolerance=timedelta(seconds=10),
+                         settler=settler)
+        self.is_worker = is_worker
+
+    def accept_topic(self, topic: AbstractTopic) -> bool:
+        return isinstance(topic, TaxiTopic) and clock.now() <= topic.dropoff_before
+
+    def accept_broadcast(self, signed_topic: RequestPayload) -> Tuple[bytes, int]:
+        if self.is_worker:
+            return bytes(f"mynameis={self.name}", encoding="utf8"), 4321
+        return None, 0
+
+
+def build_topology(num_nodes: int):
+    rnd = random.Random(RANDOM_SEED)
+    edges = set()
+    for i in range(num_nodes):
+        edges.add(tuple(sorted((i, (i+1) % num_nodes))))
+        for _ in range(NUM_CHORDS):
+            j = rnd.randrange(num_nodes)
+            if j != i:
+                edges.add(tuple(sorted((i, j))))
+    workers = set(rnd.sample(range(1, num_nodes), NUM_WORKERS))
+    return edges, workers
+
+
+async def run_node(idx, names, keys, certificates, edges, workers, settler, ready, stop, num_requests, results):
+    loop = asyncio.get_running_loop()
+    settler_service = SettlerService(settler, loop)
+    node = HarnessNode(names[idx], certificates[idx], keys[idx], settler_service, idx in workers)
+    transport = AsyncioTransport(node, HOST, BASE_PORT+idx)
+    for a, b in edges:
+        if idx in (a, b):
+            other = b if a == idx else a
+            transport.add_peer(names[other], certificates[other], HOST, BASE_PORT+other)
+    await transport.start()
+    await loop.run_in_executor(None, ready.wait)
+
+    latencies = list()
+    detached_invoices = list()
+    started = time.perf_counter()
+    if idx == 0:
+        for _ in range(num_requests):
+            payload_id = uuid4()
+            first_reply = loop.create_future()
+            collector = node.reply_collector(payload_id)
+            collector.subscribe(
+                lambda reply: first_reply.done() or first_reply.set_result(time.perf_counter()))
+            # settlement is not supported over the transport: invoices arrive detached
+            collector.subscribe(
+                lambda reply: detached_invoices.append(reply.network_invoice.on_accepted is None))
+            payload = RequestPayload(payload_id,
+                                     TaxiTopic("ezs42e4", "ezs42s1", clock.now(),
+                                               clock.now()+timedelta(minutes=20)),
+                                     certificates[idx])
+            payload.sign(keys[idx])
+            sent = time.perf_counter()
+            node.broadcast(transport.env, payload)
+            try:
+                latencies.append(await asyncio.wait_for(first_reply, REPLY_TIMEOUT)-sent)
+            except asyncio.TimeoutError:
+                latencies.append(None)
+        await asyncio.sleep(0.5)
+        stop.set()
+    else:
+        while not stop.is_set():
+            await asyncio.sleep(0.05)
+    elapsed = time.perf_counter()-started
+    await transport.close()
+    settler_service.close()
+    results.put((names[idx], transport.frames_received, transport.frames_sent,
+                 transport.batches_written, elapsed, latencies, node.metrics.snapshot(),
+                 detached_invoices))
+
+
+def node_process(*args):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        asyncio.run(run_node(*args))
+
+
+def main(num_nodes: int = 32, num_requests: int = 20):
+    ca = create_certification_authority("CA")
+    not_valid_after = clock.now()+timedelta(days=7)
+    not_valid_before = clock.now()-timedelta(days=7)
+    ca_certificate = ca.issue_certificate(
+        ca.ca_public_key, "is_ok", True, not_valid_after, not_valid_before)
+    settler = Settler(ca_certificate, ca._ca_private_key, PaymentChannel(),
+                      price_amount_for_settlement=12)
+
+    names = [f"Node{i}" for i in range(num_nodes)]
+    keys, certificates = list(), list()
+    for _ in range(num_nodes):
+        private_key, public_key = crypto.generate_asymetric_keys()
+        keys.append(private_key)
+        certificates.append(ca.issue_certificate(
+            public_key, "is_ok", True, not_valid_after, not_valid_before))
+    edges, workers = build_topology(num_nodes)
+
+    ctx = multiprocessing.get_context("fork")
+    ready = ctx.Barrier(num_nodes)
+    stop = ctx.Event()
+    results = ctx.Queue()
+    processes = [ctx.Process(target=node_process,
+                             args=(i, names, keys, certificates, edges, workers, settler,
+                                   ready, stop, num_requests, results))
+                 for i in range(num_nodes)]
+    for p in processes:
+        p.start()
+    rows = [results.get() for _ in processes]
+    for p in processes:
+        p.join()
+
+    received = sum(r[1] for r in rows)
+    batches = sum(r[3] for r in rows)
+    elapsed = max(r[4] for r in rows)
+    latencies = [l for r in rows for l in r[5]]
+    answered = np.array([l for l in latencies if l is not None])
+    print(f"nodes={num_nodes} edges={len(edges)} requests={num_requests}")
+    print(f"frames={received} in {elapsed:.2f}s -> {received/elapsed:.0f} frames/s, "
+          f"{received/max(batches, 1):.2f} frames/write")
+    if len(answered):
+        print(f"broadcast-to-reply ms: p50={np.percentile(answered, 50)*1e3:.1f} "
+              f"p90={np.percentile(answered, 90)*1e3:.1f} max={answered.max()*1e3:.1f} "
+              f"unanswered={len(latencies)-len(answered)}")
+    detached = [d for r in rows for d in r[7]]
+    assert all(detached)
+    print(f"replies with detached invoices (not settleable over the transport): {len(detached)}")
+    for frame_type, m in merge_snapshots(r[6] for r in rows).items():
+        print(frame_type, m["count"], m["bytes"], m["rejects"])
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
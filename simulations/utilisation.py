@@ -0,0 +1,134 @@
+"""Mailbox depth and agent utilisation time series.
+
+A `MailboxSampler` passed as the `sampler` of `mass.simulate` looks at the mailbox of
+every thing each `interval` of simulated time and records, in NumPy arrays of one row
+per sample and one column per thing:
+
+- depth: messages waiting in the mailbox,
+- processed: messages handled since the previous sample,
+- utilisation: the share of the interval the thing spent serving messages (its
+  `service_time`; 0 in simulations where handling takes no simulated time).
+
+Once the other events are done the sampler stops too, so it does not keep a run
+going. `matrix` gives a things x samples heatmap of a series, `grid` places one value
+per thing at its grid position, for the torus simulations whose node names carry
+their coordinates, and `save` writes it all to a compressed `.npz`.
+"""
+from __future__ import annotations
+
+import re
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+SERIES = ("depth", "processed", "utilisation")
+
+
+def grid_position(name: str) -> Tuple[int, ...]:
+    """The coordinates in a node name, e.g. (2, 3) for "GridNode<2,3>" or "GridNode<(2, 3)>"."""
+    return tuple(int(v) for v in re.findall(r"\d+", name))
+
+
+class MailboxSampler:
+    """The mailbox time series of one run, sampled every `interval` of simulated time."""
+
+    def __init__(self, interval: float, capacity: int = 1024) -> None:
+        self.interval = interval
+        self.names: List[str] = list()
+        self.samples = 0
+        self._capacity = capacity
+        self._times = np.empty(0)
+        self._depth = np.empty((0, 0), dtype=np.int32)
+        self._processed = np.empty((0, 0), dtype=np.int64)
+        self._busy = np.empty((0, 0))
+
+    def start(self, env) -> None:
+        """Starts sampling the things of `env`; `simulate` calls it."""
+        self.names = list(env.things)
+        self.samples = 0
+        self._times = np.empty(self._capacity)
+        self._depth = np.empty((self._capacity, len(self.names)), dtype=np.int32)
+        self._processed = np.empty((self._capacity, len(self.names)), dtype=np.int64)
+        self._busy = np.empty((self._capacity, len(self.names)))
+        env.process(self._run(env, [thing.queue for thing in env.things.values()]))
+
+    def _run(self, env, queues):
+        while True:
+            self._sample(env.now, queues)
+            if env.peek() == float('inf'):
+                return
+            yield env.timeout(self.interval)
+
+    def _sample(self, now, queues) -> None:
+        if self.samples == len(self._times):
+            self._grow()
+        i = self.samples
+        self._times[i] = now
+        self._depth[i] = [len(queue) for queue in queues]
+        self._processed[i] = [queue.processed for queue in queues]
+        self._busy[i] = [queue.busy_time + (now - queue.serving_since if queue.serving is not None else 0)
+                         for queue in queues]
+        self.samples += 1
+
+    def _grow(self) -> None:
+        def grown(a):
+            b = np.empty((2*len(a),)+a.shape[1:], dtype=a.dtype)
+            b[:len(a)] = a
+            return b
+        self._times = grown(self._times)
+        self._depth = grown(self._depth)
+        self._processed = grown(self._processed)
+        self._busy = grown(self._busy)
+
+    def __len__(self) -> int:
+        return self.samples
+
+    @property
+    def times(self) -> np.ndarray:
+        return self._times[:self.samples]
+
+    @property
+    def depth(self) -> np.ndarray:
+        return self._depth[:self.samples]
+
+    @property
+    def processed(self) -> np.ndarray:
+        cumulative = self._processed[:self.samples]
+        return np.diff(cumulative, axis=0, prepend=cumulative[:1])
+
+    @property
+    def utilisation(self) -> np.ndarray:
+        busy = self._busy[:self.samples]
+        elapsed = np.diff(self.times, prepend=self.times[:1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(elapsed[:, None] > 0,
+                            np.diff(busy, axis=0, prepend=busy[:1])/elapsed[:, None], 0.0)
+
+    def series(self, name: str) -> np.ndarray:
+        """One of the `SERIES`, samples x things."""
+        if not name in SERIES:
+            raise ValueError(f"unknown series {name!r}, not one of {SERIES}")
+        return getattr(self, name)
+
+    def matrix(self, name: str = "depth") -> np.ndarray:
+        """The heatmap of a series: one row per thing (in `names` order), one column per sample."""
+        return self.series(name).T
+
+    def grid(self, name: str = "depth", reduce: Callable = np.max,
+             position: Callable[[str], Tuple[int, ...]] = grid_position) -> np.ndarray:
+        """Every thing's series reduced over time (peak by default) at its `position`; NaN where no thing is."""
+        values = reduce(self.series(name), axis=0) if self.samples else np.zeros(len(self.names))
+        positions = [position(thing) for thing in self.names]
+        grid = np.full(tuple(np.max(positions, axis=0)+1), np.nan)
+        for p, value in zip(positions, values):
+            grid[p] = value
+        return grid
+
+    def hotspots(self, name: str = "depth", k: int = 5, reduce: Callable = np.max) -> List[Tuple[str, float]]:
+        """The `k` things with the highest reduced series, highest first."""
+        values = reduce(self.series(name), axis=0)
+        return [(self.names[i], values[i].item()) for i in np.argsort(-values, kind="stable")[:k]]
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(path, times=self.times, names=np.array(self.names),
+                            **{name: self.series(name) for name in SERIES})
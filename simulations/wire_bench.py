@@ -0,0 +1,100 @@
+# %%
+# Size and encode/decode throughput of the protobuf wire format against pickle.
+import pickle
+import timeit
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import clock
+import crypto
+from cert import create_certification_authority
+from payments import PaymentChannel
+from pow import WorkRequest, pow_target_from_complexity
+from sweetgossip import (AbstractTopic, AskForBroadcastFrame, BroadcastPayload,
+                         InterestSummaryFrame, OnionLayer, OnionRoute,
+                         POWBroadcastConditionsFrame, POWBroadcastFrame,
+                         ReplyFrame, RequestPayload, Settler)
+from wire import decode_frame, encode_frame, register_topic
+
+REPEATS = 2000
+
+
+@register_topic
+class TaxiTopic(AbstractTopic):
+    def __init__(self, from_geohash: str,  to_geohash: str, pickup_after: datetime, dropoff_before: datetime) -> None:
+        self.from_geohash = from_geohash
+        self.to_geohash = to_geohash
+        self.pickup_after = pickup_after
+        self.dropoff_before = dropoff_before
+
+
+ca = create_certification_authority("CA")
+not_valid_after = clock.now()+timedelta(days=7)
+not_valid_before = clock.now()-timedelta(days=7)
+ca_certificate = ca.issue_certificate(
+    ca.ca_public_key, "is_ok", True, not_valid_after, not_valid_before)
+settler = Settler(ca_certificate, ca._ca_private_key, PaymentChannel(), 12)
+
+private_key, public_key = crypto.generate_asymetric_keys()
+certificate = ca.issue_certificate(
+    public_key, "is_ok", True, not_valid_after, not_valid_before)
+request_payload = RequestPayload(uuid4(),
+                                 TaxiTopic("ezs42e4", "ezs42s1", clock.now(),
+                                           clock.now()+timedelta(minutes=20)),
+                                 certificate)
+request_payload.sign(private_key)
+
+onion = OnionRoute()
+for i in range(3):
+    onion = onion.grow(OnionLayer(f"Node{i}"), public_key)
+
+work_request = WorkRequest("sha256", pow_target_from_complexity("sha256", 1))
+broadcast_payload = BroadcastPayload(request_payload, onion, clock.now())
+
+channel = PaymentChannel()
+invoice_id, reply_payment_hash, on_accepted = settler.generate_reply_payment_trust()
+reply_invoice = channel.create_hodl_invoice(
+    4321, reply_payment_hash, on_accepted, invoice_id=invoice_id)
+promise, network_invoice, encrypted_reply_payload = settler.generate_settlement_trust(
+    b"message", reply_invoice, request_payload, certificate)
+
+ask = AskForBroadcastFrame(request_payload)
+frames = [
+    ask,
+    POWBroadcastConditionsFrame(ask.ask_id, clock.now()+timedelta(days=7),
+                                work_request, timedelta(seconds=10)),
+    POWBroadcastFrame(ask.ask_id, broadcast_payload,
+                      work_request.compute_proof(broadcast_payload)),
+    ReplyFrame(encrypted_reply_payload, promise, onion, network_invoice),
+    InterestSummaryFrame({"ezs42": 1, "u4pru": 3}, ["ezs4"]),
+]
+
+# %%
+for frame in frames:
+    decoded = decode_frame(encode_frame(frame), {network_invoice.id: network_invoice})
+    if isinstance(frame, POWBroadcastFrame):
+        assert decoded.verify()
+    if isinstance(frame, ReplyFrame):
+        assert decoded.signed_settlement_promise.verify_all(decoded.encrypted_reply_payload)
+        assert decoded.network_invoice is network_invoice
+
+# %%
+print(f"{'frame':>28} {'pb B':>7} {'pickle B':>9} {'pb enc us':>10} {'pkl enc us':>11} {'pb dec us':>10} {'pkl dec us':>11}")
+for frame in frames:
+    if isinstance(frame, ReplyFrame):
+        # payment callbacks are not part of the wire format
+        picklable = ReplyFrame(frame.encrypted_reply_payload, frame.signed_settlement_promise,
+                               frame.forward_onion, channel.create_hodl_invoice(
+                                   network_invoice.amount, network_invoice.payment_hash, None))
+    else:
+        picklable = frame
+    encoded = encode_frame(frame)
+    pickled = pickle.dumps(picklable)
+    pb_enc = timeit.timeit(lambda: encode_frame(frame), number=REPEATS)/REPEATS
+    pkl_enc = timeit.timeit(lambda: pickle.dumps(picklable), number=REPEATS)/REPEATS
+    pb_dec = timeit.timeit(lambda: decode_frame(encoded), number=REPEATS)/REPEATS
+    pkl_dec = timeit.timeit(lambda: pickle.loads(pickled), number=REPEATS)/REPEATS
+    print(f"{type(frame).__name__:>28} {len(encoded):7d} {len(pickled):9d} "
+          f"{pb_enc*1e6:10.2f} {pkl_enc*1e6:11.2f} {pb_dec*1e6:10.2f} {pkl_dec*1e6:11.2f}")
+
+# %%